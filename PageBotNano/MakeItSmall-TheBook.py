@@ -27,6 +27,7 @@ from pagebotnano.publications.book import Book
 from pagebotnano.contexts.drawbot.context import DrawBotContext
 from pagebotnano.themes import SeasoningTheDish
 from pagebotnano.toolbox.typesetter import Typesetter
+from pagebotnano.toolbox.galleycache import GalleyCache
 from pagebotnano.templates.onecolumn import OneColumnTemplates
 
 MARKDOWN_PATH = 'MakeItSmall-TheBook.md'
@@ -54,8 +55,10 @@ book = Book(w=W, h=H, theme=theme, templates=templates, context=context)
 # Part of the elements is to be placed on the pages as elements,
 # (such as TextBox and Image) and part is just instructions for the composer
 # as non-displaying Marker elements.
+# The galley is cached in _export/galleyCache, so it is only typeset again
+# if the markdown file, the theme styles or the typesetter changed.
 ts = Typesetter()
-galley = ts.typesetFile(MARKDOWN_PATH)
+galley = ts.typesetFile(MARKDOWN_PATH, cache=GalleyCache())
 """
 print('XML ' + '-'*50)
 print(ts.xml)
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+# -----------------------------------------------------------------------------
+#
+#   P A G E B O T  N A N O
+#
+#   Copyright (c) 2020+ Buro Petr van Blokland + Claudia Mens
+#   www.pagebot.io
+#   Licensed under MIT conditions
+#
+#   Supporting DrawBot, www.drawbot.com
+# -----------------------------------------------------------------------------
+#
+#   benchmark.py
+#
+#   The Benchmark class times steps of the publication process, such as
+#   Typesetter.typeset, Book.compose, Document.build and Document.export.
+#   Results are reported as table and saved as JSON, so runs can be
+#   compared over time.
+#
+import json
+import os
+import platform
+import time
+import tracemalloc
+
+class Benchmark:
+    """Collect the timing, throughput and peak memory of benchmark steps.
+    Each step has a `setup` function, answering the arguments for the `action`
+    function, so every repeat starts with fresh input. Only the action is timed.
+    The peak memory is measured in a separate run, as tracing the memory
+    allocation slows down the code.
+
+    >>> bm = Benchmark('Test', pages=2)
+    >>> result = bm.measure('sum', lambda: (range(1000),), sum, count=1000, unit='numbers')
+    >>> result['step'], result['count'], result['unit']
+    ('sum', 1000, 'numbers')
+    >>> result['seconds'] > 0 and result['perSecond'] > 0 and result['peakMemory'] >= 0
+    True
+    >>> bm.save('_export/Benchmark.json')
+    >>> json.load(open('_export/Benchmark.json'))['settings']
+    {'pages': 2}
+    """
+    def __init__(self, name, repeat=3, **settings):
+        self.name = name
+        self.repeat = max(1, repeat) # The fastest of the repeats is reported.
+        self.settings = settings
+        self.results = []
+
+    def __repr__(self):
+        return '<%s %s results=%d>' % (self.__class__.__name__, self.name, len(self.results))
+
+    def measure(self, step, setup, action, count=None, unit=None, **info):
+        """Time the `action` called with the arguments that `setup` answers.
+        `count` is the number of units (pages, runs) that the action processes,
+        either as number or as function called with the result of the action.
+        Additional `info` (e.g. the theme name) is stored with the result.
+        """
+        seconds = None
+        for _ in range(self.repeat):
+            args = setup()
+            t = time.perf_counter()
+            value = action(*args)
+            t = time.perf_counter() - t
+            if seconds is None or t < seconds:
+                seconds = t
+        if callable(count):
+            count = count(value)
+
+        args = setup()
+        tracemalloc.start()
+        action(*args)
+        _, peakMemory = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        result = dict(step=step, seconds=seconds, count=count, unit=unit,
+            perSecond=count/seconds if count and seconds else None,
+            peakMemory=peakMemory)
+        result.update(info)
+        self.results.append(result)
+        return result
+
+    def report(self):
+        """Answer the results as table string."""
+        lines = ['%-20s %-16s %10s %10s %16s %12s' % ('Step', 'Info', 'Seconds', 'Count', 'Per second', 'Peak MB')]
+        for result in self.results:
+            info = ', '.join([str(result[name]) for name in sorted(result)
+                if name not in ('step', 'seconds', 'count', 'unit', 'perSecond', 'peakMemory')])
+            perSecond = ''
+            if result['perSecond'] is not None:
+                perSecond = '%.1f %s/s' % (result['perSecond'], result['unit'])
+            lines.append('%-20s %-16s %10.4f %10s %16s %12.2f' % (result['step'], info[:16],
+                result['seconds'], result['count'], perSecond, result['peakMemory']/1024/1024))
+        return '\n'.join(lines)
+
+    def asDict(self):
+        return dict(name=self.name, date=time.strftime('%Y-%m-%d %H:%M:%S'),
+            python=platform.python_version(), platform=platform.platform(),
+            repeat=self.repeat, settings=self.settings, results=self.results)
+
+    def save(self, path):
+        """Save the results as JSON file at `path`."""
+        dirPath = os.path.dirname(path)
+        if dirPath and not os.path.exists(dirPath):
+            os.makedirs(dirPath)
+        with open(path, 'w') as f:
+            json.dump(self.asDict(), f, indent=4)
+
+if __name__ == "__main__":
+    # Running this document will execute all >>> comments as test of this source.
+    import doctest
+    doctest.testmod()[0]
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+# -----------------------------------------------------------------------------
+#
+#   P A G E B O T  N A N O
+#
+#   Copyright (c) 2020+ Buro Petr van Blokland + Claudia Mens
+#   www.pagebot.io
+#   Licensed under MIT conditions
+#
+#   Supporting DrawBot, www.drawbot.com
+# -----------------------------------------------------------------------------
+#
+#   runBenchmarks.py
+#
+#   Time Typesetter.typeset, Book.compose, Document.build and Document.export
+#   separately, on synthetic input of configurable size, for every theme.
+#   The results are printed as table and saved as JSON in _export/benchmarks
+#   The export step replays a recorded build onto the context, it is skipped
+#   for the null context, which has no output.
+#
+#   python3 runBenchmarks.py --pages 20 --elements 12 --paragraphs 50
+#   python3 runBenchmarks.py --themes BackToTheCity --context drawbot
+#
+import argparse
+import os
+import sys
+import time
+sys.path.insert(0, "../") # So we can import pagebotnano without installing.
+
+from pagebotnano.constants import PENGUIN_POCKET
+from pagebotnano.contexts.basecontext import BaseContext
+from pagebotnano.themes import AllThemes
+from pagebotnano.publications.book import Book
+from pagebotnano.templates.onecolumn import OneColumnTemplates
+from pagebotnano.toolbox.markdown import parseMarkdown
+from pagebotnano.toolbox.typesetter import Typesetter
+
+from benchmark import Benchmark
+from synthetic import makeMarkdown, makeDocument
+
+EXPORT_PATH = '_export/benchmarks'
+
+def getContextClass(name):
+    """Answer the context class for `name`. DrawBot is only imported
+    when needed, so the benchmarks run headless by default.
+    """
+    if name == 'drawbot':
+        from pagebotnano.contexts.drawbot.context import DrawBotContext
+        return DrawBotContext
+    if name == 'recording':
+        from pagebotnano.contexts.recording.context import RecordingContext
+        return RecordingContext
+    from pagebotnano.contexts.null.context import NullContext
+    return NullContext
+
+def getExportContext(name):
+    """Answer a RecordingContext that replays onto the context for `name`,
+    so the export step only times the output of a document that is built
+    already. Answer None for the null context, as it has no output to time.
+    """
+    if name == 'null':
+        return None
+    from pagebotnano.contexts.recording.context import RecordingContext
+    if name == 'recording':
+        return RecordingContext() # Replays onto its default DrawBotContext.
+    return RecordingContext(getContextClass(name)())
+
+def countRuns(galley):
+    """Answer the number of BabelRun instances in the elements of `galley`."""
+    runs = 0
+    for e in galley.elements:
+        bs = getattr(e, 'bs', None)
+        if bs is not None:
+            runs += len(bs.runs)
+    return runs
+
+def runBenchmarks(pages=10, elements=12, paragraphs=20, chapters=5, themes=None,
+        contextName='null', repeat=3):
+    """Run all benchmark steps for all `themes` (default is all themes).
+    Answer the Benchmark instance with the results.
+    """
+    contextClass = getContextClass(contextName)
+    w, h = PENGUIN_POCKET
+    bm = Benchmark('PageBotNano', repeat=repeat, pages=pages, elements=elements,
+        paragraphs=paragraphs, chapters=chapters, context=contextClass.__name__)
+    xml = parseMarkdown(makeMarkdown(paragraphs, chapters=chapters))
+    if not os.path.exists(EXPORT_PATH):
+        os.makedirs(EXPORT_PATH)
+
+    for themeClass in AllThemes:
+        themeName = themeClass.__name__
+        if themes and themeName not in themes:
+            continue
+        theme = themeClass()
+
+        def typeset(ts):
+            return ts.typeset(xml, theme)
+        bm.measure('Typesetter.typeset', lambda: (Typesetter(),), typeset,
+            count=countRuns, unit='runs', theme=themeName)
+
+        def setupCompose():
+            galley = Typesetter().typeset(xml, theme)
+            book = Book(w=w, h=h, templates=OneColumnTemplates(), theme=theme, context=contextClass())
+            return book, galley
+        def compose(book, galley):
+            book.compose(galley)
+            return book
+        bm.measure('Book.compose', setupCompose, compose,
+            count=lambda book: len(book.doc.pages), unit='pages', theme=themeName)
+
+        def setupBuild():
+            doc = makeDocument(pages, elements, theme, context=contextClass(), w=w, h=h)
+            doc.compose()
+            return doc,
+        def build(doc):
+            doc.build()
+            return doc
+        bm.measure('Document.build', setupBuild, build,
+            count=pages, unit='pages', theme=themeName)
+
+        if contextName == 'null':
+            continue # Nothing is exported, so there is no export step.
+        path = '%s/%s.pdf' % (EXPORT_PATH, themeName)
+        def setupExport():
+            doc = makeDocument(pages, elements, theme, context=getExportContext(contextName), w=w, h=h)
+            doc.compose()
+            doc.build() # Recorded, export replays it onto the context.
+            return doc, path
+        def export(doc, path):
+            doc.export(path)
+            return doc
+        bm.measure('Document.export', setupExport, export,
+            count=pages, unit='pages', theme=themeName)
+    return bm
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark PageBotNano on synthetic publications.')
+    parser.add_argument('--pages', type=int, default=10, help='Number of pages (N) for build and export.')
+    parser.add_argument('--elements', type=int, default=12, help='Number of elements (M) on each page.')
+    parser.add_argument('--paragraphs', type=int, default=20, help='Number of paragraphs (K) in each chapter of the galley.')
+    parser.add_argument('--chapters', type=int, default=5, help='Number of chapters in the galley.')
+    parser.add_argument('--themes', nargs='*', help='Names of the themes to run, default is all themes.')
+    parser.add_argument('--context', default='null', choices=('null', 'recording', 'drawbot'), help='Context to build and export with.')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of repeats, the fastest is reported.')
+    parser.add_argument('--output', help='Path of the JSON result file.')
+    args = parser.parse_args()
+
+    bm = runBenchmarks(pages=args.pages, elements=args.elements, paragraphs=args.paragraphs,
+        chapters=args.chapters, themes=args.themes, contextName=args.context, repeat=args.repeat)
+    print(bm.report())
+    print('Text measure cache:', BaseContext.MEASURES.getStats())
+    path = args.output or '%s/benchmark-%s.json' % (EXPORT_PATH, time.strftime('%Y%m%d-%H%M%S'))
+    bm.save(path)
+    print('Saved results in', path)
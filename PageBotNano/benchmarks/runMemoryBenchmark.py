@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+# -----------------------------------------------------------------------------
+#
+#   P A G E B O T  N A N O
+#
+#   Copyright (c) 2020+ Buro Petr van Blokland + Claudia Mens
+#   www.pagebot.io
+#   Licensed under MIT conditions
+#
+#   Supporting DrawBot, www.drawbot.com
+# -----------------------------------------------------------------------------
+#
+#   runMemoryBenchmark.py
+#
+#   Measure the memory footprint of each Element, Text, TextBox and Image
+#   instance, including their units, BabelString runs and styles, as used
+#   in large catalogues. The results are printed as table and saved as JSON
+#   in _export/benchmarks. Save the result of a previous version and pass it
+#   as --baseline, to compare the footprint before and after a change.
+#
+#   python3 runMemoryBenchmark.py --count 10000
+#   python3 runMemoryBenchmark.py --baseline _export/benchmarks/memory-before.json
+#
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+sys.path.insert(0, "../") # So we can import pagebotnano without installing.
+
+from pagebotnano.babelstring import BabelString
+from pagebotnano.elements import Element, Text, TextBox, Image
+from pagebotnano.toolbox.color import color
+from pagebotnano.toolbox.units import mm
+
+from synthetic import IMAGE_PATH
+
+EXPORT_PATH = '_export/benchmarks'
+
+# Style as answered by the theme. The typesetter makes a copy for every run.
+STYLE = dict(font='Georgia', fontSize=10, lineHeight=14, textFill=color(0))
+BOLD_STYLE = dict(font='Georgia-Bold', fontSize=10, lineHeight=14, textFill=color(0))
+
+def makeElement(index):
+    return Element(x=mm(10), y=mm(20 + index % 100), w=mm(50), h=mm(30))
+
+def makeText(index):
+    bs = BabelString('Item %d' % index, dict(STYLE))
+    return Text(bs, x=mm(10), y=mm(20), w=mm(50))
+
+def makeTextBox(index):
+    bs = BabelString('Product %d ' % index, dict(BOLD_STYLE))
+    bs.append('with a short description of the product.', dict(STYLE))
+    return TextBox(bs, x=mm(10), y=mm(20), w=mm(50), h=mm(30))
+
+def makeImage(index):
+    return Image(IMAGE_PATH, x=mm(10), y=mm(20), w=mm(40))
+
+ELEMENT_MAKERS = (
+    ('Element', makeElement),
+    ('Text', makeText),
+    ('TextBox', makeTextBox),
+    ('Image', makeImage),
+)
+
+def measureFootprint(make, count):
+    """Answer the average number of bytes allocated for each of the `count`
+    objects that make(index) answers, while they are all alive. Shared data
+    (e.g. interned styles) is included, divided over the objects.
+
+    >>> measureFootprint(lambda index: [index], 1000) > 0
+    True
+    """
+    gc.collect()
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    objects = [make(index) for index in range(count)]
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    size = after - before - sys.getsizeof(objects)
+    del objects
+    return size / count
+
+def runMemoryBenchmark(count=10000):
+    """Answer the list of result dicts with the footprint of each element class."""
+    results = []
+    for name, make in ELEMENT_MAKERS:
+        results.append(dict(element=name, count=count, bytes=measureFootprint(make, count)))
+    return results
+
+def report(results, baseline=None):
+    """Answer the results as table string. If there is a `baseline` list
+    of results, then show the before, after and change of the footprint.
+    """
+    before = {}
+    for result in baseline or ():
+        before[result['element']] = result['bytes']
+    lines = ['%-12s %10s %14s %14s %10s' % ('Element', 'Count', 'Before bytes', 'After bytes', 'Change')]
+    for result in results:
+        name = result['element']
+        if name in before:
+            lines.append('%-12s %10d %14.1f %14.1f %9.1f%%' % (name, result['count'], before[name],
+                result['bytes'], 100 * (result['bytes'] - before[name]) / before[name]))
+        else:
+            lines.append('%-12s %10d %14s %14.1f %10s' % (name, result['count'], '', result['bytes'], ''))
+    return '\n'.join(lines)
+
+def save(results, path):
+    """Save the results as JSON file at `path`."""
+    dirPath = os.path.dirname(path)
+    if dirPath and not os.path.exists(dirPath):
+        os.makedirs(dirPath)
+    with open(path, 'w') as f:
+        json.dump(dict(name='Memory', date=time.strftime('%Y-%m-%d %H:%M:%S'),
+            python=platform.python_version(), platform=platform.platform(),
+            results=results), f, indent=4)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Measure the memory footprint of PageBotNano elements.')
+    parser.add_argument('--count', type=int, default=10000, help='Number of instances of each element class.')
+    parser.add_argument('--baseline', help='Path of a JSON result file to compare with.')
+    parser.add_argument('--output', help='Path of the JSON result file.')
+    args = parser.parse_args()
+
+    results = runMemoryBenchmark(count=args.count)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+    print(report(results, baseline))
+    path = args.output or '%s/memory-%s.json' % (EXPORT_PATH, time.strftime('%Y%m%d-%H%M%S'))
+    save(results, path)
+    print('Saved results in', path)
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+# -----------------------------------------------------------------------------
+#
+#   P A G E B O T  N A N O
+#
+#   Copyright (c) 2020+ Buro Petr van Blokland + Claudia Mens
+#   www.pagebot.io
+#   Licensed under MIT conditions
+#
+#   Supporting DrawBot, www.drawbot.com
+# -----------------------------------------------------------------------------
+#
+#   synthetic.py
+#
+#   Create synthetic input of configurable size for the benchmarks:
+#   markdown galleys with K paragraphs of loremipsum text, and
+#   documents of N pages with M elements each. The content is not random,
+#   so runs with the same settings can be compared.
+#
+import os
+import sys
+sys.path.insert(0, "../") # So we can import pagebotnano without installing.
+
+from pagebotnano.document import Document
+from pagebotnano.babelstring import BabelString
+from pagebotnano.elements import Rect, Text, TextBox, Image
+from pagebotnano.templates.onecolumn import OneColumnTemplates
+from pagebotnano.toolbox.loremipsum import loremipsum
+
+IMAGE_PATH = os.path.join(os.path.dirname(__file__), '../resources/images/cookbot1.jpg')
+
+def makeMarkdown(paragraphs, chapters=1):
+    """Answer a markdown string with `chapters` chapters, each starting
+    with a template marker and a headline, followed by `paragraphs` paragraphs.
+    Every fifth paragraph has bold and italic words, to create multiple runs.
+
+    >>> md = makeMarkdown(3, chapters=2)
+    >>> md.count('==chapter=='), md.count('# Chapter')
+    (2, 2)
+    """
+    md = []
+    for chapterIndex in range(chapters):
+        md.append('==chapter==\n\n# Chapter %d\n' % (chapterIndex+1))
+        for pIndex in range(paragraphs):
+            words = 40 + (pIndex * 7) % 60 # Variation in paragraph length.
+            p = loremipsum(words=words)
+            if pIndex % 5 == 0:
+                p = '**Lorem ipsum** dolor sit amet, *consectetur* ' + p
+            md.append(p + '\n')
+    return '\n'.join(md)
+
+def makeDocument(pages, elements, theme, context=None, w=None, h=None):
+    """Answer a Document with `pages` pages, each with `elements` elements.
+    The elements cycle through Rect, Text, TextBox and Image, in a grid on
+    the page, using the colors and styles of `theme`.
+
+    >>> from pagebotnano.themes import BackToTheCity
+    >>> doc = makeDocument(3, 8, BackToTheCity())
+    >>> len(doc.pages), len(doc.pages[0].elements)
+    (3, 8)
+    """
+    doc = Document(w=w, h=h, theme=theme, templates=OneColumnTemplates(), context=context)
+    style = theme.getStyle('p')
+    headStyle = theme.getStyle('h3') or style
+    text = loremipsum(words=60)
+    for pIndex in range(pages):
+        page = doc.newPage()
+        # Divide the page area in a square-ish grid of `elements` cells.
+        cols = max(1, int(elements**0.5))
+        rows = max(1, (elements + cols - 1) // cols)
+        cw = (page.w - 2*doc.padding[3]) / cols
+        ch = (page.h - 2*doc.padding[0]) / rows
+        for eIndex in range(elements):
+            x = doc.padding[3] + (eIndex % cols) * cw
+            y = doc.padding[0] + (eIndex // cols) * ch
+            kind = eIndex % 4
+            if kind == 0:
+                e = Rect(x=x, y=y, w=cw, h=ch, fill=theme.getColor(pIndex % 9, eIndex % 6))
+            elif kind == 1:
+                e = Text(BabelString('Page %d' % (pIndex+1), headStyle), x=x, y=y, w=cw)
+            elif kind == 2:
+                e = TextBox(BabelString(text, style), x=x, y=y, w=cw, h=ch)
+            else:
+                e = Image(IMAGE_PATH, x=x, y=y, w=cw)
+            page.addElement(e)
+    return doc
+
+if __name__ == "__main__":
+    # Running this document will execute all >>> comments as test of this source.
+    import doctest
+    doctest.testmod()[0]
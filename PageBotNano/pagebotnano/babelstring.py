@@ -15,33 +15,243 @@
 #
 import sys
 sys.path.insert(0, "..") # So we can import pagebotnano without installing.
-from copy import copy
-import drawBot
+from bisect import bisect_right
+from copy import copy, deepcopy
+import hashlib
+import re
+import weakref
+try:
+    import drawBot
+except ImportError: # No DrawBot (e.g. on Linux), only headless contexts can be used.
+    drawBot = None
 
 from pagebotnano.toolbox.color import Color
+from pagebotnano.toolbox.units import Unit, upt
+from pagebotnano.contexts import getDefaultContext
 from pagebotnano.constants import (EN, FS_ATTRIBUTES, CSS_ATTRIBUTES, 
     HTML_TEXT_TAGS)
 
+# Interned styles, shared by all runs with equal style.
+STYLES = {} # Key of style items --> Style instance
+STYLE_IDS = [] # Style.id --> Style instance, in order of interning.
+# Plain dicts that were interned recently (e.g. the styles of a theme), so
+# appending text with the same dict does not make the key again.
+INTERNED_DICTS = {} # id(style) --> (style, Style instance)
+INTERNED_DICTS_SIZE = 1000
+
+# Classes of values that are their own exact key.
+SIMPLE_VALUE_CLASSES = {str, int, float, bool, type(None)}
+
+def getValueKey(value):
+    """Answer the exact hashable key of a style `value`, including its class,
+    so e.g. True and 1 are different values. Units are keyed by their class,
+    value, base and gutter, and colors by their class and channels, as their
+    repr rounds the value. Other unhashable values that are not a list, tuple
+    or dict are keyed by their identity. The interned Style keeps the value,
+    so its id is not reused.
+
+    >>> from pagebotnano.toolbox.units import mm, em
+    >>> getValueKey(12)
+    (<class 'int'>, 12)
+    >>> getValueKey(mm(3.141)) == getValueKey(mm(3.14))
+    False
+    >>> getValueKey(em(1.5, base=10)) == getValueKey(em(1.5, base=20))
+    False
+    >>> getValueKey([1, 2]) == getValueKey([1, 2])
+    True
+    """
+    valueClass = value.__class__
+    if valueClass in SIMPLE_VALUE_CLASSES:
+        return valueClass, value
+    if isinstance(value, Unit):
+        return (valueClass, getValueKey(value.v), getValueKey(value.base), 
+            getValueKey(value.g))
+    if isinstance(value, Color):
+        return valueClass, getValueKey(value.__dict__)
+    if valueClass in (list, tuple):
+        return valueClass, tuple([getValueKey(v) for v in value])
+    if valueClass is dict:
+        return valueClass, tuple([(name, getValueKey(v)) for name, v in sorted(value.items())])
+    if valueClass.__hash__ is None:
+        return valueClass, id(value)
+    return valueClass, value
+
+def getStyleKey(style):
+    """Answer the hashable key of the `style` dict, with the exact key of each
+    value, as answered by getValueKey.
+
+    >>> getStyleKey(dict(fontSize=12, font='Georgia'))
+    (('font', <class 'str'>, 'Georgia'), ('fontSize', <class 'int'>, 12))
+    >>> from pagebotnano.toolbox.units import mm, em, upt
+    >>> style = internStyle(dict(fontSize=em(1.5, base=20))) # Same repr as base=10
+    >>> style is internStyle(dict(fontSize=em(1.5, base=10))), upt(style['fontSize'])
+    (False, 30)
+    >>> internStyle(dict(leading=mm(3.141))) is internStyle(dict(leading=mm(3.14)))
+    False
+    """
+    key = []
+    for name, value in sorted(style.items()):
+        valueClass = value.__class__
+        if valueClass in SIMPLE_VALUE_CLASSES:
+            key.append((name, valueClass, value))
+        else:
+            key.append((name,) + getValueKey(value))
+    return tuple(key)
+
+def internStyle(style):
+    """Answer the shared immutable Style instance that is equal to `style`.
+    Many runs in a document have the same style, so this saves a dict for
+    every run.
+
+    >>> style1 = internStyle(dict(font='Georgia', fontSize=12))
+    >>> style2 = internStyle(dict(fontSize=12, font='Georgia'))
+    >>> style1 is style2, style1 == dict(font='Georgia', fontSize=12)
+    (True, True)
+    >>> internStyle(style1) is style1
+    True
+    >>> STYLE_IDS[style1.id] is style1
+    True
+    >>> style = dict(font='Georgia')
+    >>> style1 = internStyle(style)
+    >>> style['font'] = 'Verdana' # Changed after interning
+    >>> internStyle(style)['font']
+    'Verdana'
+    """
+    if style.__class__ is Style:
+        return style
+    recent = INTERNED_DICTS.get(id(style))
+    # The dict may have changed after it was interned.
+    if recent is not None and recent[0] is style and recent[1] == style:
+        return recent[1]
+    key = getStyleKey(style)
+    interned = STYLES.get(key)
+    if interned is None:
+        STYLES[key] = interned = Style(style)
+        interned.key = key
+        interned.id = len(STYLE_IDS)
+        interned.compiled = {}
+        STYLE_IDS.append(interned)
+    if len(INTERNED_DICTS) >= INTERNED_DICTS_SIZE:
+        INTERNED_DICTS.clear()
+    INTERNED_DICTS[id(style)] = style, interned # Keep style, so its id is not reused.
+    return interned
+
+class Style(dict):
+    """Immutable style dict, as shared between runs by internStyle. To change
+    a style, make a copy and intern it again. A copy is a normal dict.
+
+    >>> style = internStyle(dict(font='Georgia'))
+    >>> style['font'] = 'Verdana'
+    Traceback (most recent call last):
+        ...
+    TypeError: Style is immutable, change a copy instead.
+    >>> style2 = copy(style)
+    >>> style2['font'] = 'Verdana'
+    >>> style2
+    {'font': 'Verdana'}
+    >>> internStyle(style2).id != style.id
+    True
+    """
+    # Hashable key of the items, as answered by getStyleKey, the unique id 
+    # of the style in this process and the {name: compiledStyle} dictionary.
+    __slots__ = ('key', 'id', 'compiled')
+
+    def _immutable(self, *args, **kwargs):
+        raise TypeError('%s is immutable, change a copy instead.' % self.__class__.__name__)
+    __setitem__ = __delitem__ = clear = pop = popitem = setdefault = update = _immutable
+
+    def __copy__(self):
+        return dict(self)
+
+    def __deepcopy__(self, memo):
+        return deepcopy(dict(self), memo)
+
+    def __reduce__(self):
+        # Styles are interned again after unpickling, e.g. in worker processes.
+        # The id can be different there.
+        return internStyle, (dict(self),)
+
+    def getCompiled(self, name, compile):
+        """Answer the result of compile(self), e.g. the attributes of the style
+        in the format of a context. It is computed once for each style and
+        `name`, as the style cannot change.
+
+        >>> style = internStyle(dict(font='Georgia', fontSize=12))
+        >>> calls = []
+        >>> def compile(style):
+        ...     calls.append(style.id)
+        ...     return dict(size=style['fontSize'])
+        >>> style.getCompiled('test', compile), style.getCompiled('test', compile)
+        ({'size': 12}, {'size': 12})
+        >>> len(calls)
+        1
+        """
+        compiled = self.compiled.get(name)
+        if compiled is None:
+            self.compiled[name] = compiled = compile(self)
+        return compiled
+
 class BabelRun:
-    """Holds a plain string with a style.
+    """Holds a plain string with a style. The style is interned, so runs
+    with equal styles share the same immutable Style instance.
+    Appended strings are kept as list of chunks, that are joined once when
+    the string is used, so appending many strings to a run is linear.
+
+    >>> br = BabelRun('Hello', dict(font='Georgia'))
+    >>> for c in ' world':
+    ...     br.append(c)
+    >>> len(br._chunks)
+    7
+    >>> br.s, br._chunks
+    ('Hello world', None)
     """
+    __slots__ = ('_s', '_chunks', '_style') # No __dict__, as there can be many runs.
+
     def __init__(self, s, style):
-        self.s = s # Property that clear the native cache components of a string.
+        self.s = s # Plain string of the run.
         self.style = style
 
+    def _get_s(self):
+        if self._chunks is not None:
+            self._s = ''.join(self._chunks)
+            self._chunks = None
+        return self._s
+    def _set_s(self, s):
+        self._s = s
+        self._chunks = None # List of strings, if appended since last join.
+    s = property(_get_s, _set_s)
+
+    def append(self, s):
+        """Append string `s` to the chunks of self."""
+        if self._chunks is None:
+            self._chunks = [self._s]
+        self._chunks.append(s)
+
+    def _get_style(self):
+        return self._style
+    def _set_style(self, style):
+        self._style = internStyle(style)
+    style = property(_get_style, _set_style)
+
+    def __getstate__(self):
+        return self.s, self._style
+
+    def __setstate__(self, state):
+        self.s, self.style = state
+
     def copy(self):
-        """Answer a copy of self, where also the style is copied.
+        """Answer a copy of self. The immutable style is shared.
 
         >>> br = BabelRun('Hello world', dict(font='Georgia'))
         >>> br2 = br.copy()
         >>> br.s == br2.s and br.style == br2.style # Copy is equal
         True
-        >>> br.style is not br2.style
+        >>> br.style is br2.style
         True
         >>> br
         <BabelRun s=Hello world>
         """
-        return self.__class__(self.s, copy(self.style))
+        return self.__class__(self.s, self._style)
 
     def __repr__(self):
         return '<%s s=%s>' % (self.__class__.__name__, self.s[:20])
@@ -93,6 +303,110 @@ class Css:
             css += '};\n'
         return css
 
+class StyleSheet:
+    """Compiles the styles of the runs in a document (e.g. a website) into one
+    stylesheet. Styles are interned, so each distinct style is compiled once,
+    by its id. Styles with the same tag, name and CSS declarations share
+    one class. The class names are made from the name (or tag) and a hash
+    of the content, so they are stable between builds and processes.
+
+    >>> sheet = StyleSheet()
+    >>> bs = BabelString('Hello ', dict(font='Georgia', fontSize=12, tag='p', name='body'))
+    >>> bs.append('world', dict(font='Georgia', fontSize=12, tag='p', name='body', hyphenation=True))
+    >>> bs.append('!', dict(font='Georgia-Bold', fontSize=12, tag='b'))
+    >>> bs.getHtml(sheet)
+    '<p class="body-5505e9">Hello</p><p class="body-5505e9">world</p><b class="b-9fecf0">!</b>'
+    >>> len(sheet) # Hyphenation has no CSS, both runs share the same class.
+    2
+    >>> print(sheet.asString())
+    .body-5505e9 {font-family: Georgia; font-size: 12pt;}
+    .b-9fecf0 {font-family: Georgia-Bold; font-size: 12pt;}
+    <BLANKLINE>
+    """
+    def __init__(self):
+        self.classNames = {} # Style.id --> class name
+        self.tags = {} # Style.id --> (openTag, closeTag)
+        self.rules = {} # Class name --> declarations, in order of first use.
+
+    def __repr__(self):
+        return '<%s rules=%d>' % (self.__class__.__name__, len(self))
+
+    def __len__(self):
+        return len(self.rules)
+
+    def getDeclarations(self, style):
+        """Answer the sorted tuple of (cssName, cssValue) for the CSS_ATTRIBUTES
+        in `style`. Colors and units are converted to CSS values.
+
+        >>> from pagebotnano.toolbox.color import color
+        >>> StyleSheet().getDeclarations(dict(font='Georgia', fill=color(1, 0, 0), fontSize=12))
+        (('background-color', '#FF0000'), ('font-family', 'Georgia'), ('font-size', '12pt'))
+        """
+        declarations = []
+        for name, value in style.items():
+            cssName = CSS_ATTRIBUTES.get(name)
+            if cssName is None:
+                continue
+            if isinstance(value, Color):
+                value = value.css
+            elif isinstance(value, (int, float, Unit)):
+                value = '%spt' % upt(value)
+            declarations.append((cssName, str(value)))
+        return tuple(sorted(declarations))
+
+    def getClassName(self, style):
+        """Answer the class name of the interned `style`, adding a rule to the
+        stylesheet if it is new. If another rule already has the class name
+        (the digest prefix is the same), then the digest is lengthened, so 
+        each style keeps its own rule.
+
+        >>> sheet = StyleSheet()
+        >>> style = dict(font='Georgia', fontSize=12, tag='p', name='body')
+        >>> sheet.rules['body-5505e9'] = (('color', 'red'),) # Same name, other rule
+        >>> sheet.getClassName(style)
+        'body-5505e946'
+        >>> sheet.rules['body-5505e946']
+        (('font-family', 'Georgia'), ('font-size', '12pt'))
+        """
+        style = internStyle(style)
+        className = self.classNames.get(style.id)
+        if className is None:
+            tag = style.get('tag', 'span')
+            name = style.get('name')
+            declarations = self.getDeclarations(style)
+            digest = hashlib.md5(repr((tag, name, declarations)).encode('utf-8')).hexdigest()
+            prefix = re.sub('[^A-Za-z0-9_-]', '', str(name or tag))
+            size = 6
+            className = '%s-%s' % (prefix, digest[:size])
+            while self.rules.get(className, declarations) != declarations:
+                size += 2 # Collision with another rule, lengthen the digest.
+                if size <= len(digest):
+                    className = '%s-%s' % (prefix, digest[:size])
+                else: # Full digest collides too, add a suffix.
+                    className = '%s-%s-%d' % (prefix, digest, size)
+            self.rules[className] = declarations
+            self.classNames[style.id] = className
+        return className
+
+    def getTags(self, style):
+        """Answer the (openTag, closeTag) tuple of html tags for `style`, 
+        referring to its class in the stylesheet.
+        """
+        style = internStyle(style)
+        tags = self.tags.get(style.id)
+        if tags is None:
+            tag = style.get('tag', 'span')
+            self.tags[style.id] = tags = ('<%s class="%s">' % (tag, self.getClassName(style)), 
+                '</%s>' % tag)
+        return tags
+
+    def asString(self):
+        """Answer the stylesheet as CSS, one rule for each class."""
+        css = []
+        for className, declarations in self.rules.items():
+            css.append('.%s {%s}\n' % (className, ' '.join(['%s: %s;' % item for item in declarations])))
+        return ''.join(css)
+
 class BabelString:
     """The BabelString is a wrapper around native string formats, such as
     DrawBot.FormattedString. While supporting the full API (=interface)
@@ -113,6 +427,10 @@ class BabelString:
     >>> bs.fs, bs.fs.__class__.__name__ # New DrawBot.FormattedString created.
     (Hello worlds and other planets, 'FormattedString')
     """
+    # WeakSet of the elements that show self, made by self._addOwner. They 
+    # are set dirty when self changes, so they are built again.
+    _owners = None
+
     def __init__(self, s=None, style=None, **kwargs):
         if s is None:
             s = ''
@@ -124,12 +442,214 @@ class BabelString:
         for name, value in kwargs.items():
             style[name] = value
         self.runs = [] # List of BabelRun instances.
-        self.append(s, style)
+        self._lastRunShared = False # True if the last run can be shared with another BabelString.
         self.reset() # Initialize storage of native cached formatted strings 
+        self._offsets = [0] # Prefix sums of the run lengths, updated by self.append
+        self.append(s, style)
 
     def __repr__(self):
         return '<%s runs=%d>' % (self.__class__.__name__, len(self.runs))
 
+    def __len__(self):
+        """Answer the total amount of characters in all runs.
+
+        >>> bs = BabelString('Hello', dict(font='Georgia'))
+        >>> bs.append(' world', dict(font='Georgia-Bold'))
+        >>> len(bs)
+        11
+        """
+        return self.offsets[-1]
+
+    def _get_offsets(self):
+        """Answer the list of prefix sums of the run lengths: the offset where
+        each run starts, followed by the total length. The list is updated by 
+        self.append. If self.runs is altered otherwise, then self.reset()
+        must be called to build it again.
+
+        >>> bs = BabelString('Hello', dict(font='Georgia'))
+        >>> bs.append(' world', dict(font='Georgia-Bold'))
+        >>> bs.offsets
+        [0, 5, 11]
+        """
+        if self._offsets is None:
+            offsets = [0]
+            total = 0
+            for run in self.runs:
+                total += len(run.s)
+                offsets.append(total)
+            self._offsets = offsets
+        return self._offsets
+    offsets = property(_get_offsets)
+
+    def getRunIndex(self, offset):
+        """Answer the tuple (runIndex, runOffset) of the run that contains
+        character `offset` and the offset in that run, as binary search in
+        the prefix sums of the run lengths. An offset at the end of self
+        answers the end of the last run.
+
+        >>> bs = BabelString('Hello ', dict(font='Georgia'))
+        >>> bs.append('world', dict(font='Georgia-Bold'))
+        >>> bs.getRunIndex(0), bs.getRunIndex(8), bs.getRunIndex(11)
+        ((0, 0), (1, 2), (1, 5))
+        """
+        offsets = self.offsets
+        runIndex = min(bisect_right(offsets, offset) - 1, len(self.runs) - 1)
+        return runIndex, offset - offsets[runIndex]
+
+    def _get_key(self):
+        """Answer a hashable key of the content of self, containing the strings 
+        and styles of all runs. Equal keys guarantee equal typesetting, so it
+        can be used by contexts to cache measurements.
+
+        >>> bs1 = BabelString('Hello world', dict(font='Georgia', fontSize=12))
+        >>> bs2 = BabelString('Hello world', dict(fontSize=12, font='Georgia'))
+        >>> bs1.key == bs2.key
+        True
+        >>> bs2.append('!', dict(font='Georgia-Bold'))
+        >>> bs1.key == bs2.key
+        False
+        """
+        return tuple([(run.s, run.style.key) for run in self.runs])
+    key = property(_get_key)
+
+    def __getitem__(self, index):
+        """Answer a new BabelString with the characters of `index`, which is an
+        integer or a slice (without step). The runs are found by binary search
+        in the prefix sums of the run lengths. Runs that are completely inside
+        the slice are shared, not copied. They are copied when the last run is 
+        appended to (copy on write), so the text of long strings is not copied 
+        by slicing.
+
+        >>> bs = BabelString('Hello ', dict(font='Georgia'))
+        >>> bs.append('world', dict(font='Georgia-Bold'))
+        >>> bs.append(' and planets', dict(font='Georgia'))
+        >>> bs[3:14].runs
+        [<BabelRun s=lo >, <BabelRun s=world>, <BabelRun s= an>]
+        >>> bs[3:14].runs[1] is bs.runs[1] # Shared run
+        True
+        >>> bs[-7:].runs, bs[4].runs
+        ([<BabelRun s=planets>], [<BabelRun s=o>])
+        >>> tail = bs[6:]
+        >>> tail.append('!') # Copy on write, bs is not changed
+        >>> tail.runs[-1].s, bs.runs[-1].s
+        (' and planets!', ' and planets')
+        """
+        length = len(self)
+        if isinstance(index, slice):
+            start, stop, step = index.indices(length)
+            if step != 1:
+                raise ValueError('%s slice step must be 1' % self.__class__.__name__)
+        else:
+            if index < 0:
+                index += length
+            if not 0 <= index < length:
+                raise IndexError('%s index out of range' % self.__class__.__name__)
+            start, stop = index, index + 1
+        if stop <= start:
+            return self._fromRuns([])
+        offsets = self.offsets
+        if start == 0 and stop == length:
+            runs = list(self.runs)
+            runOffsets = list(offsets)
+        else:
+            startIndex, startOffset = self.getRunIndex(start)
+            stopIndex, stopOffset = self.getRunIndex(stop)
+            first = self.runs[startIndex]
+            if startIndex == stopIndex:
+                if startOffset or stopOffset < len(first.s):
+                    first = BabelRun(first.s[startOffset:stopOffset], first.style)
+                runs = [first]
+            else:
+                if startOffset:
+                    first = BabelRun(first.s[startOffset:], first.style)
+                runs = [first] + self.runs[startIndex+1:stopIndex]
+                last = self.runs[stopIndex]
+                if stopOffset: # Otherwise the slice stops on the border of runs.
+                    if stopOffset < len(last.s):
+                        last = BabelRun(last.s[:stopOffset], last.style)
+                    runs.append(last)
+            # Prefix sums of the slice, derived from the prefix sums of self.
+            runOffsets = [0] + [offset - start for offset in offsets[startIndex+1:startIndex+len(runs)]]
+            runOffsets.append(stop - start)
+        bs = self._fromRuns(runs)
+        bs._offsets = runOffsets
+        # Runs are shared now, copy the last run before appending to it.
+        bs._lastRunShared = self._lastRunShared = True
+        return bs
+
+    def split(self, offset):
+        """Answer a tuple of two new BabelString instances, with the text before 
+        and after character `offset`. The runs keep their style. Runs that are not
+        split are shared, see self.__getitem__.
+
+        >>> bs = BabelString('Hello ', dict(font='Georgia'))
+        >>> bs.append('world', dict(font='Georgia-Bold'))
+        >>> bs1, bs2 = bs.split(8)
+        >>> bs1.runs, bs2.runs
+        ([<BabelRun s=Hello >, <BabelRun s=wo>], [<BabelRun s=rld>])
+        >>> bs2.runs[0].style
+        {'font': 'Georgia-Bold'}
+        >>> bs1, bs2 = bs.split(6) # Split on the border of runs
+        >>> bs1.runs, bs2.runs
+        ([<BabelRun s=Hello >], [<BabelRun s=world>])
+        """
+        offset = max(0, offset)
+        return self[:offset], self[offset:]
+
+    def find(self, text, start=0, end=None):
+        """Answer the lowest offset where `text` is found in self[start:end],
+        or -1 if it is not found. The search starts at the run of `start` and
+        stops at the first match, without joining the text of all runs.
+
+        >>> bs = BabelString('Hello ', dict(font='Georgia'))
+        >>> bs.append('world', dict(font='Georgia-Bold'))
+        >>> bs.append(' and other worlds', dict(font='Georgia'))
+        >>> bs.find('o w'), bs.find('world'), bs.find('world', 7), bs.find('world', 7, 20)
+        (4, 6, 22, -1)
+        """
+        length = len(self)
+        if start < 0:
+            start = max(0, start + length)
+        if end is None:
+            end = length
+        elif end < 0:
+            end = max(0, end + length)
+        else:
+            end = min(end, length)
+        if start > end: # Also for empty text, as str.find
+            return -1
+        if not text:
+            return start
+        runIndex, runOffset = self.getRunIndex(start)
+        offset = start - runOffset # Start of the current run.
+        window = '' # Tail of the preceding runs, for matches across runs.
+        windowOffset = start
+        for run in self.runs[runIndex:]:
+            s = run.s[runOffset:]
+            runOffset = 0
+            window += s
+            index = window.find(text)
+            if index >= 0:
+                found = windowOffset + index
+                return found if found + len(text) <= end else -1
+            offset += len(run.s)
+            if offset >= end:
+                break
+            # Keep the characters that can be the start of a match in the next run.
+            keep = min(len(window), len(text) - 1)
+            windowOffset += len(window) - keep
+            window = window[len(window) - keep:]
+        return -1
+
+    def _fromRuns(self, runs):
+        """Answer a new BabelString of the same class as self, with the list of runs.
+        """
+        bs = self.__class__()
+        if runs: # Otherwise keep the empty run of the new BabelString.
+            bs.runs = runs
+            bs._offsets = None
+        return bs
+
     def __add__(self, s):
         """Add `s` to self. If `s` is another BabelString, then copy all of
         its runs to self.runs. If `s` is a string then append it to the last
@@ -154,7 +674,8 @@ class BabelString:
         """Run through all run.style, untile a setting for hyphenation is found.
         That value is the answered boolean. Unfortunately OSX does not allow
         hyphenation turned on/off per paragraph. Instead the flag works for an 
-        entire TextBox while drawing it. 
+        entire TextBox while drawing it. The LineBreaker (as used by the
+        NullContext) does hyphenate per run, in the `language` of its style.
 
         >>> bs = BabelString('Hello world', hyphenation=True)
         >>> bs.hyphenation
@@ -172,7 +693,11 @@ class BabelString:
         return False
     def _set_hyphenation(self, flag):
         if self.runs:
-            self.runs[0].style['hyphenation'] = flag
+            style = copy(self.runs[0].style)
+            style['hyphenation'] = flag
+            # Make a new run, as the run can be shared with another BabelString.
+            self.runs[0] = BabelRun(self.runs[0].s, style)
+            self.reset() # Style of the first run changed, make new native strings.
     hyphenation = property(_get_hyphenation, _set_hyphenation)
 
     def append(self, bs, style=None):
@@ -193,38 +718,159 @@ class BabelString:
         >>> bs.append(bs2) # Adding another BabelString
         >>> bs 
         <BabelString runs=3>
+        >>> len(bs), bs.offsets
+        (33, [0, 12, 29, 33])
         """
         if isinstance(bs, self.__class__):
             for run in bs.runs:
-                if self.runs[-1].style == run.style:
-                    # Identical style, just add to last run or self
-                    self.runs[-1].s += run.s 
-                else:
-                    self.runs.append(run.copy())
+                self._appendRun(run.s, run.style, run)
+            bs._lastRunShared = True # The runs of bs can be shared with self now.
         else:
-            if style is None or (self.runs and self.runs[-1].style == style):
-                # Undefined style or identical style, just add to last run
-                self.runs[-1].s += str(bs) 
-            else:
-                self.runs.append(BabelRun(str(bs), style))
-        self.reset()
+            self._appendRun(str(bs), style)
+        # The native cached strings are kept, they are extended with the 
+        # appended text when used. See self._getAppended.
+        self._setDirty()
+
+    def _appendRun(self, s, style, run=None):
+        """Append `s` to the last run if the style is undefined or identical. 
+        Otherwise add a new run (`run` of another BabelString is shared, if
+        defined). The prefix sums of the run lengths are updated, instead of 
+        built again.
+        """
+        offsets = self._offsets
+        if style is not None:
+            style = internStyle(style)
+        # Interned styles are equal if they have the same id.
+        if self.runs and (style is None or self.runs[-1].style.id == style.id):
+            # Undefined style or identical style, just add to last run
+            if self._lastRunShared: # Copy on write
+                self.runs[-1] = self.runs[-1].copy()
+                self._lastRunShared = False
+            self.runs[-1].append(s)
+            if offsets is not None:
+                offsets[-1] += len(s)
+        else:
+            self.runs.append(run or BabelRun(s, style))
+            self._lastRunShared = run is not None
+            if offsets is not None:
+                offsets.append(offsets[-1] + len(s))
+
+    def __getstate__(self):
+        """Answer the state for pickling, e.g. to send pages to a worker process.
+        The native cached strings cannot be pickled, they are created again
+        when needed.
+
+        >>> import pickle
+        >>> bs = BabelString('Hello world', dict(font='Georgia'))
+        >>> fs = bs.fs # Create the cached DrawBot.FormattedString
+        >>> bs2 = pickle.loads(pickle.dumps(bs))
+        >>> bs2.runs, bs2._fs is None
+        ([<BabelRun s=Hello world>], True)
+        """
+        state = self.__dict__.copy()
+        state['_fs'] = state['_html'] = state['_htmlHead'] = state['_css'] = None
+        state.pop('_owners', None) # Elements add themselves again.
+        return state
+
+    def _addOwner(self, e):
+        """Add the element `e` that shows self, so `e` is set dirty when self
+        changes. Called by Element when self is set as attribute.
+
+        >>> from pagebotnano.elements import Text
+        >>> e = Text(BabelString('Hello', dict(font='Georgia')))
+        >>> e.setClean()
+        >>> e.bs.append(' world')
+        >>> e.isDirty
+        True
+        """
+        if self._owners is None:
+            self._owners = weakref.WeakSet()
+        self._owners.add(e)
+
+    def _setDirty(self):
+        """Set the elements that show self dirty, as self changed."""
+        if self._owners:
+            for e in self._owners:
+                e.setDirty()
 
     def reset(self):
+        """Clear the cached native strings and the prefix sums of the run 
+        lengths, e.g. after the runs have been altered directly. Appending 
+        does not need a reset, the caches are extended instead.
+        """
         self._fs = None # Storage of DrawBot.FormattedString
+        self._fsDone = 0, 0 # (Number of runs, length of last run) in self._fs
         self._html = None # Storage of html string representation.
+        self._htmlHead = None # Html of the runs in self._html, except the last.
+        self._htmlDone = 0, 0 # (Number of runs, length of last run) in self._html
         self._css = None # Storage Css instance.
+        self._cssDone = 0 # Number of run styles in self._css
+        self._offsets = None # Prefix sums of the run lengths, built when needed.
+        self._setDirty() # Runs may have been altered.
+
+    def _getAppended(self, done):
+        """Answer the list of (run, s) with the text that was appended after a
+        native cached string was made from `done`, the tuple of (number of 
+        runs, length of the last run) at that time.
+
+        >>> bs = BabelString('Hello', dict(font='Georgia'))
+        >>> done = len(bs.runs), len(bs.runs[-1].s)
+        >>> bs.append(' world')
+        >>> bs.append('!', dict(font='Georgia-Bold'))
+        >>> bs._getAppended(done)
+        [(<BabelRun s=Hello world>, ' world'), (<BabelRun s=!>, '!')]
+        """
+        runCount, runLength = done
+        runs = self.runs
+        appended = []
+        if runCount:
+            run = runs[runCount-1]
+            if len(run.s) > runLength:
+                appended.append((run, run.s[runLength:]))
+        for run in runs[runCount:]:
+            appended.append((run, run.s))
+        return appended
+
+    def _getDone(self):
+        """Answer the (number of runs, length of the last run) tuple of self."""
+        if not self.runs:
+            return 0, 0
+        return len(self.runs), len(self.runs[-1].s)
 
     def _get_textSize(self):
-        return drawBot.textSize(self.fs)
+        return self.getTextSize()
     textSize = property(_get_textSize)
 
-    def getTextSize(self, w=None):
-        return drawBot.textSize(self.fs, w=w)
+    def getTextSize(self, w=None, h=None, context=None):
+        """Answer the (w, h) size of self, measured by `context`. If the context
+        is undefined, then the default context is used. The size is cached by
+        the context.
+
+        >>> from pagebotnano.contexts.null.context import NullContext
+        >>> bs = BabelString('Hello world', dict(font='PageBot-Regular', fontSize=10, lineHeight=14))
+        >>> bs.getTextSize(w=30, context=NullContext())[1]
+        28
+        """
+        if context is None:
+            context = getDefaultContext()
+        return context.textSize(self, w=w, h=h)
         
     def _getFSStyle(self, style):
         """Answer a style dict that only contains names that are allowed 
-        in the DrawBot.FormattedString attributes.
+        in the DrawBot.FormattedString attributes. It is compiled once for 
+        each interned style.
+
+        >>> from pagebotnano.toolbox.color import color
+        >>> bs = BabelString()
+        >>> style = internStyle(dict(font='Georgia', textFill=color(1, 0, 0), fill=color(0)))
+        >>> bs._getFSStyle(style)
+        {'font': 'Georgia', 'fill': (0, 0, 0)}
+        >>> bs._getFSStyle(style) is bs._getFSStyle(style)
+        True
         """
+        return internStyle(style).getCompiled('fs', self._compileFSStyle)
+
+    def _compileFSStyle(self, style):
         fsStyle = {}
         for name, value in style.items(): # Only copy what is allowed in FS
             if name in FS_ATTRIBUTES:
@@ -241,21 +887,31 @@ class BabelString:
         >>> bs = BabelString('Hello world', dict(font='Georgia'))
         >>> bs.fs, isinstance(bs.fs, drawBot.FormattedString().__class__)
         (Hello world, True)
+        >>> fs = bs.fs
+        >>> bs.append(' and planets', dict(font='Georgia-Bold'))
+        >>> bs.fs, bs.fs is fs # Appended runs extend the cached string.
+        (Hello world and planets, True)
         """
         if self._fs is None:
-            self._fs = fs = drawBot.FormattedString()
-            for run in self.runs:
-                fsStyle = self._getFSStyle(run.style)
-                fs.append(drawBot.FormattedString(run.s, **fsStyle))
+            self._fs = drawBot.FormattedString()
+            self._fsDone = 0, 0
+        if self._fsDone != self._getDone():
+            fs = self._fs
+            for run, s in self._getAppended(self._fsDone):
+                if s:
+                    fs.append(drawBot.FormattedString(s, **self._getFSStyle(run.style)))
+            self._fsDone = self._getDone()
         return self._fs
     def _set_fs(self, fs):
-        """In case of DrawBot.textBox a DrawBot.FormattedString is answered.
-        An “incomplete” BabelString is constructed by the DrawBotContext,
-        because we cannot reconstruct the source of the string. But the 
-        DrawBot.FormattedString can still be used for placement in Text
-        and TextBox when doc.context is a DrawBotContext.
+        """Set a DrawBot.FormattedString that was made otherwise. Then self is
+        “incomplete”, as the source of the string cannot be reconstructed. 
+        But the DrawBot.FormattedString can still be used for placement in 
+        Text and TextBox when doc.context is a DrawBotContext. (The overflow 
+        of DrawBotContext.textBox is a slice of the source BabelString.)
         """
         self._fs = fs
+        self._fsDone = self._getDone() # Text that is appended later is added to fs.
+        self._setDirty()
     fs = property(_get_fs, _set_fs)
 
     def _get_html(self):
@@ -269,26 +925,62 @@ class BabelString:
         >>> bs = BabelString('Hello world', dict(name='top'))
         >>> bs.html # Default tag name is <span>
         '<span class="top">Hello world</span>'
+        >>> bs.append(' and planets') # Only the html of the last run is made again.
+        >>> bs.append('!', dict(tag='b'))
+        >>> bs.html
+        '<span class="top">Hello world and planets</span><b>!</b>'
         """
         if self._html is None:
-            tags = []
-            self._html = ''
-            for run in self.runs:
-                if not run.s:
-                    continue
-                tag = None
-                if 'tag' in run.style:
-                    tag = run.style['tag']
-                else:
-                    tag = 'span'
-                self._html += '<' + tag
-                if 'name' in run.style:
-                    self._html += ' class="%s"' % run.style['name']
-                self._html += '>%s</%s>' % (run.s.strip(), tag)
-
+            self._html = self._htmlHead = ''
+            self._htmlDone = 0, 0
+        done = self._getDone()
+        if self._htmlDone != done:
+            # The html of the last run changes if text was appended to it.
+            html = [self._htmlHead]
+            for run in self.runs[max(0, self._htmlDone[0] - 1):-1]:
+                html.append(self._getRunHtml(run))
+            self._htmlHead = ''.join(html)
+            self._html = self._htmlHead + self._getRunHtml(self.runs[-1])
+            self._htmlDone = done
         return self._html
     html = property(_get_html)
 
+    def getHtml(self, styleSheet=None):
+        """Answer the html of self. If `styleSheet` is defined, then the runs
+        refer to its class names, otherwise self.html is answered. See 
+        StyleSheet for an example.
+        """
+        if styleSheet is None:
+            return self.html
+        html = []
+        for run in self.runs:
+            if run.s:
+                openTag, closeTag = styleSheet.getTags(run.style)
+                html.append(openTag + run.s.strip() + closeTag)
+        return ''.join(html)
+
+    def _getRunHtml(self, run):
+        """Answer the html of `run`.
+
+        >>> BabelString()._getRunHtml(BabelRun('Hello ', dict(tag='p', name='first')))
+        '<p class="first">Hello</p>'
+        """
+        if not run.s:
+            return ''
+        openTag, closeTag = run.style.getCompiled('html', self._compileHtmlStyle)
+        return openTag + run.s.strip() + closeTag
+
+    def _compileHtmlStyle(self, style):
+        """Answer the (openTag, closeTag) tuple of html tags for `style`."""
+        if 'tag' in style:
+            tag = style['tag']
+        else:
+            tag = 'span'
+        openTag = '<' + tag
+        if 'name' in style:
+            openTag += ' class="%s"' % style['name']
+        return openTag + '>', '</%s>' % tag
+
     def _get_css(self):
         """Property that creates a new Css instance of self,
         from the current set of runs, if the cached value self._html
@@ -299,11 +991,17 @@ class BabelString:
         <Css style=1>
         >>> bs.css.asString(compact=True)
         'h1.top {font:Georgia;fontSize:24;};\\n'
+        >>> css = bs.css
+        >>> bs.append(' and planets', dict(font='Georgia', tag='p'))
+        >>> bs.css is css, len(css.styles) # Style of the new run is added.
+        (True, 2)
         """
         if self._css is None:
             self._css = Css()
-            for run in self.runs:
-                self._css.append(run.style)
+            self._cssDone = 0
+        for run in self.runs[self._cssDone:]:
+            self._css.append(run.style)
+        self._cssDone = len(self.runs)
         return self._css
     css = property(_get_css)
 
@@ -15,7 +15,6 @@
 #
 import sys
 sys.path.insert(0, "../") # So we can import pagebotnano without installing.
-import drawBot
 
 from pagebotnano.toolbox.units import pt, mm
 
@@ -11,3 +11,34 @@
 #   Supporting DrawBot, www.drawbot.com
 # -----------------------------------------------------------------------------
 #
+import sys
+
+if __name__ == "__main__":
+    sys.path.insert(0, "../..") # So we can import pagebotnano without installing.
+
+# Context that measures text and images outside a Document, made on first use.
+DEFAULT_CONTEXT = None
+
+def getDefaultContext():
+    """Answer the shared default context, for measuring outside a Document 
+    (e.g. BabelString.textSize). This is a DrawBotContext, or a NullContext 
+    if DrawBot is not installed.
+
+    >>> getDefaultContext() is getDefaultContext()
+    True
+    """
+    global DEFAULT_CONTEXT
+    if DEFAULT_CONTEXT is None:
+        # Import here, as the contexts import BabelString, which imports this module.
+        try:
+            from pagebotnano.contexts.drawbot.context import DrawBotContext
+            DEFAULT_CONTEXT = DrawBotContext()
+        except ImportError: # No DrawBot (e.g. on Linux), measure from the font files.
+            from pagebotnano.contexts.null.context import NullContext
+            DEFAULT_CONTEXT = NullContext()
+    return DEFAULT_CONTEXT
+
+if __name__ == "__main__":
+    # Running this document will execute all >>> comments as test of this source.
+    import doctest
+    doctest.testmod()[0]
@@ -11,8 +11,140 @@
 #   Supporting DrawBot, www.drawbot.com
 # -----------------------------------------------------------------------------
 #
+from collections import OrderedDict
+import sys
+sys.path.insert(0, "../..") # So we can import pagebotnano without installing.
+
+from pagebotnano.toolbox.units import upt # Converts units to points.
+
+# Default maximum number of measurements in the MeasureCache.
+MEASURE_CACHE_SIZE = 10000
+
+def getMeasure(v):
+    """Answer `v` in points as part of a cache key, as Units are not hashable.
+    None stays None, as it means unconstrained.
+
+    >>> from pagebotnano.toolbox.units import mm
+    >>> getMeasure(mm(10)), getMeasure(None), getMeasure(0)
+    (28.346472, None, 0)
+    """
+    if v is None:
+        return None
+    return upt(v)
+
+class MeasureCache:
+    """Content-addressed cache of text measurements, such as text sizes and
+    text lines. The keys contain the run texts and interned styles (bs.key) and
+    the width/height constraints. If the cache is full, then the least recently 
+    used measurement is removed. Hits and misses are counted.
+
+    >>> cache = MeasureCache(maxSize=2)
+    >>> cache.get('a') is None
+    True
+    >>> cache['a'] = 1
+    >>> cache['b'] = 2
+    >>> cache.get('a') # Now 'b' is the least recently used.
+    1
+    >>> cache['c'] = 3
+    >>> 'b' in cache, len(cache)
+    (False, 2)
+    >>> stats = cache.getStats()
+    >>> stats['hits'], stats['misses'], stats['evictions'], stats['hitRate']
+    (1, 1, 1, 0.5)
+    """
+    def __init__(self, maxSize=MEASURE_CACHE_SIZE):
+        self.maxSize = maxSize
+        self.measures = OrderedDict() # Key --> measurement, least recently used first.
+        self.reset()
+
+    def __repr__(self):
+        return '<%s size=%d hits=%d misses=%d>' % (self.__class__.__name__, 
+            len(self), self.hits, self.misses)
+
+    def __len__(self):
+        return len(self.measures)
+
+    def __contains__(self, key):
+        return key in self.measures
+
+    def reset(self):
+        """Remove all measurements and set the statistics to zero."""
+        self.measures.clear()
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, key, default=None):
+        """Answer the measurement of `key` and mark it as recently used.
+        Answer `default` if it is not in the cache.
+        """
+        measure = self.measures.get(key)
+        if measure is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self.measures.move_to_end(key)
+        return measure
+
+    def __setitem__(self, key, measure):
+        self.measures[key] = measure
+        self.measures.move_to_end(key)
+        while len(self.measures) > self.maxSize:
+            self.measures.popitem(last=False)
+            self.evictions += 1
+
+    def getStats(self):
+        """Answer the dictionary with the hit/miss statistics of the cache."""
+        lookups = self.hits + self.misses
+        return dict(hits=self.hits, misses=self.misses, evictions=self.evictions,
+            size=len(self), maxSize=self.maxSize, 
+            hitRate=self.hits/lookups if lookups else None)
+
+def newContext(config):
+    """Answer a new context, made from the picklable `config` tuple
+    (contextClass, kwargs) that BaseContext.getConfig answered. Worker
+    processes use it to make a context with the same configuration.
+
+    >>> from pagebotnano.contexts.null.context import NullContext
+    >>> context = newContext(NullContext(fallbackFont='PageBot-Bold').getConfig())
+    >>> context.__class__.__name__, context.fallbackFont
+    ('NullContext', 'PageBot-Bold')
+    """
+    contextClass, kwargs = config
+    return contextClass.fromConfig(**kwargs)
+
 class BaseContext:
 
+    # File extension of the parts that worker processes save for 
+    # Document.build(workers=N). None if the context cannot merge parts.
+    PART_EXTENSION = None
+
+    # True if the context answers the output of pages by getPageOutput, so the
+    # document caches it by the content hash of the page.
+    SUPPORTS_PAGE_OUTPUT = False
+
+    # Cache of text measurements, shared by all contexts, as measuring does not
+    # depend on the canvas. The keys start with self.measureId.
+    MEASURES = MeasureCache()
+
+    def _get_measureId(self):
+        """Answer the identifier of the way self measures text, as first part
+        of the keys in self.MEASURES. Contexts that measure differently per 
+        instance (e.g. with other fonts) need to redefine this.
+        """
+        return self.__class__.__name__
+    measureId = property(_get_measureId)
+
+    def getConfig(self):
+        """Answer the picklable tuple (contextClass, kwargs), from which newContext
+        makes a context with the configuration of self. Contexts with arguments
+        of their constructor need to redefine this.
+        """
+        return self.__class__, {}
+
+    @classmethod
+    def fromConfig(cls, **kwargs):
+        """Answer a new context, made from the kwargs of self.getConfig."""
+        return cls(**kwargs)
+
     def newDocument(self, w=None, h=None, doc=None):
         raise NotImplementedError
 
@@ -25,6 +157,12 @@ class BaseContext:
     def saveImage(self, path, multiPage=True):
         raise NotImplementedError
 
+    def mergeParts(self, partPaths, path, multiPage=True):
+        """Merge the files of `partPaths`, as saved by worker processes
+        in page order, into a single export at `path`.
+        """
+        raise NotImplementedError
+
     def fill(self, c):
         raise NotImplementedError
         
@@ -59,11 +197,72 @@ class BaseContext:
         raise NotImplementedError
 
     def textSize(self, bs, w=None, h=None):
+        """Answer the (w, h) size of `bs`, constrained by width `w` or height 
+        `h` if defined. The result is cached in self.MEASURES, so measuring the
+        same string with the same constraints is only paid once.
+        """
+        key = self.measureId, 'textSize', bs.key, getMeasure(w), getMeasure(h)
+        size = self.MEASURES.get(key)
+        if size is None:
+            self.MEASURES[key] = size = self._textSize(bs, w=w, h=h)
+        return size
+
+    def _textSize(self, bs, w=None, h=None):
+        """Answer the measured (w, h) size of `bs`. To be implemented by
+        inheriting context classes.
+        """
         raise NotImplementedError
 
     def hyphenation(self, flag):
         raise NotImplementedError
 
+    def getPageOutput(self):
+        """Answer the output of the page that was built last, so the document
+        can cache it by the content hash of the page. Answer None if this context
+        cannot reuse the output of pages.
+        """
+        return None
+
+    def addPageOutput(self, output):
+        """Add the cached `output` of a page, as answered by self.getPageOutput,
+        instead of building the page again.
+        """
+        raise NotImplementedError
+
+    def getTextLines(self, bs, w):
+        """Answer the list of (offset, depth) tuples for all lines when `bs` is
+        wrapped in a column of width `w`. The `offset` is the character index in 
+        `bs` where the line starts, `depth` is the distance from the top of the 
+        column to the bottom of the line. The result is cached in self.MEASURES, 
+        so trying many heights on the same string and width is only paid once.
+        """
+        key = self.measureId, 'textLines', bs.key, getMeasure(w)
+        lines = self.MEASURES.get(key)
+        if lines is None:
+            self.MEASURES[key] = lines = self._getTextLines(bs, w)
+        return lines
+
+    def _getTextLines(self, bs, w):
+        """Answer the list of (offset, depth) lines of `bs` in width `w`.
+        To be implemented by inheriting context classes.
+        """
+        raise NotImplementedError
+
+    def fitText(self, bs, w, h):
+        """Answer the tuple (fitted, overflow) of BabelString instances, where 
+        `fitted` is the part of `bs` that fits in a text box of (w, h) and
+        `overflow` is the remainder. Nothing is drawn on the canvas.
+        If `h` is None, then all text fits.
+        """
+        offset = len(bs)
+        if h is not None:
+            h = upt(h) # Depths of the lines are in points.
+            for lineOffset, depth in self.getTextLines(bs, w):
+                if depth > h:
+                    offset = lineOffset
+                    break
+        return bs.split(offset)
+
 if __name__ == "__main__":
     # Running this document will execute all >>> comments as test of this source.
     import doctest
@@ -23,6 +23,8 @@ from pagebotnano.toolbox.units import upt # Convers units to points.
 from pagebotnano.contexts.basecontext import BaseContext
 
 class DrawBotContext(BaseContext):
+
+    PART_EXTENSION = 'pdf' # Worker processes save their pages as PDF
     
     def newDocument(self, w=None, h=None, doc=None):
         pass
@@ -44,6 +46,19 @@ class DrawBotContext(BaseContext):
     def saveImage(self, path, multiPage=True):
         drawBot.saveImage(path, multipage=multiPage)
 
+    def mergeParts(self, partPaths, path, multiPage=True):
+        """Place all pages of the PDF files in `partPaths` as new pages
+        of a clean drawing and save it as `path`. The PDF pages are placed 
+        as vector images, so any DrawBot export format can be used.
+        """
+        drawBot.newDrawing()
+        for partPath in partPaths:
+            for pageNumber in range(1, drawBot.numberOfPages(partPath)+1):
+                w, h = drawBot.imageSize(partPath, pageNumber=pageNumber)
+                drawBot.newPage(w, h)
+                drawBot.image(partPath, (0, 0), pageNumber=pageNumber)
+        drawBot.saveImage(path, multipage=multiPage)
+
     def fill(self, c):
         """Set the fill mode of the context. `c` can be None, a number,
         a name or a Color instance. 
@@ -113,14 +128,50 @@ class DrawBotContext(BaseContext):
         drawBot.text(bs.fs, p)
 
     def textBox(self, bs, r):
-        # Set the cache from the overflow, we don't have the source anymore
-        overFlow = BabelString(hyphenation=bs.hyphenation) 
-        overFlow.fs = drawBot.textBox(bs.fs, r) 
-        return overFlow # Return this “incomplete” BabelString.
+        """Draw `bs` in the box `r` and answer the overflow as slice of `bs`, so
+        the runs and their styles are kept.
+        """
+        overflowFs = drawBot.textBox(bs.fs, r)
+        overflow = bs[len(bs) - len(overflowFs):]
+        if bs.hyphenation and not overflow.hyphenation: # Flag is in the first run.
+            overflow.hyphenation = True
+        return overflow
 
-    def textSize(self, bs, w=None, h=None):
+    def _textSize(self, bs, w=None, h=None):
         return drawBot.textSize(bs.fs, width=w, height=h)
 
+    def _getTextLines(self, bs, w):
+        """Answer the list of (offset, depth) lines of `bs` in width `w`,
+        measured from the typesetted character bounds of DrawBot. The text box
+        is only typesetted, nothing is drawn on the canvas.
+
+        >>> from pagebotnano.toolbox.loremipsum import loremipsum
+        >>> context = DrawBotContext()
+        >>> bs = BabelString(loremipsum(), dict(font='Georgia', fontSize=12, lineHeight=14))
+        >>> lines = context.getTextLines(bs, 200)
+        >>> lines[0][0], len(lines) > 1 # First line starts at offset 0
+        (0, True)
+        >>> fitted, overflow = context.fitText(bs, 200, 140)
+        >>> len(fitted) + len(overflow) == len(bs)
+        True
+        """
+        drawBot.hyphenation(bs.hyphenation)
+        fs = bs.fs
+        w = upt(w)
+        _, th = drawBot.textSize(fs, width=w)
+        lines = []
+        offset = 0
+        baseline = None
+        for (x, y, cw, ch), baselineOffset, subString in drawBot.textBoxCharacterBounds(fs, (0, 0, w, th)):
+            runBaseline = y + baselineOffset
+            if baseline is None or runBaseline < baseline - 0.5: # Next line, rounding safe
+                baseline = runBaseline
+                lines.append([offset, th - y])
+            else: # Run on the same line, can be deeper for larger fontSize.
+                lines[-1][1] = max(lines[-1][1], th - y)
+            offset += len(str(subString))
+        return [tuple(line) for line in lines]
+
     def hyphenation(self, flag):
         """Set the hyphenation flag in DrawBot canvas. Note that this only
         works while drawing the TextBox, not when creating the FormattedString.
@@ -15,12 +15,21 @@
 #
 import os
 import codecs
+import shutil
 import sys
 
 if __name__ == "__main__":
-    sys.path.insert(0, "../..") # So we can import pagebotnano without installing.
+    sys.path.insert(0, "../../..") # So we can import pagebotnano without installing.
 
-class HtmlContext:
+from pagebotnano.babelstring import BabelString, StyleSheet
+from pagebotnano.contexts.basecontext import BaseContext
+from pagebotnano.toolbox.color import Color, color
+from pagebotnano.toolbox.units import upt
+
+class HtmlContext(BaseContext):
+
+    PART_EXTENSION = 'html' # Worker processes save their pages in a folder
+    CSS_FILE_NAME = 'style.css' # Stylesheet of all pages, in the same folder.
 
     PAGE = """
 <html>
@@ -46,37 +55,143 @@ class HtmlContext:
         >>> page.addElement(e)
         >>> style = dict(font='Georgia', fontSize=100)
         >>> bs = BabelString('Hello world', style)
-        >>> e = Text(bs, padding, page.h/2, fill=(1, 0, 0))
+        >>> e = Text(bs, x=padding, y=page.h/2, fill=(1, 0, 0))
         >>> page.addElement(e)
         >>> doc.export('_export/HtmlContext-website')
+        >>> context.styleSheet
+        <StyleSheet rules=1>
+        >>> open('_export/HtmlContext-website/style.css').read()
+        '.span-2a319f {font-family: Georgia; font-size: 100pt;}\\n'
         """
         self.newDrawing()
 
+    def newDocument(self, w=None, h=None, doc=None):
+        pass
+
     def newDrawing(self):
         self.pages = []
-        self.css = []
+        self.styleSheet = StyleSheet() # Compiles the styles of all text in the drawing.
         self.style = {}
-        self.newPage() # Set a current page to draw in.
+        self.page = None # Current page, created by self.newPage or the first drawing.
 
-    def newPage(self):
+    def newPage(self, w=None, h=None):
         self.page = page = dict(head='', body='')
         self.pages.append(page)
 
+    def _getBody(self):
+        """Answer the body of the current page, create a new page if there is none.
+        """
+        if self.page is None:
+            self.newPage()
+        return self.page['body']
+
     def stroke(self, stroke, strokeWidth=None):
         if strokeWidth is not None:
             self.style['strokeWidth'] = strokeWidth
         self.style['stroke'] = stroke
 
+    def strokeWidth(self, strokeWidth):
+        self.style['strokeWidth'] = strokeWidth
+
     def fill(self, fill):
         self.style['fill'] = fill
 
+    def _getCss(self, c):
+        """Answer the CSS value of color `c`, or 'none' if it is undefined.
+
+        >>> context = HtmlContext()
+        >>> context._getCss(None), context._getCss((1, 0, 0)), context._getCss(Color(None))
+        ('none', '#FF0000', 'none')
+        """
+        if c is None:
+            return 'none'
+        if not isinstance(c, Color):
+            c = color(c)
+        if c.rgba[0] is None:
+            return 'none'
+        return c.css
+
+    def _getTransform(self):
+        """Answer the style attribute with the current scale, as CSS transform.
+        Answer an empty string if the drawing is not scaled.
+        """
+        sx, sy = self.style.get('scale', (1, 1))
+        if round(sx, 6) == 1 and round(sy, 6) == 1: # E.g. after scale(0.3, 0.3) and scale(1/0.3, 1/0.3)
+            return ''
+        return ' style="transform: scale(%s, %s); transform-origin: 0 0;"' % (sx, sy)
+
+    def _drawSvg(self, w, h, shape, fill):
+        """Add an inline SVG of size (w, h) to the current page, drawing the
+        `shape` tag with `fill` and the current stroke.
+        """
+        self.page['body'] = self._getBody() + ('<svg width="%s" height="%s" overflow="visible"%s>'
+            '<%s fill="%s" stroke="%s" stroke-width="%s"/></svg>' % (w, h, self._getTransform(), 
+            shape, self._getCss(fill), self._getCss(self.style.get('stroke')), 
+            upt(self.style.get('strokeWidth') or 0)))
+
     def rect(self, x, y, w, h):
-        self.page['body'] += '<div width="%d"></div>' % w
+        self.page['body'] = self._getBody() + '<div width="%d"%s></div>' % (w, self._getTransform())
+
+    def oval(self, x, y, w, h):
+        """Draw the oval as inline SVG ellipse.
+
+        >>> context = HtmlContext()
+        >>> context.fill((1, 0, 0))
+        >>> context.oval(10, 10, 100, 50)
+        >>> context.page['body']
+        '<svg width="100" height="50" overflow="visible"><ellipse cx="50.0" cy="25.0" rx="50.0" ry="25.0" fill="#FF0000" stroke="none" stroke-width="0"/></svg>'
+        """
+        w = abs(upt(w))
+        h = abs(upt(h))
+        self._drawSvg(w, h, 'ellipse cx="%s" cy="%s" rx="%s" ry="%s"' % (w/2, h/2, w/2, h/2), 
+            self.style.get('fill'))
+
+    def line(self, p1, p2):
+        """Draw the line as inline SVG, in the box of its points. The y-axis
+        points up, as in the other contexts.
+
+        >>> context = HtmlContext()
+        >>> context.stroke(0, 2)
+        >>> context.line((10, 10), (110, 60))
+        >>> context.page['body']
+        '<svg width="100" height="50" overflow="visible"><line x1="0" y1="50" x2="100" y2="0" fill="none" stroke="#000000" stroke-width="2"/></svg>'
+        """
+        x1, y1 = upt(p1[0]), upt(p1[1])
+        x2, y2 = upt(p2[0]), upt(p2[1])
+        x, y = min(x1, x2), max(y1, y2)
+        self._drawSvg(abs(x2 - x1), abs(y2 - y1), 'line x1="%s" y1="%s" x2="%s" y2="%s"' % (
+            x1 - x, y - y1, x2 - x, y - y2), None)
+
+    def scale(self, sx, sy):
+        """Scale the drawing that follows by (sx, sy), as CSS transform. Scales
+        are multiplied, as on a canvas.
+
+        >>> context = HtmlContext()
+        >>> context.scale(0.5, 0.5)
+        >>> context.image('image.png', (0, 0))
+        >>> context.scale(2, 2)
+        >>> context.image('image.png', (0, 0))
+        >>> context.page['body']
+        '<img src="image.png" style="transform: scale(0.5, 0.5); transform-origin: 0 0;"/><img src="image.png"/>'
+        """
+        scaleX, scaleY = self.style.get('scale', (1, 1))
+        self.style['scale'] = scaleX * sx, scaleY * sy
+
+    def hyphenation(self, flag):
+        pass
+
+    def image(self, path, p):
+        self.page['body'] = self._getBody() + '<img src="%s"%s/>' % (path, self._getTransform())
 
     def text(self, bs, p):
-        self.page['body'] += '<p>%s</p>' % bs.html
+        self.page['body'] = self._getBody() + '<p%s>%s</p>' % (self._getTransform(), bs.getHtml(self.styleSheet))
 
-    def saveImage(self, path, multipage=True):
+    def textBox(self, bs, r):
+        """Text in a browser has no overflow. Answer an empty BabelString."""
+        self.text(bs, r[:2])
+        return BabelString()
+
+    def saveImage(self, path, multiPage=True):
         """Create folder names `path` if it does not already exist.
         """
         if not os.path.exists(path):
@@ -85,15 +200,77 @@ class HtmlContext:
             assert os.path.isdir(path)
         if not path.endswith('/'):
             path += '/'
+        link = '<link rel="stylesheet" href="%s"/>' % self.CSS_FILE_NAME
         for pIndex, page in enumerate(self.pages):
-            if pIndex == 0:
-                fileName = 'index.html'
-            else:
-                fileName = 'page%03d' % pIndex
-            f = codecs.open(path+fileName, mode="w", encoding="utf-8") # Save the XML as unicode.
-            f.write(self.PAGE % page)
+            f = codecs.open(path+self.getPageFileName(pIndex), mode="w", encoding="utf-8") # Save the XML as unicode.
+            f.write(self.PAGE % dict(head=page['head'] + link, body=page['body']))
             f.close()
+        f = codecs.open(path+self.CSS_FILE_NAME, mode="w", encoding="utf-8")
+        f.write(self.styleSheet.asString())
+        f.close()
+
+    def getPageFileName(self, pIndex):
+        """Answer the file name of the page with index `pIndex`.
 
+        >>> context = HtmlContext()
+        >>> context.getPageFileName(0), context.getPageFileName(3)
+        ('index.html', 'page003')
+        """
+        if pIndex == 0:
+            return 'index.html'
+        return 'page%03d' % pIndex
+
+    def mergeParts(self, partPaths, path, multiPage=True):
+        """Copy the pages of the part folders in `partPaths` into the folder
+        `path`, renumbering them in page order. The stylesheets of the parts
+        are merged. Class names are stable, so equal rules are written once.
+        A class name with different rules in the parts cannot be merged.
+
+        >>> import tempfile
+        >>> root = tempfile.mkdtemp()
+        >>> context = HtmlContext()
+        >>> partPaths = []
+        >>> for n, css in enumerate(('.p-aaaaaa {font-size: 12pt;}\\n', '.p-aaaaaa {font-size: 14pt;}\\n')):
+        ...     partPath = os.path.join(root, 'part%d' % n)
+        ...     os.mkdir(partPath)
+        ...     f = open(os.path.join(partPath, context.CSS_FILE_NAME), 'w')
+        ...     _ = f.write(css)
+        ...     f.close()
+        ...     partPaths.append(partPath)
+        >>> context.mergeParts(partPaths[:1] * 2, os.path.join(root, 'site'))
+        >>> context.mergeParts(partPaths, os.path.join(root, 'site'))
+        Traceback (most recent call last):
+            ...
+        AssertionError: HtmlContext.mergeParts: Class p-aaaaaa has different rules in the parts.
+        >>> shutil.rmtree(root)
+        """
+        if not os.path.exists(path):
+            os.mkdir(path)
+        if not path.endswith('/'):
+            path += '/'
+        pIndex = 0
+        for partPath in partPaths:
+            partIndex = 0
+            while os.path.exists(os.path.join(partPath, self.getPageFileName(partIndex))):
+                shutil.copyfile(os.path.join(partPath, self.getPageFileName(partIndex)), 
+                    path+self.getPageFileName(pIndex))
+                partIndex += 1
+                pIndex += 1
+        rules = {} # Rules of all parts, in order of the parts.
+        classNames = {} # Class name --> rule
+        for partPath in partPaths:
+            cssPath = os.path.join(partPath, self.CSS_FILE_NAME)
+            if os.path.exists(cssPath):
+                f = codecs.open(cssPath, mode="r", encoding="utf-8")
+                for rule in f.read().splitlines(True):
+                    className = rule.split(' ', 1)[0][1:]
+                    assert classNames.setdefault(className, rule) == rule, \
+                        ('%s.mergeParts: Class %s has different rules in the parts.' % (self.__class__.__name__, className))
+                    rules[rule] = True
+                f.close()
+        f = codecs.open(path+self.CSS_FILE_NAME, mode="w", encoding="utf-8")
+        f.write(''.join(rules))
+        f.close()
 
 if __name__ == "__main__":
     # Running this document will execute all >>> comments as test of this source.
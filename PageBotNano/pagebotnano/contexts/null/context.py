@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+# -----------------------------------------------------------------------------
+#
+#   P A G E B O T  N A N O
+#
+#   Copyright (c) 2020+ Buro Petr van Blokland + Claudia Mens
+#   www.pagebot.io
+#   Licensed under MIT conditions
+#
+#   Supporting DrawBot, www.drawbot.com
+# -----------------------------------------------------------------------------
+#
+#   nullcontext.py
+#
+#   The NullContext implements the full BaseContext, without drawing or saving
+#   anything. Text is measured with the metrics of the font files (read by
+#   fontTools, kept in the FontMetricsStore of toolbox/fontmetrics.py) and
+#   image sizes are read from the file headers. So Document, Book, Typesetter
+#   and the templates can run headless (e.g. on Linux, without DrawBot) with
+#   deterministic results. Lines are composed by the LineBreaker of
+#   toolbox/linebreaker.py. All calls are counted, which makes the
+#   NullContext useful for testing and benchmarking.
+#
+import os
+import re
+import struct
+import sys
+sys.path.insert(0, "../../..") # So we can import pagebotnano without installing.
+
+from fontTools.ttLib import TTFont
+
+from pagebotnano.toolbox.units import upt # Converts units to points.
+from pagebotnano.contexts.basecontext import BaseContext
+from pagebotnano.toolbox.linebreaker import LineBreaker
+from pagebotnano.toolbox.fontmetrics import getFontMetrics
+
+# Default folder with font files, that is scanned for font names.
+FONT_DIR = os.path.join(os.path.dirname(__file__), '../../../resources/fonts')
+# Font that is used if a font name cannot be found.
+FALLBACK_FAMILY = 'PageBot'
+FALLBACK_FONT = 'PageBot-Regular'
+
+# Cache of {fontName: fontPath} dictionaries, with the tuple of font folders as key.
+FONT_NAMES = {}
+
+def _normalizeFontName(name):
+    """Answer the font name in lowercase, without spaces, hyphens and
+    underscores, so 'PageBot-Bold_Italic', 'PageBot Bold Italic' and
+    'PageBot-BoldItalic' all are the same name.
+
+    >>> _normalizeFontName('PageBot-Bold_Italic')
+    'pagebotbolditalic'
+    """
+    return re.sub('[ _-]', '', name).lower()
+
+def getFontNames(fontDirs):
+    """Answer the cached dictionary of {normalizedName: fontPath} for all
+    .ttf and .otf files in the `fontDirs` folders. The file name, the
+    PostScript name and the full name of the font all point to the path.
+
+    >>> names = getFontNames((FONT_DIR,))
+    >>> sorted(names)[:3]
+    ['pagebotbold', 'pagebotbolditalic', 'pagebotbook']
+    """
+    fontNames = FONT_NAMES.get(fontDirs)
+    if fontNames is None:
+        FONT_NAMES[fontDirs] = fontNames = {}
+        for fontDir in fontDirs:
+            for dirPath, _, fileNames in sorted(os.walk(fontDir)):
+                for fileName in sorted(fileNames):
+                    name, extension = os.path.splitext(fileName)
+                    if extension.lower() not in ('.ttf', '.otf'):
+                        continue
+                    path = os.path.join(dirPath, fileName)
+                    font = TTFont(path, lazy=True)
+                    for fontName in (name, font['name'].getDebugName(6),
+                            font['name'].getDebugName(4)):
+                        if fontName:
+                            fontNames.setdefault(_normalizeFontName(fontName), path)
+                    font.close()
+    return fontNames
+
+def getImageSize(path):
+    """Answer the (w, h) size of the image at `path`, as read from the header
+    of the file. Supported formats are PNG, GIF, JPEG and PDF (size of the
+    first page). Answer None if the file does not exist or the format is
+    not recognized.
+
+    >>> getImageSize('../../../resources/images/cookbot10.jpg')
+    (2058, 946)
+    >>> getImageSize('../../../resources/images/peppertom_lowres_398x530.png')
+    (398, 530)
+    >>> getImageSize('images/doesNotExist.png') is None
+    True
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        head = f.read(26)
+        if head[:8] == b'\x89PNG\r\n\x1a\n':
+            return struct.unpack('>II', head[16:24])
+        if head[:6] in (b'GIF87a', b'GIF89a'):
+            return struct.unpack('<HH', head[6:10])
+        if head[:5] == b'%PDF-':
+            f.seek(0)
+            m = re.search(rb'/MediaBox\s*\[\s*([-\d.]+)\s+([-\d.]+)\s+([-\d.]+)\s+([-\d.]+)', f.read())
+            if m is None:
+                return None
+            x1, y1, x2, y2 = [float(v) for v in m.groups()]
+            return x2 - x1, y2 - y1
+        if head[:2] == b'\xff\xd8':
+            # Run through the JPEG segments, until the start of frame is found.
+            f.seek(2)
+            while True:
+                marker = f.read(2)
+                if len(marker) < 2 or marker[0] != 0xFF:
+                    return None
+                size = struct.unpack('>H', f.read(2))[0]
+                # SOFn markers, except DHT (C4), JPG (C8) and DAC (CC)
+                if 0xC0 <= marker[1] <= 0xCF and marker[1] not in (0xC4, 0xC8, 0xCC):
+                    h, w = struct.unpack('>xHH', f.read(5))
+                    return w, h
+                f.seek(size - 2, 1)
+    return None
+
+class NullContext(BaseContext):
+    """The NullContext supports the full context interface, without output.
+    Measures are answered from font files and image headers. Every call
+    is counted in self.calls.
+
+    >>> from pagebotnano.document import Document
+    >>> from pagebotnano.elements import Rect
+    >>> context = NullContext()
+    >>> doc = Document(w=400, h=500, context=context)
+    >>> page = doc.newPage()
+    >>> e = Rect(x=10, y=10, w=100, h=100, fill=(1, 0, 0), parent=page)
+    >>> doc.build()
+    >>> context.calls['newPage'], context.calls['rect']
+    (1, 1)
+    >>> doc.export('_export/NullContext.pdf') # Nothing is saved
+    >>> context.calls['saveImage'], os.path.exists('_export/NullContext.pdf')
+    (1, False)
+    """
+    def __init__(self, fontDirs=None, fallbackFont=None):
+        if fontDirs is None:
+            fontDirs = [FONT_DIR]
+        if fallbackFont is None:
+            fallbackFont = FALLBACK_FONT
+        self.fontDirs = tuple(fontDirs)
+        self.fontNames = getFontNames(self.fontDirs)
+        self.fallbackFont = fallbackFont
+        self.lineBreaker = LineBreaker(self.getFontMetrics)
+        self.calls = {} # Method name --> number of calls
+        self.w = self.h = None
+        self.pages = 0
+
+    def __repr__(self):
+        return '<%s pages=%d>' % (self.__class__.__name__, self.pages)
+
+    def getConfig(self):
+        return self.__class__, dict(fontDirs=self.fontDirs, fallbackFont=self.fallbackFont)
+
+    def _count(self, name):
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    def _get_measureId(self):
+        # Measures depend on the font files that are found.
+        return self.__class__.__name__, self.fontDirs, self.fallbackFont
+    measureId = property(_get_measureId)
+
+    def getFontPath(self, font):
+        """Answer the path of the font file for `font`, which can be a path
+        or a font name. If the font name is unknown, then try the same style
+        in the fallback family. Otherwise answer the path of the fallback font.
+        Answer None if no font files were found.
+
+        >>> context = NullContext()
+        >>> os.path.basename(context.getFontPath('PageBot-Bold'))
+        'PageBot-Bold.ttf'
+        >>> os.path.basename(context.getFontPath('Georgia-BoldItalic'))
+        'PageBot-Bold_Italic.ttf'
+        >>> os.path.basename(context.getFontPath('Georgia'))
+        'PageBot-Regular.ttf'
+        """
+        if font and os.path.exists(font):
+            return font
+        path = None
+        if font:
+            path = self.fontNames.get(_normalizeFontName(font))
+            if path is None and '-' in font:
+                styleName = font.split('-')[-1]
+                path = self.fontNames.get(_normalizeFontName(FALLBACK_FAMILY + styleName))
+        if path is None:
+            path = self.fontNames.get(_normalizeFontName(self.fallbackFont))
+        return path
+
+    def getFontMetrics(self, font):
+        self._count('getFontMetrics')
+        return getFontMetrics(self.getFontPath(font))
+
+    def _getLines(self, bs, w=None):
+        """Answer the list of (offset, width, depth) lines, when `bs` is
+        composed in width `w` by the Knuth & Plass line breaker. If `w` is
+        None, then only hard returns break the lines.
+        """
+        return [(line.start, line.width, line.depth) for line in self.lineBreaker.getLines(bs, w)]
+
+    def _getTextLines(self, bs, w):
+        """Answer the (offset, depth) lines of `bs` in width `w`.
+
+        >>> from pagebotnano.babelstring import BabelString
+        >>> context = NullContext()
+        >>> bs = BabelString('Hello world '*10, dict(font='PageBot-Regular', fontSize=10, lineHeight=14))
+        >>> context.getTextLines(bs, 100)
+        [(0, 14), (24, 28), (48, 42), (72, 56), (96, 70)]
+        >>> fitted, overflow = context.fitText(bs, 100, 30)
+        >>> len(fitted), len(overflow)
+        (48, 72)
+        """
+        return [(offset, depth) for offset, _, depth in self._getLines(bs, w)]
+
+    def fitText(self, bs, w, h):
+        """Answer the tuple (fitted, overflow) of BabelString instances, where
+        `fitted` is the part of `bs` that fits in a text box of (w, h). The
+        LineBreaker stops at the first line that does not fit, so fitting the
+        pages of a long text does not compose the remaining text for each page.
+
+        >>> from pagebotnano.babelstring import BabelString
+        >>> context = NullContext()
+        >>> bs = BabelString(('Hello world '*10 + '\\n')*100, dict(font='PageBot-Regular', fontSize=10, lineHeight=14))
+        >>> fitted, overflow = context.fitText(bs, 100, 30)
+        >>> len(fitted), len(overflow)
+        (48, 12052)
+        """
+        if h is None:
+            return bs.split(len(bs))
+        _, offset = self.lineBreaker.compose(bs, w, h)
+        return bs.split(offset)
+
+    def newDocument(self, w=None, h=None, doc=None):
+        self._count('newDocument')
+        self.w = w
+        self.h = h
+
+    def newPage(self, w=None, h=None):
+        self._count('newPage')
+        self.pages += 1
+
+    def newDrawing(self):
+        self._count('newDrawing')
+        self.pages = 0
+
+    def saveImage(self, path, multiPage=True):
+        """Nothing is saved, the call is only counted."""
+        self._count('saveImage')
+
+    def fill(self, c):
+        self._count('fill')
+
+    def stroke(self, c, strokeWidth=None):
+        self._count('stroke')
+
+    def strokeWidth(self, strokeWidth):
+        self._count('strokeWidth')
+
+    def rect(self, x, y, w, h):
+        self._count('rect')
+
+    def oval(self, x, y, w, h):
+        self._count('oval')
+
+    def line(self, p1, p2):
+        self._count('line')
+
+    def imageSize(self, path):
+        """Answer the (w, h) size of the image, as read from the file header.
+
+        >>> context = NullContext()
+        >>> context.imageSize('../../../resources/images/cookbot10.jpg')
+        (2058, 946)
+        """
+        self._count('imageSize')
+        return getImageSize(path)
+
+    def scale(self, sx, sy):
+        self._count('scale')
+
+    def image(self, path, p):
+        self._count('image')
+
+    def text(self, bs, p):
+        self._count('text')
+
+    def textBox(self, bs, r):
+        """Nothing is drawn. Answer the overflow of `bs` in the box `r`.
+
+        >>> from pagebotnano.babelstring import BabelString
+        >>> context = NullContext()
+        >>> bs = BabelString('Hello world '*10, dict(font='PageBot-Regular', fontSize=10, lineHeight=14))
+        >>> len(context.textBox(bs, (0, 0, 100, 30)))
+        72
+        """
+        self._count('textBox')
+        _, _, w, h = r
+        _, overflow = self.fitText(bs, w, h)
+        return overflow
+
+    def textSize(self, bs, w=None, h=None):
+        """Answer the (w, h) size of `bs`, wrapped in width `w` if defined.
+        Equal strings are measured once, the size is cached in self.MEASURES.
+
+        >>> from pagebotnano.babelstring import BabelString
+        >>> context = NullContext()
+        >>> bs = BabelString('Hello world', dict(font='PageBot-Regular', fontSize=10, lineHeight=14))
+        >>> tw, th = context.textSize(bs)
+        >>> 0 < tw < 100, th
+        (True, 14)
+        >>> context.textSize(bs, w=30)[1]
+        28
+        >>> hits = context.MEASURES.hits
+        >>> bs2 = BabelString('Hello world', dict(font='PageBot-Regular', fontSize=10, lineHeight=14))
+        >>> context.textSize(bs2, w=30)[1], context.MEASURES.hits - hits
+        (28, 1)
+        """
+        self._count('textSize')
+        return BaseContext.textSize(self, bs, w=w, h=h)
+
+    def _textSize(self, bs, w=None, h=None):
+        lines = self._getLines(bs, w)
+        if not lines:
+            return 0, 0
+        return max([lineWidth for _, lineWidth, _ in lines]), lines[-1][2]
+
+    def hyphenation(self, flag):
+        self._count('hyphenation')
+
+if __name__ == "__main__":
+    # Running this document will execute all >>> comments as test of this source.
+    import doctest
+    doctest.testmod()[0]
@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+# -----------------------------------------------------------------------------
+#
+#   P A G E B O T  N A N O
+#
+#   Copyright (c) 2020+ Buro Petr van Blokland + Claudia Mens
+#   www.pagebot.io
+#   Licensed under MIT conditions
+#
+#   Supporting DrawBot, www.drawbot.com
+# -----------------------------------------------------------------------------
+#
+#   recordingcontext.py
+#
+#   The RecordingContext does not draw anything itself. It stores all drawing
+#   calls of Document.build as a compact display list per page, that can be
+#   replayed onto any other context (DrawBotContext, HtmlContext, InDesignContext).
+#   This way a document is composed and built once, then exported in many formats.
+#
+from array import array
+import sys
+sys.path.insert(0, "../../..") # So we can import pagebotnano without installing.
+
+from pagebotnano.contexts.basecontext import BaseContext, newContext
+from pagebotnano.contexts.null.context import NullContext
+try:
+    from pagebotnano.contexts.drawbot.context import DrawBotContext
+except ImportError: # No DrawBot (e.g. on Linux), then run headless by default.
+    DrawBotContext = NullContext
+
+def getOperandKey(args):
+    """Answer the key of the operand tuple `args` in the operand table. The
+    class of each operand is included (also in nested tuples, such as points),
+    as equal values such as 0, 0.0 and False must be replayed as recorded.
+
+    >>> getOperandKey((0, (1.0, True)))
+    ((<class 'int'>, 0), (<class 'tuple'>, ((<class 'float'>, 1.0), (<class 'bool'>, True))))
+    """
+    return tuple([(a.__class__, getOperandKey(a) if a.__class__ is tuple else a) for a in args])
+
+class DisplayList:
+    """Holds the recorded drawing operations of a single page. The opcodes
+    are stored as array of bytes, each with an index in the array of operands,
+    pointing into the operand table shared by all pages of the RecordingContext.
+    The DisplayList keeps a reference to the table, so it stays valid when the 
+    RecordingContext starts a new drawing. This way the Document can cache and 
+    reuse the output of unchanged pages.
+
+    >>> dl = DisplayList(400, 500, [(10, 20, 30, 40)])
+    >>> dl
+    <DisplayList w=400 h=500 ops=0>
+    >>> dl.append(1, 0)
+    >>> len(dl)
+    1
+    """
+    def __init__(self, w=None, h=None, operandTable=None):
+        self.w = w # Size of the page, as used for newPage on replay.
+        self.h = h
+        self.opCodes = array('B') # Index in RecordingContext.OPS
+        self.operands = array('L') # Index in self.operandTable
+        if operandTable is None:
+            operandTable = []
+        self.operandTable = operandTable
+
+    def __repr__(self):
+        return '<%s w=%s h=%s ops=%d>' % (self.__class__.__name__, self.w, self.h, len(self))
+
+    def __len__(self):
+        return len(self.opCodes)
+
+    def append(self, opCode, operandIndex):
+        self.opCodes.append(opCode)
+        self.operands.append(operandIndex)
+
+class RecordingContext(BaseContext):
+    """The RecordingContext stores every drawing call in a display list per page.
+    Calls that need to answer a measure (such as textSize and imageSize) are
+    passed on to `context`, which also is the default target for saveImage.
+
+    >>> from pagebotnano.document import Document
+    >>> from pagebotnano.elements import Rect
+    >>> context = RecordingContext()
+    >>> doc = Document(w=400, h=500, context=context)
+    >>> page = doc.newPage()
+    >>> e = Rect(x=10, y=10, w=100, h=100, fill=(1, 0, 0), parent=page)
+    >>> page = doc.newPage()
+    >>> e = Rect(x=20, y=20, w=100, h=100, fill=(1, 0, 0), parent=page)
+    >>> doc.build()
+    >>> context.pages
+    [<DisplayList w=400pt h=500pt ops=3>, <DisplayList w=400pt h=500pt ops=3>]
+    >>> [name for name, args in context.getOps(0)]
+    ['stroke', 'fill', 'rect']
+    >>> doc.export('_export/RecordingContext.pdf') # Replay on DrawBotContext
+    >>> doc.export('_export/RecordingContext.png') # Same DrawBot canvas, no replay
+    """
+    # Names of the recorded drawing methods. The index is the opcode, so only
+    # add new names to the end of the list.
+    OPS = ('newPage', 'fill', 'stroke', 'strokeWidth', 'rect', 'oval', 'line',
+        'scale', 'image', 'text', 'textBox', 'hyphenation')
+    OPCODES = {name: opCode for opCode, name in enumerate(OPS)}
+
+    SUPPORTS_PAGE_OUTPUT = True # Display lists of unchanged pages are reused.
+
+    def __init__(self, context=None):
+        if context is None:
+            context = DrawBotContext()
+        self.context = context # Default context for measuring and saving.
+        self.PART_EXTENSION = context.PART_EXTENSION # Parts are saved by self.context
+        self.w = self.h = None # Default page size, set by self.newDocument
+        self.newDrawing()
+
+    def __repr__(self):
+        return '<%s pages=%d>' % (self.__class__.__name__, len(self.pages))
+
+    def getConfig(self):
+        """Answer the config of self, including the config of self.context,
+        so worker processes record with the same context for measuring and saving.
+
+        >>> from pagebotnano.contexts.basecontext import newContext
+        >>> from pagebotnano.contexts.html.context import HtmlContext
+        >>> newContext(RecordingContext(HtmlContext()).getConfig()).context.__class__.__name__
+        'HtmlContext'
+        """
+        return self.__class__, dict(context=self.context.getConfig())
+
+    @classmethod
+    def fromConfig(cls, context):
+        return cls(newContext(context))
+
+    def newDocument(self, w=None, h=None, doc=None):
+        self.w = w # Default page size, in case drawing starts without newPage.
+        self.h = h
+
+    def newDrawing(self):
+        """Clear the recording."""
+        self.pages = [] # List of DisplayList instances, one for each page.
+        self.page = None # Current DisplayList to record in.
+        self.operandTable = [] # Shared table of operand tuples.
+        self._operandIndex = {} # Key of operand tuple --> index in self.operandTable
+        self._replayed = None # Context that has the current recording drawn.
+
+    def _record(self, name, *args):
+        """Add the opcode of `name` with its operand `args` to the current page.
+        Identical hashable operands of the same class are stored only once in
+        the operand table.
+
+        >>> context = RecordingContext()
+        >>> context.hyphenation(False)
+        >>> context.strokeWidth(0)
+        >>> context.rect(0, 0, True, 1.0)
+        >>> context.rect(0, 0, 1, 1)
+        >>> context.getOps(0)
+        [('hyphenation', (False,)), ('strokeWidth', (0,)), ('rect', (0, 0, True, 1.0)), ('rect', (0, 0, 1, 1))]
+        """
+        if self.page is None: # Drawing without a page, then make one.
+            self.newPage(self.w, self.h)
+        try:
+            key = getOperandKey(args)
+            operandIndex = self._operandIndex.get(key)
+            isHashable = True
+        except TypeError: # Some operands (Color, Unit, BabelString) are not hashable.
+            operandIndex = None
+            isHashable = False
+        if operandIndex is None:
+            operandIndex = len(self.operandTable)
+            self.operandTable.append(args)
+            if isHashable:
+                self._operandIndex[key] = operandIndex
+        self.page.append(self.OPCODES[name], operandIndex)
+        self._replayed = None # Recording changed, any replay is outdated.
+
+    def getOps(self, pageIndex):
+        """Answer the list of (name, args) operations of the page at pageIndex.
+
+        >>> context = RecordingContext()
+        >>> context.newPage(100, 200)
+        >>> context.rect(10, 20, 30, 40)
+        >>> context.getOps(0)
+        [('rect', (10, 20, 30, 40))]
+        """
+        page = self.pages[pageIndex]
+        ops = []
+        for opCode, operandIndex in zip(page.opCodes, page.operands):
+            ops.append((self.OPS[opCode], page.operandTable[operandIndex]))
+        return ops
+
+    def replay(self, context):
+        """Draw the recorded display lists onto `context`. Skip if the same
+        context already has this recording drawn, so multiple formats of one
+        context (e.g. .pdf and .png from DrawBot) replay only once.
+
+        >>> from pagebotnano.contexts.html.context import HtmlContext
+        >>> context = RecordingContext()
+        >>> context.newPage(100, 200)
+        >>> context.fill(None)
+        >>> context.rect(10, 20, 30, 40)
+        >>> htmlContext = HtmlContext()
+        >>> context.replay(htmlContext)
+        >>> len(htmlContext.pages)
+        1
+        """
+        if context is self._replayed:
+            return
+        context.newDocument(w=self.w, h=self.h)
+        context.newDrawing()
+        ops = self.OPS
+        for page in self.pages:
+            context.newPage(page.w, page.h)
+            operandTable = page.operandTable
+            for opCode, operandIndex in zip(page.opCodes, page.operands):
+                getattr(context, ops[opCode])(*operandTable[operandIndex])
+        self._replayed = context
+
+    def newPage(self, w=None, h=None):
+        self.page = DisplayList(w, h, self.operandTable)
+        self.pages.append(self.page)
+        self._replayed = None
+
+    def getPageOutput(self):
+        """Answer the DisplayList of the current page, to be cached by the document.
+
+        >>> context = RecordingContext()
+        >>> context.newPage(100, 200)
+        >>> context.rect(10, 20, 30, 40)
+        >>> dl = context.getPageOutput()
+        >>> context.newDrawing()
+        >>> context.addPageOutput(dl)
+        >>> context.getOps(0)
+        [('rect', (10, 20, 30, 40))]
+        """
+        return self.page
+
+    def addPageOutput(self, output):
+        """Add the cached DisplayList `output` as next page. Recording continues
+        on a new page, so the cached output cannot be altered.
+        """
+        self.page = None
+        self.pages.append(output)
+        self._replayed = None
+
+    def saveImage(self, path, multiPage=True, context=None):
+        """Replay the recording onto `context` (default is self.context)
+        and let that context save the file.
+        """
+        if context is None:
+            context = self.context
+        self.replay(context)
+        context.saveImage(path, multiPage=multiPage)
+
+    def mergeParts(self, partPaths, path, multiPage=True):
+        self.context.mergeParts(partPaths, path, multiPage=multiPage)
+
+    def fill(self, c):
+        self._record('fill', c)
+
+    def stroke(self, c, strokeWidth=None):
+        self._record('stroke', c, strokeWidth)
+
+    def strokeWidth(self, strokeWidth):
+        self._record('strokeWidth', strokeWidth)
+
+    def rect(self, x, y, w, h):
+        self._record('rect', x, y, w, h)
+
+    def oval(self, x, y, w, h):
+        self._record('oval', x, y, w, h)
+
+    def line(self, p1, p2):
+        self._record('line', p1, p2)
+
+    def scale(self, sx, sy):
+        self._record('scale', sx, sy)
+
+    def image(self, path, p):
+        self._record('image', path, p)
+
+    def text(self, bs, p):
+        self._record('text', bs, p)
+
+    def textBox(self, bs, r):
+        """Record the text box. Answer the overflow, as measured by self.context.
+        """
+        self._record('textBox', bs, r)
+        _, _, w, h = r
+        _, overflow = self.context.fitText(bs, w, h)
+        return overflow
+
+    def hyphenation(self, flag):
+        self._record('hyphenation', flag)
+
+    def imageSize(self, path):
+        return self.context.imageSize(path)
+
+    def textSize(self, bs, w=None, h=None):
+        return self.context.textSize(bs, w=w, h=h)
+
+    def fitText(self, bs, w, h):
+        """Answer the (fitted, overflow) of `bs` in (w, h), as measured by self.context.
+
+        >>> from pagebotnano.babelstring import BabelString
+        >>> from pagebotnano.toolbox.units import mm
+        >>> bs = BabelString('Hello world '*10, dict(font='PageBot-Regular', fontSize=10, lineHeight=14))
+        >>> fitted, overflow = RecordingContext(NullContext()).fitText(bs, mm(35), mm(10))
+        >>> len(fitted), len(overflow)
+        (48, 72)
+        """
+        return self.context.fitText(bs, w, h)
+
+if __name__ == "__main__":
+    # Running this document will execute all >>> comments as test of this source.
+    import doctest
+    doctest.testmod()[0]
@@ -16,15 +16,27 @@
 #   This source contains the class with knowledge about a generic document.
 #
 import os # Import standard Python library to create the _export directory
+import shutil
 import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 sys.path.insert(0, "../") # So we can import pagebotnano without installing.
 
 from pagebotnano.constants import A4, EXPORT_DIR, PADDING
-from pagebotnano.elements import Element, Page
-from pagebotnano.contexts.drawbot.context import DrawBotContext
+from pagebotnano.elements import Element, Page, PageStub
+from pagebotnano.elements.elementindex import ElementIndex
+from pagebotnano.contexts.basecontext import newContext
+from pagebotnano.contexts.null.context import NullContext
+try:
+    from pagebotnano.contexts.drawbot.context import DrawBotContext
+except ImportError: # No DrawBot (e.g. on Linux), then run headless by default.
+    DrawBotContext = NullContext
+from pagebotnano.contexts.recording.context import RecordingContext
 from pagebotnano.themes import BaseTheme, DefaultTheme
 from pagebotnano.templates import BaseTemplates, OneColumnTemplates
 from pagebotnano.toolbox.units import units
+from pagebotnano.toolbox.profiler import Profiler
+from pagebotnano.toolbox.fontmetrics import FONT_METRICS_STORE
 from pagebotnano.toolbox.transformer import makePadding
 
 class ComposerData:
@@ -37,6 +49,7 @@ class ComposerData:
         self.elements = [] # Selected galley elements for the current template
         self.errors = []
         self.verbose = []
+        self.clip = None # Visible (x1, y1, x2, y2) in points while building a page, for culling.
 
     def _get_template(self):
         return self._template
@@ -51,16 +64,50 @@ class ComposerData:
         return None
     pn = property(_get_pn)
 
+# Document of a worker process, created once by _initWorker, so the theme,
+# templates and context are not created again for every part.
+_workerDoc = None
+
+def _initWorker(contextConfig, w, h, theme, templates, fontMetricsPath=None):
+    """Initialize the worker process of Document.build(workers=N). The context
+    is made from `contextConfig`, as answered by context.getConfig(). The font
+    metrics that the main process already parsed are loaded from the cache
+    file at `fontMetricsPath`.
+    """
+    global _workerDoc
+    if fontMetricsPath is not None:
+        FONT_METRICS_STORE.load(fontMetricsPath)
+    _workerDoc = Document(w=w, h=h, theme=theme, templates=templates, 
+        context=newContext(contextConfig))
+
+def _buildPart(pages, partPath):
+    """Build the `pages` in the context of the worker process and save them 
+    as `partPath`. Answer the path for convenience of the caller.
+    """
+    doc = _workerDoc
+    doc.pages = pages
+    doc.pageOutputs = {}
+    doc.build()
+    doc.context.saveImage(partPath, multiPage=True)
+    return partPath
+
 class Document:
     # Class names start with a capital. See a class as a factory
     # of document objects (name spelled with an initial lower case.)
     
     def __init__(self, w=None, h=None, pt=None, pr=None, pb=None, pl=None,
-        theme=None, templates=None, context=None):
+        theme=None, templates=None, context=None, streaming=False, window=2,
+        profile=False):
         """This is the "constructor" of a Document instance (=object).
         It takes two attributes: `w` is the general width of pages and
         `h` is the general height of pages.
         If omitted, a default A4 page size is taken.
+        If `streaming` is True, then pages are composed, built into the context
+        and released as soon as there are more than `window` pages after them.
+        The released page is replaced by a PageStub, so memory stays constant 
+        for very long publications.
+        If `profile` is True, then the time of templates, element compose/build
+        and context calls is measured by self.profiler and reported on export.
 
         >>> doc = Document()
         >>> doc
@@ -69,6 +116,14 @@ class Document:
         >>> page = doc.newPage()
         >>> doc
         <Document w=595pt h=842pt pages=2>
+        >>> doc = Document(streaming=True, window=2)
+        >>> for n in range(4):
+        ...     page = doc.newPage(name='Page%d' % (n+1))
+        >>> doc.pages
+        [<PageStub pn=1 name=Page1 w=595pt h=842pt>, <PageStub pn=2 name=Page2 w=595pt h=842pt>, <Page pn=3 w=595pt h=842pt elements=0>, <Page pn=4 w=595pt h=842pt elements=0>]
+        >>> doc.export('_export/Document-streaming.pdf')
+        >>> doc.pages[-1]
+        <PageStub pn=4 name=Page4 w=595pt h=842pt>
         """
         if w is None: # If not defined, take the width of A4
             w, _ = A4
@@ -83,6 +138,10 @@ class Document:
 
         # Storage for the pages in this document
         self.pages = [] # Simple list, the index is the page number (starting at 0)
+        # Index of the elements on all pages by name and class, for self.find
+        # and self.findAll. Shared by the pages, so it is kept up to date when 
+        # elements are added or removed.
+        self.index = ElementIndex()
 
         # The TemplateSet dictionary contains a set of functions that
         # compose the pages and containing elements for a particular
@@ -104,11 +163,31 @@ class Document:
         # Keep the flag is self.build was already executed when calling self.export
         self.hasComposed = False
         self.hasBuilt = False
-        # Store the context in the Document. Use DrawBotContext by default.
+        # Cache of page output, with the content hash of the page as key,
+        # for contexts that can reuse the output of unchanged pages.
+        self.pageOutputs = {}
+
+        # In streaming mode, pages before self.pages[self.streamIndex] are built 
+        # and replaced by a PageStub. There are at most `window` Page instances
+        # alive, so templates can still alter neighbouring pages.
+        self.streaming = streaming
+        self.window = max(1, window) # The current page always must be alive.
+        self.streamIndex = 0
+
+        # Paths of the parts, in page order, if built by worker processes.
+        self.partPaths = None
+        # Store the context in the Document. Use DrawBotContext by default,
+        # or NullContext if DrawBot is not installed.
         if context is None:
             context = DrawBotContext()
         self.context = context
 
+        # Optional Profiler instance, only if profiling is switched on.
+        # Otherwise the only cost is checking for None.
+        self.profiler = None
+        if profile:
+            self.startProfiling()
+
     def __repr__(self):
         # This method is called when print(document) is executed.
         # It shows the name of the class, which can be different, if the
@@ -201,6 +280,54 @@ class Document:
         self.w, self.h = size
     size = property(_get_size, _set_size)
 
+    def startProfiling(self):
+        """Switch on profiling, by creating a Profiler and timing the methods
+        of self.context. Answer the profiler.
+        """
+        if self.profiler is None:
+            self.profiler = Profiler()
+            self.profiler.wrapContext(self.context)
+        return self.profiler
+
+    def stopProfiling(self):
+        """Switch off profiling and restore the context. Answer the profiler
+        with the collected records.
+        """
+        profiler = self.profiler
+        if profiler is not None:
+            profiler.unwrapAll()
+            self.profiler = None
+        return profiler
+
+    def find(self, name=None, pattern=None, cls=None):
+        """Answer the first element on all pages with the indicated name, 
+        or with `pattern` in its name, or with class name `cls`. 
+        Answer None if there is no match.
+
+        >>> from pagebotnano.elements import Rect
+        >>> doc = Document()
+        >>> page = doc.newPage()
+        >>> e = Rect(name='Background', parent=page)
+        >>> doc.find('Background') is e
+        True
+        >>> page = doc.newPage()
+        >>> e = Rect(name='Background', parent=page)
+        >>> len(doc.findAll(cls='Rect')), len(doc.findAll(pattern='ground')), len(page.findAll(cls='Rect'))
+        (2, 2, 1)
+        >>> doc.find(cls='Page')
+        <Page pn=1 w=595pt h=842pt elements=1>
+        """
+        found = self.findAll(name, pattern, cls)
+        if found:
+            return found[0]
+        return None
+
+    def findAll(self, name=None, pattern=None, cls=None):
+        """Answer the list of all elements on all pages with the indicated name,
+        or with `pattern` in its name, or with class name `cls`, in order of adding.
+        """
+        return self.index.findAll(name, pattern, cls)
+
     def newPage(self, w=None, h=None, name=None, template=None):
         """Create a new page. If the (w, h) is undefined, then take the current
         size of the document.
@@ -239,10 +366,43 @@ class Document:
             page.padding = self.padding
         self.cd.page = page # Set current page in the ComposerData
         self.pages.append(page)
+        page._index = self.index # Elements of the page are indexed by the document.
+        self.index.addTree(page)
+        if self.profiler is not None: # Remember which template made the page.
+            self.profiler.addPage(page, self.cd.template)
+        if self.streaming:
+            self.releasePages(self.window)
+
+    def releasePages(self, window=0):
+        """In streaming mode, compose and build all pages, except for the last 
+        `window` pages. Replace the built pages by a PageStub, so their
+        element tree can be freed. The context is prepared for drawing on
+        release of the first page.
+        """
+        cdPage = self.cd.page # Keep the current page, as compose and build change it.
+        profiler = self.profiler
+        while len(self.pages) - self.streamIndex > window:
+            if self.streamIndex == 0:
+                self.context.newDocument(w=self.w, h=self.h)
+                self.context.newDrawing()
+            page = self.pages[self.streamIndex]
+            if profiler is None:
+                if page.isDirty:
+                    page.compose(doc=self)
+                page.build(doc=self)
+            else:
+                if page.isDirty:
+                    profiler.compose(page, self)
+                profiler.build(page, 0, 0, self)
+            self.index.removeTree(page) # Released elements cannot be found anymore.
+            self.pages[self.streamIndex] = PageStub(page)
+            self.streamIndex += 1
+        self.cd.page = cdPage
 
     def compose(self):
         """Compose the document, by looking through the pages, and then recursively
         tell every page to compose itself (and its contained elements).
+        Pages that did not change since the last build are skipped.
 
         >>> doc = Document()
         >>> page = doc.newPage()
@@ -250,47 +410,192 @@ class Document:
         >>> page = doc.newPage()
         >>> doc.compose()
         """
-        for page in self.pages:
-            page.compose(doc=self) # Passing self as document, in case the page needs more info
+        profiler = self.profiler
+        for page in self.pages[self.streamIndex:]: # Released pages are already done.
+            if not page.isDirty: # Only if changed since the last build.
+                continue
+            if profiler is None:
+                page.compose(doc=self) # Passing self as document, in case the page needs more info
+            else: # Profiling is on, time the compose of the page.
+                profiler.compose(page, self)
         self.hasComposed = True # Flag that we did this, in case called separate from self.export
 
-    def build(self):
+    def build(self, workers=None):
         """Build the document by looping trough the pages, and then recursively
         tell every page to build itself (and its contained elements).
+        If `workers` is larger than 1, then the pages are built in parallel
+        by self.buildParts.
+        If the context can reuse the output of pages (SUPPORTS_PAGE_OUTPUT, such as
+        the RecordingContext), then the output of pages with an unchanged content
+        hash is taken from self.pageOutputs, instead of building them again.
+        Otherwise the pages are not hashed.
+
+        >>> from pagebotnano.elements import Rect
+        >>> from pagebotnano.contexts.recording.context import RecordingContext
+        >>> doc = Document(context=RecordingContext())
+        >>> for n in range(3):
+        ...     page = doc.newPage()
+        ...     e = Rect(x=10, y=10, w=100, h=100, fill=0.5, parent=page)
+        >>> doc.build()
+        >>> outputs = [doc.context.pages[n] for n in range(3)]
+        >>> e.w = 200 # Only change the last page
+        >>> doc[2].isDirty, doc[0].isDirty
+        (True, False)
+        >>> doc.build()
+        >>> [doc.context.pages[n] is outputs[n] for n in range(3)]
+        [True, True, False]
+        >>> from pagebotnano.elements import Text
+        >>> from pagebotnano.babelstring import BabelString
+        >>> e = Text(BabelString('Hello', dict(font='Georgia', fontSize=12)), x=10, y=10, parent=doc[0])
+        >>> doc.build()
+        >>> output = doc.context.pages[0]
+        >>> e.bs.append(' world') # Editing the text in place sets the page dirty.
+        >>> doc[0].isDirty
+        True
+        >>> doc.build()
+        >>> doc.context.pages[0] is output
+        False
         """
+        if self.streaming: # Build the remaining pages, after the released ones.
+            self.releasePages()
+            self.hasBuilt = True
+            return
+
+        if workers is not None and workers > 1 and len(self.pages) > 1:
+            self.buildParts(workers)
+            self.hasBuilt = True
+            return
+        self.partPaths = None # Build in this process, there are no parts to merge.
+
         self.context.newDocument(w=self.w, h=self.h)
 
         # Clear all previous drawing in the context canvas.
         self.context.newDrawing()
 
         # Tell each page to build and draw itself in context, including their child elements.
+        profiler = self.profiler
+        if not self.context.SUPPORTS_PAGE_OUTPUT: # Nothing to cache, don't hash the pages.
+            for page in self.pages:
+                if profiler is None:
+                    page.build(doc=self)
+                else:
+                    profiler.build(page, 0, 0, self)
+                page.setClean()
+            self.pageOutputs = {}
+            self.hasBuilt = True
+            return
+
+        pageOutputs = {} # Only keep the output of current pages.
         for page in self.pages:
-            page.build(doc=self) # Passing self as document, in case the page needs more info.
+            key = page.getHash()
+            output = self.pageOutputs.get(key)
+            if output is not None: # Unchanged page, reuse its output.
+                self.context.addPageOutput(output)
+            else:
+                if profiler is None:
+                    page.build(doc=self) # Passing self as document, in case the page needs more info.
+                else: # Profiling is on, time the build of the page.
+                    profiler.build(page, 0, 0, self)
+                output = self.context.getPageOutput()
+            if output is not None:
+                pageOutputs[key] = output
+            page.setClean()
+        self.pageOutputs = pageOutputs
         self.hasBuilt = True # Flag that we did this, in case called separate from self.export.
 
-    def export(self, path, force=False, multiPage=True):
+    def buildParts(self, workers):
+        """Split the composed pages in `workers` slices and build them by a pool
+        of worker processes. Each worker saves its slice as part file, which are
+        merged in page order by self.export. The theme, templates and context
+        are created once for each worker process, not for every page.
+        """
+        assert not self.streaming, ('%s.buildParts: Cannot build parts in streaming mode' % self.__class__.__name__)
+        extension = self.context.PART_EXTENSION
+        assert extension is not None, ('%s.buildParts: %s cannot merge parts' % (self.__class__.__name__, self.context.__class__.__name__))
+        if self.partPaths: # Remove the parts of a previous build.
+            shutil.rmtree(os.path.dirname(self.partPaths[0]), ignore_errors=True)
+
+        partDir = tempfile.mkdtemp(prefix='pagebotnano-')
+        workers = min(workers, len(self.pages))
+        size = (len(self.pages) + workers - 1) // workers # Pages per part, rounded up.
+        slices = []
+        partPaths = []
+        for index in range(0, len(self.pages), size):
+            slices.append(self.pages[index:index+size])
+            partPaths.append(os.path.join(partDir, 'part%04d.%s' % (len(partPaths), extension)))
+
+        fontMetricsPath = None
+        if len(FONT_METRICS_STORE): # Workers start with the metrics that are parsed already.
+            fontMetricsPath = os.path.join(partDir, 'fontmetrics.bin')
+            FONT_METRICS_STORE.save(fontMetricsPath)
+        initArgs = (self.context.getConfig(), self.w, self.h, self.theme, self.templates, fontMetricsPath)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_initWorker, initargs=initArgs) as pool:
+            # pool.map answers the results in order of the slices.
+            self.partPaths = list(pool.map(_buildPart, slices, partPaths))
+        for partPath in self.partPaths:
+            assert os.path.exists(partPath), ('%s.buildParts: Part %s was not saved by %s' % (self.__class__.__name__, partPath, self.context.__class__.__name__))
+        for page in self.pages:
+            page.setClean()
+
+    def export(self, path, force=False, multiPage=True, context=None, workers=None):
         """Export the document into the _export folder. We assume that the 
         document and pages are built. We don't do that here, in case multiple
         formats are saved from the same build.
         If `force` is True or if build has not been done yet, then call
         self.build anyway.
+        If self.context is a RecordingContext, then the recorded display list
+        is replayed onto `context` (or the default context of the recording),
+        so multiple formats are exported from a single compose and build.
+        If `workers` is larger than 1, then the pages are built by a pool of
+        worker processes, and their parts are merged into `path`.
+        If profiling is on, then the profile is saved as path.profile.json,
+        with a table of the same data in path.profile.txt
 
         >>> doc = Document()
         >>> doc.newPage()
         <Page pn=1 w=595pt h=842pt elements=0>
         >>> doc.export('_export/Document-export.pdf')
+        >>> from pagebotnano.contexts.recording.context import RecordingContext
+        >>> from pagebotnano.contexts.html.context import HtmlContext
+        >>> doc = Document(context=RecordingContext())
+        >>> page = doc.newPage()
+        >>> doc.export('_export/Document-export-recorded.pdf')
+        >>> doc.export('_export/Document-export-recorded.png')
+        >>> doc.export('_export/Document-export-recorded', context=HtmlContext())
+        >>> doc = Document(context=RecordingContext(HtmlContext()))
+        >>> for n in range(3):
+        ...     page = doc.newPage()
+        >>> doc.export('_export/Document-export-parts', workers=2)
+        >>> sorted(os.listdir('_export/Document-export-parts'))
+        ['index.html', 'page001', 'page002', 'style.css']
+        >>> doc.partPaths is None
+        True
         """
         if force or not self.hasComposed: # If forced or not done yet, compose the pages.
             self.compose()
 
         if force or not self.hasBuilt: # If forced or not done yet, build the pages.
-            self.build()
+            self.build(workers=workers)
 
         if path.startswith(EXPORT_DIR) and not os.path.exists(EXPORT_DIR):
             os.mkdir(EXPORT_DIR)
         # Now all the pages drew them themselfs, we can export to the path.
         # let the context do its work, saving it.
-        self.context.saveImage(path, multiPage=multiPage)
+        if self.partPaths: # Built by worker processes, merge and remove the parts.
+            self.context.mergeParts(self.partPaths, path, multiPage=multiPage)
+            shutil.rmtree(os.path.dirname(self.partPaths[0]), ignore_errors=True)
+            self.partPaths = None
+            self.hasBuilt = False # The parts are gone, another export builds again.
+        elif context is None or context is self.context:
+            self.context.saveImage(path, multiPage=multiPage)
+        else: # Only a recording can be saved into another context.
+            assert isinstance(self.context, RecordingContext), ('%s.export: Exporting to %s needs a RecordingContext' % (self.__class__.__name__, context.__class__.__name__))
+            if self.profiler is not None: # Also time the replay on the other context.
+                self.profiler.wrapContext(context)
+            self.context.saveImage(path, multiPage=multiPage, context=context)
+
+        if self.profiler is not None: # Save the report as path.profile.json and .txt
+            self.profiler.save(path + '.profile.json')
 
 if __name__ == "__main__":
     # Running this document will execute all >>> comments as test of this source.
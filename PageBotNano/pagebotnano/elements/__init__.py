@@ -21,6 +21,6 @@ if __name__ == "__main__":
 
 from pagebotnano.elements.element import (Element, Text, TextBox, Rect, Image, 
 	Marker, TemplateMarker, Flow)
-from pagebotnano.elements.page import Page
+from pagebotnano.elements.page import Page, PageStub
 from pagebotnano.elements.codeblock import CodeBlock
 from pagebotnano.elements.colorcell import ColorCell, ColorMatrix
@@ -17,7 +17,6 @@
 #   can be placed on a page.
 #
 import sys
-import drawBot
 
 if __name__ == "__main__":
     sys.path.insert(0, "../..") # So we can import pagebotnano without installing.
@@ -18,7 +18,6 @@
 #
 import sys
 from copy import copy
-import drawBot
 
 if __name__ == "__main__":
     sys.path.insert(0, "../..") # So we can import pagebotnano without installing.
@@ -163,7 +162,7 @@ class ColorCell(Element):
             # They are not an exact match, but closest known value for this color.
 
             bs = BabelString(label, self.style)
-            tw, th = bs.textSize
+            tw, th = doc.context.textSize(bs)
 
             # Used padding-bottom (self.pb) also as gutter between color rectangle and labels
             e = Rect(x=self.pl, y=th+self.pb, w=self.pw, h=self.h-th-self.pb, fill=self.c)
@@ -182,7 +181,7 @@ class ColorCell(Element):
                 labelText = color(0) # Black label text
             style['fill'] = labelText
             bs = BabelString(label, style)
-            tw, th = bs.textSize
+            tw, th = doc.context.textSize(bs)
 
             e = Rect(x=self.pl, y=self.pb, w=self.pw, h=self.ph, fill=self.c)
             self.addElement(e)
@@ -286,21 +285,21 @@ class ColorMatrix(Element):
         if self.titleStyle:        
             # Add background rectangle on top with theme name and mood. getColor(shade, base)
             bs = BabelString('%s – %s' % (self.theme.name, self.theme.mood), self.titleStyle)
-            tw, th = bs.textSize
+            tw, th = doc.context.textSize(bs)
             e = Text(bs, x=self.pl+fontSize/2, y=self.h-self.pt*2/3, w=self.w)
             self.addElement(e)
 
         if self.captionStyle:
             bs = BabelString('Colors with (parenthesis) are approximated to the closest recipe.', 
                 self.captionStyle)
-            tw, th = bs.textSize
+            tw, th = doc.context.textSize(bs)
             e = Text(bs, x=self.pl, y=self.pb-th, w=self.pw)
             self.addElement(e)
 
             captionStyle2 = copy(self.captionStyle)
             captionStyle2['align'] = RIGHT
             bs = BabelString('Generated by PageBotNano', captionStyle2)
-            tw, th = bs.textSize
+            tw, th = doc.context.textSize(bs)
             e = Text(bs, x=self.pl+self.pw, y=self.pb-th, w=self.pw)
             self.addElement(e)
 
@@ -17,14 +17,47 @@
 #   can be placed on a page.
 #
 import os
+import hashlib
 from copy import deepcopy
 import sys
 sys.path.insert(0, "../..") # So we can import pagebotnano without installing.
 
 from pagebotnano.constants import CENTER, PADDING
-from pagebotnano.babelstring import BabelString
+from pagebotnano.babelstring import BabelString, getValueKey
 from pagebotnano.toolbox.transformer import path2FileName, makePadding
 from pagebotnano.toolbox.color import color
+from pagebotnano.toolbox.units import upt, packUnits, unpackUnit
+from pagebotnano.toolbox.traversal import traverse, SKIP
+from pagebotnano.elements.elementindex import ElementIndex
+from pagebotnano.elements.spatialindex import (SpatialIndex, UNBOUNDED,
+    EMPTY_BOUNDS, getBounds)
+
+# Attributes that change the bounding box of an element in its parent.
+SPATIAL_ATTRIBUTES = {'x', 'y', 'w', 'h', 'strokeWidth'}
+# Names of the slots of each element class, including the inherited ones.
+SLOT_NAMES = {}
+# Value of an undefined slot.
+NOT_SET = object()
+
+def getChildElements(e):
+    """Answer the iterator of child elements of `e`, for traverse."""
+    return iter(e.elements)
+
+def getSlotNames(cls):
+    """Answer the tuple of slot names of `cls` and its base classes.
+
+    >>> getSlotNames(Text)[-1]
+    'bs'
+    """
+    names = SLOT_NAMES.get(cls)
+    if names is None:
+        names = []
+        for base in reversed(cls.__mro__):
+            for name in base.__dict__.get('__slots__', ()):
+                if name not in ('__dict__', '__weakref__'):
+                    names.append(name)
+        SLOT_NAMES[cls] = names = tuple(names)
+    return names
 
 class Element:
     """Base class of all elements that can be placed on a page.
@@ -39,6 +72,26 @@ class Element:
     >>> page
     <Page pn=1 w=595pt h=842pt elements=0>
     """
+    # Attributes are stored in slots, as documents can have many elements.
+    # The __dict__ is kept for additional attributes of inheriting classes, 
+    # templates and applications.
+    __slots__ = ('x', 'y', 'w', 'h', 'fill', 'stroke', 'strokeWidth', 
+        '_padding', '_paddingUnit', 'margin', 'elements', 'name', 'template', 
+        'flow', 'next', '_dirty', '_hash', '_parent', '_index', '_spatialIndex',
+        '_bounds', '__dict__', '__weakref__')
+
+    def __new__(cls, *args, **kwargs):
+        e = object.__new__(cls)
+        # Default values of the dirty tracking, in case an inheriting class 
+        # sets attributes before calling Element.__init__
+        object.__setattr__(e, '_dirty', True) # Changed since the last build?
+        object.__setattr__(e, '_hash', None) # Cached content hash of the subtree, valid while not dirty.
+        object.__setattr__(e, '_parent', None) # Parent element, set by parent.addElement(self)
+        object.__setattr__(e, '_index', None) # ElementIndex of the tree, only stored in the root element.
+        object.__setattr__(e, '_spatialIndex', None) # SpatialIndex of the child elements, made when needed.
+        object.__setattr__(e, '_bounds', None) # Cached union bounds of the subtree, valid while not dirty.
+        return e
+
     def __init__(self, x=None, y=None, w=None, h=None, name=None, parent=None,
             template=None, fill=None, stroke=None, strokeWidth=0, 
             padding=None, margin=None, flow=None, nextElement=None):
@@ -67,10 +120,151 @@ class Element:
         # by implementing the self.initialize method.
         self.initialize()
 
+    def __setattr__(self, name, value):
+        """Set the attribute, marking self and all parents as dirty if this is
+        a public attribute. Private attributes (starting with an underscore)
+        don't change the output, so they don't set the dirty flag.
+
+        >>> page = Element(name='page')
+        >>> e = page.addElement(Element(w=100))
+        >>> page.setClean()
+        >>> page.isDirty, e.isDirty
+        (False, False)
+        >>> e.w = 200
+        >>> page.isDirty, e.isDirty
+        (True, True)
+        >>> e.name = 'Renamed' # Changing the name also updates the index.
+        >>> page.find('Renamed') is e
+        True
+        """
+        index = None
+        if name == 'name':
+            index = self._getRootIndex()
+            if index is not None and self not in index:
+                index = None
+        if index is None:
+            object.__setattr__(self, name, value)
+        else: # Renamed in an indexed tree, index self by the new name.
+            index.remove(self)
+            object.__setattr__(self, name, value)
+            index.add(self)
+        if isinstance(value, BabelString) and not name.startswith('_'):
+            value._addOwner(self) # Editing the text sets self dirty.
+        if name in SPATIAL_ATTRIBUTES: # Moved or resized, update the spatial index of the parent.
+            parent = self._parent
+            if parent is not None and parent._spatialIndex is not None:
+                parent._spatialIndex.update(self)
+        if not self._dirty and not name.startswith('_'):
+            self.setDirty()
+
     def _get_eId(self):
         return id(self)
     eId = property(_get_eId)
 
+    def _get_parent(self):
+        return self._parent
+    parent = property(_get_parent)
+
+    def _getAttributes(self):
+        """Answer the dictionary with the values of all slots that are set
+        and the attributes in self.__dict__.
+        """
+        attributes = dict(self.__dict__)
+        for name in getSlotNames(self.__class__):
+            value = getattr(self, name, NOT_SET)
+            if value is not NOT_SET:
+                attributes[name] = value
+        return attributes
+
+    def __getstate__(self):
+        """Answer the state for pickling. The index of the tree is not
+        included, as it may contain other pages. It is made again when needed.
+
+        >>> import pickle
+        >>> e = Element(name='root', padding=(10, 20))
+        >>> child = e.addElement(Rect(w=100, h=100))
+        >>> e2 = pickle.loads(pickle.dumps(e))
+        >>> e2.name, e2.padding, e2.elements[0].parent is e2
+        ('root', (10pt, 20pt, 10pt, 20pt), True)
+        """
+        state = self._getAttributes()
+        state.pop('_index', None)
+        state.pop('_spatialIndex', None)
+        return state
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            object.__setattr__(self, name, value)
+            if isinstance(value, BabelString) and not name.startswith('_'):
+                value._addOwner(self)
+
+    def _get_isDirty(self):
+        return self._dirty
+    isDirty = property(_get_isDirty)
+
+    def setDirty(self):
+        """Mark self and all parents as dirty, so they will be composed and
+        built again. This is done automatically by setting attributes,
+        adding child elements and changing a BabelString of self (e.g. 
+        appending to self.bs). In case other content is altered in place,
+        then the caller should call self.setDirty().
+        """
+        e = self
+        while e is not None and not e._dirty: # Parents of a dirty element are dirty too.
+            e._dirty = True
+            e = e._parent
+
+    def setClean(self):
+        """Clear the dirty flag of self and all child elements, e.g. after building.
+        """
+        def enter(e, state):
+            e._dirty = False
+        traverse(self, enter, children=getChildElements)
+
+    def getHash(self):
+        """Answer the content hash of self and its child elements. The hash is 
+        cached while self is not dirty, so only changed parts of a page are 
+        hashed again.
+
+        >>> e = Element(name='root', w=100)
+        >>> child = e.addElement(Element(name='child', w=200))
+        >>> h = e.getHash()
+        >>> e.setClean()
+        >>> h == e.getHash()
+        True
+        >>> child.w = 300
+        >>> h == e.getHash()
+        False
+        >>> from pagebotnano.toolbox.units import mm
+        >>> child.x = mm(3.14)
+        >>> h = e.getHash()
+        >>> child.x = mm(3.141) # Same repr, other position.
+        >>> h == e.getHash()
+        False
+        """
+        def enter(e, state):
+            if not e._dirty and e._hash is not None:
+                return SKIP # Cached hash of the subtree is still valid.
+
+        def leave(e, state): # All child elements have their hash now.
+            h = hashlib.md5(e.__class__.__name__.encode())
+            for name, value in sorted(e._getAttributes().items()):
+                if name.startswith('_') or name == 'elements':
+                    continue
+                # BabelString answers its content by bs.key. Other values by
+                # their exact key, as e.g. the repr of units is rounded.
+                key = getattr(value, 'key', None)
+                if key is None:
+                    key = getValueKey(value)
+                h.update(('%s=%r;' % (name, key)).encode())
+            h.update(('padding=%r%r;' % (getValueKey(e._padding), getValueKey(e._paddingUnit))).encode())
+            for child in e.elements:
+                h.update(child._hash.encode())
+            e._hash = h.hexdigest()
+
+        traverse(self, enter, leave, getChildElements)
+        return self._hash
+
     def initialize(self):
         """Allow elements, pages and templates to initialize themselves
         by implementing this method in inheriting classes.
@@ -96,9 +290,47 @@ class Element:
         """
         return self.pt, self.pr, self.pb, self.pl 
     def _set_padding(self, padding):
-        self.pt, self.pr, self.pb, self.pl = makePadding(padding, default=PADDING)
+        # Stored as plain values and a unit class. Equal values are shared.
+        self._padding, self._paddingUnit = packUnits(makePadding(padding, default=PADDING))
     padding = property(_get_padding, _set_padding)
 
+    def _setPaddingSide(self, index, value):
+        padding = list(self.padding)
+        padding[index] = value
+        self.padding = padding
+
+    def _get_pt(self):
+        """Answer the padding top, right, bottom and left as unit.
+
+        >>> from pagebotnano.toolbox.units import mm
+        >>> e = Element(padding=(10, 20, 30, 40))
+        >>> e.pb = mm(5)
+        >>> e.pt, e.pr, e.pb, e.pl
+        (10pt, 20pt, 5mm, 40pt)
+        """
+        return unpackUnit(self._padding[0], self._paddingUnit)
+    def _set_pt(self, pt):
+        self._setPaddingSide(0, pt)
+    pt = property(_get_pt, _set_pt)
+
+    def _get_pr(self):
+        return unpackUnit(self._padding[1], self._paddingUnit)
+    def _set_pr(self, pr):
+        self._setPaddingSide(1, pr)
+    pr = property(_get_pr, _set_pr)
+
+    def _get_pb(self):
+        return unpackUnit(self._padding[2], self._paddingUnit)
+    def _set_pb(self, pb):
+        self._setPaddingSide(2, pb)
+    pb = property(_get_pb, _set_pb)
+
+    def _get_pl(self):
+        return unpackUnit(self._padding[3], self._paddingUnit)
+    def _set_pl(self, pl):
+        self._setPaddingSide(3, pl)
+    pl = property(_get_pl, _set_pl)
+
     def _get_pw(self):
         """Answer the usable element space, withing the horizontal padding
 
@@ -122,15 +354,225 @@ class Element:
     def __repr__(self):
         return '<%s name=%s w=%s h=%s>' % (self.__class__.__name__, self.name, self.w, self.h)
 
+    def _getRootIndex(self):
+        """Answer the index of the root of the tree of self, if it already exists.
+        Otherwise answer None.
+        """
+        e = self
+        while e._parent is not None:
+            e = e._parent
+        return e._index
+
+    def getIndex(self):
+        """Answer the ElementIndex of the tree that self is part of. If it does
+        not exist, then it is made from a single walk through the tree. After that
+        it is kept up to date by addElement, removeElement and changing names.
+
+        >>> e = Element(name='root')
+        >>> child = e.addElement(Element(name='child'))
+        >>> child.getIndex() is e.getIndex()
+        True
+        >>> len(e.getIndex())
+        2
+        """
+        e = self
+        while e._parent is not None:
+            e = e._parent
+        if e._index is None:
+            e._index = ElementIndex(root=e)
+            e._index.addTree(e)
+        return e._index
+
     def addElement(self, e):
         """Add the element to the list of child elements.
         """
         self.elements.append(e)
+        e._parent = self
+        if e._index is not None: # The index of the tree of self is used now.
+            e._index = None
+        index = self._getRootIndex()
+        if index is not None:
+            index.addTree(e)
+        if self._spatialIndex is not None:
+            self._spatialIndex.add(e)
+        self.setDirty()
+        return e # Answer the element in convenience for the caller.
+
+    def removeElement(self, e):
+        """Remove the element from the list of child elements.
+
+        >>> e = Element()
+        >>> child = e.addElement(Element())
+        >>> e.removeElement(child) is child, e.elements
+        (True, [])
+        """
+        self.elements.remove(e)
+        index = self._getRootIndex()
+        if index is not None:
+            index.removeTree(e)
+        if self._spatialIndex is not None:
+            self._spatialIndex.remove(e)
+        e._parent = None
+        self.setDirty()
         return e # Answer the element in convenience for the caller.
 
+    def getSpatialIndex(self):
+        """Answer the SpatialIndex with the bounding boxes of the child elements.
+        It is made on first use, then kept up to date when child elements are 
+        added, removed, moved or resized.
+        """
+        if self._spatialIndex is None:
+            self._spatialIndex = SpatialIndex()
+            for e in self.elements:
+                self._spatialIndex.add(e)
+        return self._spatialIndex
+
+    def updateBounds(self):
+        """Update the cached union bounds of self and its child elements, as
+        (x1, y1, x2, y2) in points in the coordinates of the parent. Only the
+        bounds of dirty elements are calculated again. Elements without size
+        only count with their child elements, if they draw as Element, which
+        needs a size. Otherwise they are UNBOUNDED, as they may draw anywhere.
+
+        >>> group = Element(x=100, y=100, w=10, h=10)
+        >>> child = Rect(x=-200, y=0, w=50, h=50, parent=group)
+        >>> group.updateBounds()
+        >>> group._bounds
+        (-100.0, 100.0, 110.0, 150.0)
+        >>> child.x = 0
+        >>> group.updateBounds()
+        >>> group._bounds
+        (100.0, 100.0, 150.0, 150.0)
+        """
+        def getOwnBounds(e):
+            if e.w is not None and e.h is not None:
+                return getBounds(e)
+            if e.__class__.drawContent is Element.drawContent and \
+                    e.__class__.drawBackground is Element.drawBackground and \
+                    e.__class__.drawForeground is Element.drawForeground:
+                return EMPTY_BOUNDS # Nothing is drawn, only the child elements.
+            return UNBOUNDED
+
+        def getDirtyGroups(e):
+            # Bounds of child elements without children are made in leave,
+            # which saves the traverse of all leaves.
+            return (child for child in e.elements
+                if child.elements and (child._dirty or child._bounds is None))
+
+        def leave(e, state): # All child groups have their bounds now.
+            x1, y1, x2, y2 = bounds = getOwnBounds(e)
+            if e.elements:
+                ex = upt(e.x)
+                ey = upt(e.y)
+                for child in e.elements:
+                    if not child.elements and (child._dirty or child._bounds is None):
+                        child._bounds = getOwnBounds(child)
+                    if bounds is UNBOUNDED:
+                        continue # Self may draw anywhere, but keep the child bounds.
+                    cx1, cy1, cx2, cy2 = child._bounds
+                    if ex + cx1 < x1:
+                        x1 = ex + cx1
+                    if ey + cy1 < y1:
+                        y1 = ey + cy1
+                    if ex + cx2 > x2:
+                        x2 = ex + cx2
+                    if ey + cy2 > y2:
+                        y2 = ey + cy2
+                if bounds is not UNBOUNDED:
+                    bounds = x1, y1, x2, y2
+            e._bounds = bounds
+
+        if self._dirty or self._bounds is None:
+            traverse(self, lambda e, state: None, leave, getDirtyGroups)
+
+    def getVisibleElements(self, x1, y1, x2, y2):
+        """Answer the set of eId of the child elements that may draw in the 
+        (x1, y1, x2, y2) box in points, relative to the origin of self. The
+        union bounds of the child elements are cached by self.updateBounds,
+        so groups of elements that are completely outside the box are not
+        visible either. Elements with unknown bounds are visible.
+
+        >>> page = Element(w=500, h=500)
+        >>> e1 = Rect(x=10, y=10, w=50, h=50, parent=page)
+        >>> e2 = Rect(x=600, y=10, w=50, h=50, parent=page)
+        >>> group = Element(x=600, y=10, w=50, h=50, parent=page)
+        >>> e3 = Rect(x=-550, y=0, w=50, h=50, parent=group) # On the page.
+        >>> page.updateBounds()
+        >>> page.getVisibleElements(0, 0, 500, 500) == {id(e1), id(group)}
+        True
+        """
+        visible = set()
+        for e in self.elements:
+            bounds = e._bounds
+            if bounds is not None:
+                bx1, by1, bx2, by2 = bounds
+                if bx2 < x1 or x2 < bx1 or by2 < y1 or y2 < by1:
+                    continue # Completely outside the box.
+            visible.add(id(e))
+        return visible
+
+    def elementsIn(self, r):
+        """Answer the list of child elements that overlap with the rectangle 
+        `r` as (x, y, w, h), relative to the origin of self, in drawing order.
+
+        >>> page = Element(w=500, h=500)
+        >>> e1 = Rect(x=10, y=10, w=50, h=50, parent=page)
+        >>> e2 = Rect(x=300, y=300, w=50, h=50, parent=page)
+        >>> page.elementsIn((0, 0, 100, 100))
+        [<Rect name=Rect w=50 h=50>]
+        >>> e2.x = 50 # Moving updates the spatial index.
+        >>> len(page.elementsIn((0, 0, 100, 400)))
+        2
+        """
+        x, y, w, h = upt(r)
+        found = self.getSpatialIndex().query(x, y, x + w, y + h)
+        return [e for e in self.elements if id(e) in found]
+
+    def elementAt(self, x, y):
+        """Answer the top child element (the last drawn) at position (x, y),
+        relative to the origin of self. Answer None if there is no element.
+
+        >>> page = Element(w=500, h=500)
+        >>> e1 = Rect(x=10, y=10, w=50, h=50, parent=page)
+        >>> e2 = Rect(x=40, y=40, w=50, h=50, parent=page)
+        >>> page.elementAt(45, 45) is e2, page.elementAt(20, 20) is e1, page.elementAt(200, 200)
+        (True, True, None)
+        """
+        found = self.elementsIn((x, y, 0, 0))
+        if found:
+            return found[-1]
+        return None
+
+    def getCollisions(self, e):
+        """Answer the list of child elements that overlap with the bounding box
+        of `e`, excluding `e` itself. Touching edges don't collide. Element `e` 
+        does not need to be a child, so a layout can be checked before adding.
+
+        >>> page = Element(w=500, h=500)
+        >>> e1 = Rect(x=10, y=10, w=50, h=50, parent=page)
+        >>> e2 = Rect(x=60, y=10, w=50, h=50, parent=page) # Touching e1
+        >>> page.getCollisions(e1)
+        []
+        >>> page.getCollisions(Rect(x=50, y=50, w=20, h=20))
+        [<Rect name=Rect w=50 h=50>, <Rect name=Rect w=50 h=50>]
+        """
+        index = self.getSpatialIndex()
+        x1, y1, x2, y2 = index.getBounds(e)
+        found = index.query(x1, y1, x2, y2)
+        collisions = []
+        for child in self.elements:
+            if child is e or id(child) not in found:
+                continue
+            bx1, by1, bx2, by2 = index.bounds[id(child)]
+            if bx1 < x2 and x1 < bx2 and by1 < y2 and y1 < by2:
+                collisions.append(child)
+        return collisions
+
     def find(self, name=None, pattern=None, cls=None):
-        """Search through the tree of self and self.elements to find an
-        element with the indicated name.
+        """Answer the first element in the tree of self and self.elements
+        with the indicated name, or with `pattern` in its name, or with class name
+        `cls`. Answer None if there is no match. The elements are looked up 
+        in the index of the tree, instead of searching through the tree.
 
         >>> e = Element(name='root')
         >>> child1 = e.addElement(Element(name='child1'))
@@ -145,19 +587,50 @@ class Element:
         >>> e.find(cls='Element') 
         <Element name=root w=None h=None>
         """
-        assert name is not None or pattern is not None or cls is not None, ('%s.find: Define either name or pattern' % self.__class__.__name__)
-        if name is not None and name == self.name:
-            return self
-        if cls == self.__class__.__name__:
-            return self
-        if pattern is not None and pattern in self.name:
-            return self
-        for child in self.elements:
-            found = child.find(name, pattern, cls)
-            if found is not None:
-                return found
+        found = self.findAll(name, pattern, cls)
+        if found:
+            return found[0]
         return None
 
+    def findAll(self, name=None, pattern=None, cls=None):
+        """Answer the list of all elements in the tree of self and self.elements
+        with the indicated name, or with `pattern` in its name, or with class
+        name `cls`. Self is first if it matches, then the others in order
+        of adding to the tree.
+
+        >>> e = Element(name='root')
+        >>> child1 = e.addElement(Element(name='child1'))
+        >>> child2 = child1.addElement(Rect(name='child2'))
+        >>> e.findAll(pattern='child')
+        [<Element name=child1 w=None h=None>, <Rect name=child2 w=None h=None>]
+        >>> child1.findAll(cls='Element')
+        [<Element name=child1 w=None h=None>]
+        >>> child1.removeElement(child2) is child2
+        True
+        >>> e.findAll(cls='Rect'), child2.findAll(cls='Rect')
+        ([], [<Rect name=child2 w=None h=None>])
+        """
+        assert name is not None or pattern is not None or cls is not None, ('%s.find: Define either name or pattern' % self.__class__.__name__)
+        index = self.getIndex()
+        if index.root is None: # Shared by the pages of a document, only search the page of self.
+            found = index.findAll(name, pattern, cls, top=index._getTop(self))
+        else:
+            found = index.findAll(name, pattern, cls)
+        if index.root is not self and self._parent is not None: # Only keep the descendants.
+            found = [e for e in found if self._isAncestorOf(e)]
+        if self in found and found[0] is not self:
+            found.remove(self)
+            found.insert(0, self)
+        return found
+
+    def _isAncestorOf(self, e):
+        """Answer True if self is `e` or one of its parents."""
+        while e is not None:
+            if e is self:
+                return True
+            e = e._parent
+        return False
+
     def compose(self, doc, parent=None):
         """Compose the layout of an element. Default behavior is to pass it on
         to the children. To be redefined by inheriting Element to make their own
@@ -175,12 +648,30 @@ class Element:
         >>> page 
         <Page pn=1 w=595pt h=842pt elements=3>
         """
-        if self.template is not None:
-            self.template(doc, parent=self)
-        # Now broadcast the compose call to all child elements.
-        # Note that these may just have been created by the template.
-        for e in self.elements:
-            e.compose(doc, parent=self)
+        # The compose call is broadcasted to all child elements, by traversing
+        # the tree of self. Note that these may just have been created by the template.
+        profiler = doc.profiler
+
+        def enter(e, parent):
+            if e is not self:
+                if e.__class__.compose is not Element.compose:
+                    # The inheriting class composes itself and its child elements.
+                    if profiler is None:
+                        e.compose(doc, parent=parent)
+                    else: # Profiling is on, time the compose of the child element.
+                        profiler.compose(e, doc, parent=parent)
+                    return SKIP
+                if profiler is not None:
+                    profiler.startElement('compose', e)
+            if e.template is not None:
+                e.template(doc, parent=e)
+            return e # Parent of the child elements.
+
+        def leave(e, parent):
+            if profiler is not None and e is not self:
+                profiler.stop()
+
+        traverse(self, enter, leave, getChildElements, parent)
 
     def build(self, x, y, doc, parent=None):
         """Build the content of the element, including background color,
@@ -195,31 +686,71 @@ class Element:
         >>> page.addElement(e)
         >>> doc.build() # Recursively draws all pages and their elements.
         >>> doc.export('_export/Element-build.pdf') # Export an build again.
+        >>> from pagebotnano.contexts.null.context import NullContext
+        >>> doc = Document(context=NullContext())
+        >>> page = doc.newPage()
+        >>> e = page
+        >>> for n in range(2000): # Nesting deeper than the recursion limit.
+        ...     e = Rect(x=1, y=1, w=10, h=10, fill=0.5, parent=e)
+        >>> doc.build() # Nested rects beyond the page width are culled.
+        >>> doc.context.calls['rect']
+        595
         """
-        # Calculate the new origing relative to self, for all drawing,
-        # including the child elements
-        ox = x + self.x
-        oy = y + self.y
-
-        # Do building of the element background here. 
-        # Let inheriting subclasses handle what must appear on the background.
-        # Disadvantage of this method is that fill objects with a stroke get
-        # drawn double in InDesign. Bit allows to use the stroke outlines as
-        # clipping frame if other content is added to between the two layers.
-        self.drawBackground(ox, oy, doc, parent)
-
-        # Then let inheriting subclasses draw any content (if they have it)
-        self.drawContent(ox, oy, doc, parent)
-
-        # Then recursively pass the build instruction on to all child elements.
-        # Use the position of self as origin for the relative position of the children.
-        for e in self.elements:
-            e.build(ox, oy, doc, parent=self)
-
-        # Do building of the element foreground here. 
-        # Let inheriting subclasses handle what must appear on the background.
-        # Draw the stroke of the element, in case a color and tickness was defined. 
-        self.drawForeground(ox, oy, doc, parent)
+        # The build instruction is passed on to all child elements, by traversing
+        # the tree of self. Each frame is (ox, oy, e, parent, visible), where (ox, oy) 
+        # is the origin of element e, calculated once from the origin of its parent.
+        # Element e is the parent of the child elements.
+        # It is used for all drawing of e and as origin of the child elements.
+        # If the page defined the clip box doc.cd.clip, then `visible` is the set of
+        # eId of the child elements of e that may draw in it. The others are culled.
+        profiler = doc.profiler
+        clip = doc.cd.clip
+
+        def enter(e, frame):
+            x, y, parent, _, visible = frame
+            if e is not self:
+                if visible is not None and id(e) not in visible:
+                    return SKIP # Off-canvas, don't build e and its child elements.
+                if e.__class__.build is not Element.build:
+                    # The inheriting class builds itself and its child elements.
+                    if profiler is None:
+                        e.build(x, y, doc, parent=parent)
+                    else: # Profiling is on, time the build of the child element.
+                        profiler.build(e, x, y, doc, parent=parent)
+                    return SKIP
+                if profiler is not None:
+                    profiler.startElement('build', e)
+            # Calculate the new origin relative to e, for all drawing,
+            # including the child elements
+            ox = x + e.x
+            oy = y + e.y
+
+            # Do building of the element background here. 
+            # Let inheriting subclasses handle what must appear on the background.
+            # Disadvantage of this method is that fill objects with a stroke get
+            # drawn double in InDesign. Bit allows to use the stroke outlines as
+            # clipping frame if other content is added to between the two layers.
+            e.drawBackground(ox, oy, doc, parent)
+
+            # Then let inheriting subclasses draw any content (if they have it)
+            e.drawContent(ox, oy, doc, parent)
+            visible = None
+            if clip is not None and e.elements:
+                cx1, cy1, cx2, cy2 = clip
+                rx = upt(ox)
+                ry = upt(oy)
+                visible = e.getVisibleElements(cx1 - rx, cy1 - ry, cx2 - rx, cy2 - ry)
+            return ox, oy, e, parent, visible
+
+        def leave(e, frame):
+            ox, oy, _, parent, _ = frame
+            # Do building of the element foreground here, after the child elements. 
+            # Draw the stroke of the element, in case a color and tickness was defined. 
+            e.drawForeground(ox, oy, doc, parent)
+            if profiler is not None and e is not self:
+                profiler.stop()
+
+        traverse(self, enter, leave, getChildElements, (x, y, parent, None, None))
 
     def drawContent(self, ox, oy, doc, parent):
         """Default behavior is to do nothing, as the Element (and e.h. Rect)
@@ -263,6 +794,7 @@ class Rect(Element):
     >>> e = Rect(parent=page, x=padding, y=padding, w=page.w-2*padding, h=page.h-2*padding, fill=color(1, 0.2, 1))
     >>> doc.export('_export/Rect.pdf') # Build and export.
     """
+    __slots__ = ()
 
 # Oval = Element would have been the same.
 class Oval(Element):
@@ -275,6 +807,8 @@ class Oval(Element):
     >>> e = Oval(parent=page, x=padding, y=padding, w=page.w-2*padding, h=page.h-2*padding, fill=color(1, 0.2, 1))
     >>> doc.export('_export/Rect.pdf') # Build and export.
     """
+    __slots__ = ()
+
     def drawBackground(self, ox, oy, doc, parent):
         """Draw the background of the element. Default is to just draw the 
         oval with the fill color, if it is defined. This method should be 
@@ -315,6 +849,8 @@ class Line(Element):
     >>> page.addElement(e)
     >>> doc.export('_export/Line.pdf') # Build and export.
     """
+    __slots__ = ()
+
     def drawContent(self, ox, oy, doc, parent):
         """We just need to define drawing of the content. The rest of behavior
         for the Line element (including drawing on the background and the frame) 
@@ -348,6 +884,7 @@ class Text(Element):
     >>> page.addElement(e)
     >>> doc.export('_export/Text.pdf') # Build and export.
     """
+    __slots__ = ('bs',)
 
     def __init__(self, bs, **kwargs):
         # Call the base element with all standard attributes.
@@ -392,11 +929,13 @@ class TextBox(Text):
     ...     e = Text(pn, w=page.w/2, parent=page)
     ...     e = TextBox(bs, parent=page, x=padding, y=padding, w=page.w-2*padding, h=page.h-2*padding, fill=1)
     ...     bs = e.getOverflow(bs, doc=doc)
-    ...     if not bs.fs: # Test on this “incomplete” BabelString, as it only has a cached FS
+    ...     if not len(bs): # No more overflow text
     ...         break
     >>> doc.export('_export/TextBox-Overflow.pdf') # Build and export.
 
     """
+    __slots__ = ('_overflow',)
+
     def __init__(self, bs, w=None, **kwargs):
         """Call the super class element with all standard attributes.
         Different from the Text class, now the width `w` is a required attribute.
@@ -405,9 +944,22 @@ class TextBox(Text):
         Text.__init__(self, bs, w=w, **kwargs)
 
     def getOverflow(self, bs=None, w=None, h=None, doc=None):
-        """Flow the text into self and put any overflow in self.next.
-        If there is no self.next defined, then store the remaining overflow
-        text in self.overflow.
+        """Flow the text into self and answer the overflow BabelString
+        that does not fit. The overflow is measured by the context, 
+        nothing is drawn on the canvas.
+
+        >>> from pagebotnano.document import Document
+        >>> from pagebotnano.contexts.recording.context import RecordingContext
+        >>> from pagebotnano.contexts.null.context import NullContext
+        >>> from pagebotnano.toolbox.units import mm
+        >>> doc = Document(context=RecordingContext(NullContext()))
+        >>> page = doc.newPage()
+        >>> bs = BabelString('Hello world '*100, dict(font='PageBot-Regular', fontSize=10, lineHeight=14))
+        >>> tb = TextBox(bs, w=page.pw, h=mm(30), parent=page) # Widths and heights in units.
+        >>> len(tb.getOverflow(doc=doc)) < len(bs)
+        True
+        >>> len(tb.getOverflow(w=mm(50), h=mm(20), doc=doc)) == len(doc.context.context.fitText(bs, 141.732, 56.693)[1])
+        True
         """
         # Make sure that there is a `doc` for the context.
         assert doc is not None
@@ -417,24 +969,14 @@ class TextBox(Text):
         if bs is None:
             bs = self.bs
 
-        # Note that the hyphenation flag works while drawing the textBox, for the
-        # entire textbox. It is not – what would be expected – defined per paragraph.
-        doc.context.hyphenation(bs.hyphenation)
-
-        # Since we cannot test the overflow without drawing in the context, 
-        # we'll create a text column far outside the page boundaries. 
-        # Unfortunately this increases the PDF export size.
-        h = w or self.h
-        w = h or self.w
-        if h is None and w is not None:
-            # Height of the box is undefined, measure it from the defined column width.
-            _, h = doc.context.textSize(bs, width=w)
-        elif w is None and h is not None:
+        w = w or self.w
+        h = h or self.h
+        if w is None and h is not None:
             # Width of the box is undefined, measure it from the defined column height.
-            w, _ = doc.context.textSize(bs, height=h)
-
-        # Height of the box is undefined, measure it from the defined column width.
-        return doc.context.textBox(bs, (10000000, 0, w, h))
+            w, _ = doc.context.textSize(bs, h=h)
+        # If the height is undefined, then all text fits.
+        _, overflow = doc.context.fitText(bs, w, h)
+        return overflow
 
     def drawContent(self, ox, oy, doc, parent):
         """We just need to define drawing of the foreground. The rest of behavior
@@ -460,8 +1002,8 @@ class TextBox(Text):
             w, _ = doc.context.textSize(self.bs, h=h)
         # Else if width and height are both defined or undefined, we can used them as is. 
         # In case width and height are both defined, it may result in a new overflow
-        # FormattedString. Store that in self.overflow.
-        self.overflow = doc.context.textBox(self.bs, (ox, oy, self.w, self.h or page.h)) 
+        # FormattedString. Store that in self._overflow, which does not make self dirty.
+        self._overflow = doc.context.textBox(self.bs, (ox, oy, w, h))
 
 class Flow(TextBox):
     """The Flow textbox is typically placed on a Galley, after parsing a markdown file.
@@ -470,6 +1012,8 @@ class Flow(TextBox):
     phase, active Flows instances become stored in the Document.flows dictionary,
     with their identifier as key.
     """
+    __slots__ = ('id',)
+
     def __init__(self, bs='', id=0, **kwargs):
         """Call the super class element with all standard attributes.
         Different from the Text class, now the width `w` is a required attribute.
@@ -504,6 +1048,8 @@ class Image(Element):
     >>> doc.export('_export/Image.pdf') # Build and export as PDF
     >>> doc.export('_export/Image.png') # Build and export as PNG
     """
+    __slots__ = ('path',)
+
     def __init__(self, path=None, **kwargs):
         # Call the base element with all standard attributes.
         Element.__init__(self, **kwargs)
@@ -621,6 +1167,8 @@ class Marker(Element):
     >>> m
     <Marker type=footnote id=abcd1990>
     """
+    __slots__ = ('markerType', 'ref', 'id')
+
     def __init__(self, markerType, ref=None, id=None, **kwargs):
         """Call the base element with all standard attributes.
         """
@@ -645,7 +1193,7 @@ class Marker(Element):
 
 class TemplateMarker(Marker):
     """TemplateMarker are used to indicate template calls in a markdown stream."""
-    pass
+    __slots__ = ()
 
 if __name__ == "__main__":
     # Running this document will execute all >>> comments as test of this source.
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+# -----------------------------------------------------------------------------
+#
+#   P A G E B O T  N A N O
+#
+#   Copyright (c) 2020+ Buro Petr van Blokland + Claudia Mens
+#   www.pagebot.io
+#   Licensed under MIT conditions
+#
+#   Supporting DrawBot, www.drawbot.com
+# -----------------------------------------------------------------------------
+#
+#   elementindex.py
+#
+#   The ElementIndex keeps all elements of a tree (or of all pages in a
+#   Document) by name and by class name, so Element.find does not need
+#   to walk the tree. It is updated by addElement, removeElement and by
+#   changing the element name. If the index is shared by the pages of a
+#   Document, then the elements are also kept per page, so a find on one
+#   page does not depend on the number of pages.
+#
+from bisect import bisect_left, insort
+import sys
+
+if __name__ == "__main__":
+    sys.path.insert(0, "../..") # So we can import pagebotnano without installing.
+
+class ElementIndex:
+    """Index of elements by name and class name. The elements of each key are
+    kept in order of adding, in a dictionary with the element id as key.
+    For pattern search, all suffixes of the names are kept in a sorted list
+    (suffix array), so a name that contains the pattern is found with a
+    binary search on the suffixes that start with the pattern.
+
+    >>> from pagebotnano.elements import Element, Rect
+    >>> index = ElementIndex()
+    >>> e1 = Element(name='MainText')
+    >>> e2 = Rect(name='Background')
+    >>> e3 = Rect(name='Text2')
+    >>> for e in (e1, e2, e3):
+    ...     index.add(e)
+    >>> index.findAll(name='MainText')
+    [<Element name=MainText w=None h=None>]
+    >>> index.findAll(cls='Rect')
+    [<Rect name=Background w=None h=None>, <Rect name=Text2 w=None h=None>]
+    >>> index.findAll(pattern='Text')
+    [<Element name=MainText w=None h=None>, <Rect name=Text2 w=None h=None>]
+    >>> index.remove(e1)
+    >>> index.findAll(pattern='Text')
+    [<Rect name=Text2 w=None h=None>]
+    >>> len(index)
+    2
+    >>> page1, page2 = Element(name='page'), Element(name='page')
+    >>> main1 = page1.addElement(Element(name='MAIN'))
+    >>> main2 = page2.addElement(Element(name='MAIN'))
+    >>> for page in (page1, page2):
+    ...     index.addTree(page)
+    >>> index.findAll(name='MAIN', top=page2) == [main2]
+    True
+    >>> len(index.findAll(name='MAIN')), index.findAll(pattern='AI', cls='Rect', top=page1) == [main1]
+    (2, True)
+    """
+    def __init__(self, root=None):
+        self.root = root # Root element of the indexed tree, None if shared by the pages of a Document.
+        self.names = {} # name --> {eId: e}
+        self.classes = {} # class name --> {eId: e}
+        self.eNames = {} # eId --> name as indexed, in case e.name changes.
+        self.order = {} # eId --> serial number, to sort combined results in order of adding.
+        self.serial = 0
+        self.suffixes = [] # Sorted list of (suffix, name) for all names.
+        # If shared by the pages of a Document (root is None), the names and
+        # classes per top element (page) too: topId --> (names, classes)
+        self.tops = {}
+        self.eTops = {} # eId --> topId
+
+    def __repr__(self):
+        return '<%s elements=%d names=%d>' % (self.__class__.__name__, len(self), len(self.names))
+
+    def __len__(self):
+        return len(self.eNames)
+
+    def __contains__(self, e):
+        return id(e) in self.eNames
+
+    def _getTop(self, e):
+        """Answer the top element of the tree of `e`, such as its page."""
+        while getattr(e, '_parent', None) is not None:
+            e = e._parent
+        return e
+
+    def add(self, e, top=None):
+        """Add element `e` to the index. Its child elements are not added.
+        `top` is the top element of its tree, searched if undefined.
+        """
+        eId = id(e)
+        if eId in self.eNames:
+            return
+        name = getattr(e, 'name', None) # Not all elements call Element.__init__
+        className = e.__class__.__name__
+        if self.root is None:
+            if top is None:
+                top = self._getTop(e)
+            topNames, topClasses = self.tops.setdefault(id(top), ({}, {}))
+            topNames.setdefault(name, {})[eId] = e
+            topClasses.setdefault(className, {})[eId] = e
+            self.eTops[eId] = id(top)
+        self.eNames[eId] = name
+        self.order[eId] = self.serial
+        self.serial += 1
+        elements = self.names.get(name)
+        if elements is None: # New name, add its suffixes for pattern search.
+            self.names[name] = elements = {}
+            for index in range(len(name or '')):
+                insort(self.suffixes, (name[index:], name))
+        elements[eId] = e
+        self.classes.setdefault(className, {})[eId] = e
+
+    def remove(self, e):
+        """Remove element `e` from the index. Its child elements are not removed."""
+        eId = id(e)
+        if eId not in self.eNames:
+            return
+        name = self.eNames.pop(eId)
+        del self.order[eId]
+        elements = self.names[name]
+        del elements[eId]
+        if not elements: # Last element with this name, remove the suffixes too.
+            del self.names[name]
+            for index in range(len(name or '')):
+                suffixIndex = bisect_left(self.suffixes, (name[index:], name))
+                del self.suffixes[suffixIndex]
+        className = e.__class__.__name__
+        del self.classes[className][eId]
+        if not self.classes[className]:
+            del self.classes[className]
+        topId = self.eTops.pop(eId, None)
+        if topId is not None:
+            topNames, topClasses = self.tops[topId]
+            for key, elements in ((name, topNames), (className, topClasses)):
+                del elements[key][eId]
+                if not elements[key]:
+                    del elements[key]
+            if not topClasses: # Last element of this top.
+                del self.tops[topId]
+
+    def addTree(self, e):
+        """Add `e` and all its descendants to the index."""
+        top = self._getTop(e) if self.root is None else None
+        stack = [e]
+        while stack:
+            e = stack.pop()
+            self.add(e, top)
+            stack.extend(reversed(getattr(e, 'elements', ())))
+
+    def removeTree(self, e):
+        """Remove `e` and all its descendants from the index."""
+        stack = [e]
+        while stack:
+            e = stack.pop()
+            self.remove(e)
+            stack.extend(getattr(e, 'elements', ()))
+
+    def _findPattern(self, pattern):
+        """Answer the list of names that contain `pattern`.
+
+        >>> index = ElementIndex()
+        >>> from pagebotnano.elements import Element
+        >>> for name in ('abc', 'bcd', 'xyz'):
+        ...     index.add(Element(name=name))
+        >>> sorted(index._findPattern('bc'))
+        ['abc', 'bcd']
+        """
+        names = set()
+        suffixes = self.suffixes
+        index = bisect_left(suffixes, (pattern,))
+        while index < len(suffixes) and suffixes[index][0].startswith(pattern):
+            names.add(suffixes[index][1])
+            index += 1
+        return names
+
+    def findAll(self, name=None, pattern=None, cls=None, top=None):
+        """Answer the list of elements that match `name` or contain `pattern`
+        in their name, or have class name `cls`, in order of adding. If `top`
+        is defined, then only the elements in the tree of `top` are answered.
+        """
+        names, classes = self.names, self.classes
+        if top is not None:
+            names, classes = self.tops.get(id(top), ({}, {}))
+        found = {}
+        if name is not None:
+            found.update(names.get(name, {}))
+        if cls is not None:
+            found.update(classes.get(cls, {}))
+        if pattern is not None:
+            for foundName in self._findPattern(pattern):
+                found.update(names.get(foundName, {}))
+        order = self.order
+        return sorted(found.values(), key=lambda e: order[id(e)])
+
+if __name__ == "__main__":
+    # Running this document will execute all >>> comments as test of this source.
+    import doctest
+    doctest.testmod()[0]
@@ -17,7 +17,6 @@
 #   can be placed on a page.
 #
 import sys
-import drawBot
 from random import random
 
 if __name__ == "__main__":
@@ -31,6 +30,8 @@ class Page(Element):
     # of page objects (name spelled with an initial lower case.)
     # Page being another kind of Element, means that theoretically
     # it can be placed on another page or inside another element.
+    __slots__ = ('pn',)
+
     def __init__(self, pn=None, **kwargs):
         Element.__init__(self, **kwargs)
         self.pn = pn # Store the page number in the page.
@@ -49,17 +50,49 @@ class Page(Element):
     def addElement(self, e):
         """Add the element to the list of child elements.
         """
-        self.elements.append(e)
+        Element.addElement(self, e)
 
     def build(self, x=0, y=0, doc=None, **kwargs):
         """Draw the page and recursively make the child elements to draw 
         themselves in DrawBot. The build is “broadcast” to all the elements 
         on the page.
 
+        >>> from pagebotnano.document import Document
+        >>> from pagebotnano.contexts.null.context import NullContext
+        >>> from pagebotnano.elements import Rect
+        >>> doc = Document(w=500, h=500, context=NullContext())
+        >>> page = doc.newPage()
+        >>> e1 = Rect(x=10, y=10, w=100, h=100, fill=0.5, parent=page)
+        >>> e2 = Rect(x=-200, y=10, w=100, h=100, fill=0.5, parent=page) # Off-canvas
+        >>> doc.build()
+        >>> doc.context.calls['rect']
+        1
+        >>> group = Element(x=-500, y=10, parent=page) # Group without size, off-canvas
+        >>> for n in range(10):
+        ...     e = Rect(x=n*10, y=10, w=5, h=5, fill=0.5, parent=group)
+        >>> group = Element(x=10, y=10, w=100, h=100, parent=page) # Draws its background
+        >>> e = Rect(x=-500, y=10, w=5, h=5, fill=0.5, parent=group) # Nested, off-canvas
+        >>> e = Rect(x=300, y=10, w=5, h=5, fill=0.5, parent=group) # Nested, on the page
+        >>> doc.build()
+        >>> doc.context.calls['rect']
+        4
         """
         assert doc is not None, ('%s.build: Document needs to be defined.' % self.__class__.__name__)
-        drawBot.newPage(upt(self.w), upt(self.h)) # Create a new DrawBot page. Convert size to points.
+        doc.context.newPage(self.w, self.h) # Create a new page in the context canvas.
+        profiler = doc.profiler
+        # Elements that are fully outside the page are not built. Elements 
+        # with child elements are culled by the union bounds of their tree. 
+        # Elements without size are always built, as their drawing may extend 
+        # outside their bounding box. Element.build culls the nested elements
+        # with the clip box of the page in doc.cd.clip
+        w = upt(self.w)
+        h = upt(self.h)
+        self.updateBounds()
+        visible = self.getVisibleElements(0, 0, w, h)
+        doc.cd.clip = upt(x), upt(y), upt(x) + w, upt(y) + h
         for e in self.elements:
+            if id(e) not in visible:
+                continue # Off-canvas, skip it.
             doc.cd.page = self # Set the running rending parameters
             doc.cd.parent = self
             # Passing on doc and this page in case an element needs more info.
@@ -67,7 +100,11 @@ class Page(Element):
             # set it to default (0, 0).
             # In case a page is used on a spread or for display on another page,
             # (x, y) can have another value.
-            e.build(x=x, y=y, doc=doc) 
+            if profiler is None:
+                e.build(x=x, y=y, doc=doc) 
+            else: # Profiling is on, time the build of the element.
+                profiler.build(e, x, y, doc)
+        doc.cd.clip = None # Elements that are built outside a page are not culled.
 
     # Rough example of implementing HTML/CSS generator in this architecture
     #def build_html(self):
@@ -78,6 +115,34 @@ class Page(Element):
     #     # set it to (0, 0)
     #     element.build_html(x=0, y=0, doc=doc, page=self, parent=self) 
 
+class PageStub:
+    """Lightweight replacement of a Page that is built and released by a
+    streaming Document. It only keeps the page number, name and bounding box,
+    so templates can still make cross-references to the page.
+
+    >>> page = Page(pn=12, name='Chapter', w=400, h=500)
+    >>> stub = PageStub(page)
+    >>> stub
+    <PageStub pn=12 name=Chapter w=400 h=500>
+    >>> stub.bbox
+    (0, 0, 400, 500)
+    """
+    def __init__(self, page):
+        self.pn = page.pn
+        self.name = page.name
+        self.x = page.x
+        self.y = page.y
+        self.w = page.w
+        self.h = page.h
+
+    def __repr__(self):
+        return '<%s pn=%d name=%s w=%s h=%s>' % (self.__class__.__name__, 
+            self.pn, self.name, self.w, self.h)
+
+    def _get_bbox(self):
+        return self.x, self.y, self.w, self.h
+    bbox = property(_get_bbox)
+
 if __name__ == "__main__":
     # Running this document will execute all >>> comments as test of this source.
     import doctest
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+# -----------------------------------------------------------------------------
+#
+#   P A G E B O T  N A N O
+#
+#   Copyright (c) 2020+ Buro Petr van Blokland + Claudia Mens
+#   www.pagebot.io
+#   Licensed under MIT conditions
+#
+#   Supporting DrawBot, www.drawbot.com
+# -----------------------------------------------------------------------------
+#
+#   spatialindex.py
+#
+#   The SpatialIndex keeps the bounding boxes of the child elements of a
+#   parent (typically a Page) in a uniform grid of cells, so region queries,
+#   hit testing and collision checks only look at the elements in the
+#   cells that overlap, instead of at all elements.
+#
+import sys
+
+if __name__ == "__main__":
+    sys.path.insert(0, "../..") # So we can import pagebotnano without installing.
+
+from pagebotnano.toolbox.units import upt # Converts units to points.
+
+# Size of the grid cells in points.
+CELL_SIZE = 100
+# Elements that cover more cells than this are kept in a separate list,
+# instead of being added to all cells.
+MAX_CELLS = 64
+# Values that are in points already.
+NUMBERS = (int, float)
+# Bounds of elements that may draw anywhere, such as elements without size.
+UNBOUNDED = (float('-inf'), float('-inf'), float('inf'), float('inf'))
+# Bounds of elements that draw nothing, as start of a union.
+EMPTY_BOUNDS = (float('inf'), float('inf'), float('-inf'), float('-inf'))
+
+def getBounds(e):
+    """Answer the (x1, y1, x2, y2) bounding box of `e` in points, including
+    the stroke that is drawn on the outline. If the width or height
+    is undefined, then answer the (x, y) as a box without size.
+
+    >>> from pagebotnano.elements import Rect
+    >>> from pagebotnano.toolbox.units import mm
+    >>> getBounds(Rect(x=10, y=20, w=mm(10), h=30, strokeWidth=2))
+    (9.0, 19.0, 39.346472, 51.0)
+    """
+    # Most values are numbers already, then upt is not called.
+    x, y, w, h, sw = e.x, e.y, e.w, e.h, e.strokeWidth or 0
+    if not isinstance(x, NUMBERS):
+        x = upt(x)
+    if not isinstance(y, NUMBERS):
+        y = upt(y)
+    if w is None or h is None:
+        return x, y, x, y
+    if not isinstance(w, NUMBERS):
+        w = upt(w)
+    if not isinstance(h, NUMBERS):
+        h = upt(h)
+    if not isinstance(sw, NUMBERS):
+        sw = upt(sw)
+    sw /= 2
+    return min(x, x + w) - sw, min(y, y + h) - sw, max(x, x + w) + sw, max(y, y + h) + sw
+
+class SpatialIndex:
+    """Uniform grid of cells with the bounding boxes (in points) of the
+    child elements of a parent. Elements without width or height are
+    indexed as a point on their (x, y) position and are marked as unsized.
+
+    >>> from pagebotnano.elements import Rect, Text
+    >>> index = SpatialIndex()
+    >>> e1 = Rect(x=10, y=10, w=50, h=50)
+    >>> e2 = Rect(x=500, y=500, w=50, h=50)
+    >>> e3 = Rect(x=40, y=40, w=100, h=100)
+    >>> for e in (e1, e2, e3):
+    ...     index.add(e)
+    >>> sorted(index.query(0, 0, 100, 100)) == sorted([id(e1), id(e3)])
+    True
+    >>> e2.x = e2.y = 20 # Not updated automatically, as e2 is not a child element.
+    >>> index.update(e2)
+    >>> len(index.query(0, 0, 100, 100))
+    3
+    >>> index.remove(e1)
+    >>> len(index.query(0, 0, 100, 100)), len(index)
+    (2, 2)
+    """
+    def __init__(self, cellSize=CELL_SIZE):
+        self.cellSize = cellSize
+        self.cells = {} # (column, row) --> set of eId
+        self.bounds = {} # eId --> (x1, y1, x2, y2) in points
+        self.large = set() # eId of elements that cover more than MAX_CELLS cells.
+        self.unsized = set() # eId of elements without width or height.
+
+    def __repr__(self):
+        return '<%s elements=%d cells=%d>' % (self.__class__.__name__, len(self), len(self.cells))
+
+    def __len__(self):
+        return len(self.bounds)
+
+    def getBounds(self, e):
+        """Answer the (x1, y1, x2, y2) bounding box of `e` in points."""
+        return getBounds(e)
+
+    def _getCells(self, x1, y1, x2, y2):
+        cellSize = self.cellSize
+        c1 = int(x1 // cellSize)
+        c2 = int(x2 // cellSize)
+        r1 = int(y1 // cellSize)
+        r2 = int(y2 // cellSize)
+        return c1, r1, c2, r2
+
+    def add(self, e):
+        eId = id(e)
+        if eId in self.bounds:
+            self.remove(e)
+        bounds = self.bounds[eId] = self.getBounds(e)
+        if e.w is None or e.h is None:
+            self.unsized.add(eId)
+        c1, r1, c2, r2 = self._getCells(*bounds)
+        if (c2 - c1 + 1) * (r2 - r1 + 1) > MAX_CELLS:
+            self.large.add(eId)
+            return
+        for column in range(c1, c2 + 1):
+            for row in range(r1, r2 + 1):
+                cell = self.cells.get((column, row))
+                if cell is None:
+                    self.cells[(column, row)] = cell = set()
+                cell.add(eId)
+
+    def remove(self, e):
+        eId = id(e)
+        bounds = self.bounds.pop(eId, None)
+        if bounds is None:
+            return
+        self.unsized.discard(eId)
+        if eId in self.large:
+            self.large.remove(eId)
+            return
+        c1, r1, c2, r2 = self._getCells(*bounds)
+        for column in range(c1, c2 + 1):
+            for row in range(r1, r2 + 1):
+                cell = self.cells[(column, row)]
+                cell.discard(eId)
+                if not cell:
+                    del self.cells[(column, row)]
+
+    def update(self, e):
+        """Update the position of `e`, after it was moved or resized."""
+        self.remove(e)
+        self.add(e)
+
+    def query(self, x1, y1, x2, y2):
+        """Answer the set of eId for all elements with a bounding box that
+        overlaps with the (x1, y1, x2, y2) box. Touching edges overlap too.
+        """
+        found = set()
+        bounds = self.bounds
+        c1, r1, c2, r2 = self._getCells(x1, y1, x2, y2)
+        candidates = set(self.large)
+        if (c2 - c1 + 1) * (r2 - r1 + 1) > len(self.cells):
+            # Query is larger than the number of filled cells, just run through them.
+            for (column, row), cell in self.cells.items():
+                if c1 <= column <= c2 and r1 <= row <= r2:
+                    candidates.update(cell)
+        else:
+            for column in range(c1, c2 + 1):
+                for row in range(r1, r2 + 1):
+                    cell = self.cells.get((column, row))
+                    if cell is not None:
+                        candidates.update(cell)
+        for eId in candidates:
+            bx1, by1, bx2, by2 = bounds[eId]
+            if bx1 <= x2 and x1 <= bx2 and by1 <= y2 and y1 <= by2:
+                found.add(eId)
+        return found
+
+if __name__ == "__main__":
+    # Running this document will execute all >>> comments as test of this source.
+    import doctest
+    doctest.testmod()[0]
@@ -20,7 +20,6 @@ import sys
 sys.path.insert(0, "../..") # So we can import pagebotnano without installing.
 
 from random import shuffle, choice
-import drawBot
 
 from pagebotnano.elements import Element, Rect, Line, Text
 from pagebotnano.babelstring import BabelString
@@ -54,7 +53,9 @@ class GlyphView(Element):
         # Create a style for it, so we can draw the glyph(s) as Text.
         style = dict(font=self.font, fontSize=self.fontSize, textFill=0, align=CENTER)
         self.bs = BabelString(self.glyphName, style=style)
-        tw, th = self.bs.textSize # Get the size of the glyph(s) string to see if it fits.
+        # Get the size of the glyph(s) string to see if it fits. There is no document 
+        # yet, so the BabelString measures with the default context.
+        tw, th = self.bs.textSize
 
         if self.w and tw > self.w: # If width of self is defined and string is wider
             # Interpolate the fontSize from the measured width to smaller scaled fontSize.
@@ -138,27 +139,27 @@ class Waterfall(Element):
         labelStyle = dict(font=self.font, fontSize=7, textFill=0, lineHeight=8, aligh=LEFT)
         style = dict(font=self.font, fontSize=self.fontSizes[0], textFill=0, align=LEFT)
         bs = BabelString('', style)
-        tw, th = bs.textSize
+        tw, th = doc.context.textSize(bs)
         for fontSize in self.fontSizes:
             labelLine = BabelString(' %d pt' % fontSize, labelStyle)
-            ltw, lth = labelLine.textSize
+            ltw, lth = doc.context.textSize(labelLine)
 
             style['fontSize'] = fontSize
             style['lineHeight'] = fontSize * self.leading
             sample = self.sample
             textLine = BabelString(sample, style)
-            stw, sth = textLine.textSize
+            stw, sth = doc.context.textSize(textLine)
 
             while sample and self.w and stw + ltw > self.w: 
                 # If not fitting, shorten the string until it does
                 sample = sample[:-1]
                 textLine = BabelString(sample, style)
-                stw, sth = textLine.textSize
+                stw, sth = doc.context.textSize(textLine)
             if self.h and th + sth > self.h:
                 break # No vertical space left, skip the rest of the fontSizes. 
             
             bs += BabelString('\n'+sample, style) + labelLine # There still is vertical space, add the textLine
-            tw, th = bs.textSize
+            tw, th = doc.context.textSize(bs)
 
         e = Text(bs, x=ox, y=oy+self.h)
         page.h = page.pb + page.pt + th
@@ -219,11 +220,11 @@ class Stacked(Element):
                 word = word.upper()
             style['fontSize'] = fontSize = 100 # Start with large guess of fontSize
             textLine = BabelString(word, style) 
-            tlw, tlh = textLine.textSize
+            tlw, tlh = doc.context.textSize(textLine)
 
             style['fontSize'] = fontSize = fontSize * self.w / tlw
             textLine = BabelString(word, style) # Get a new scaled version
-            tlw, tlh = textLine.textSize
+            tlw, tlh = doc.context.textSize(textLine)
             if tlh > y: # Not fitting this word vertical anymore, try other.
                 continue
 
@@ -64,6 +64,9 @@ class Book(Publication):
     def compose(self, galley):
         """This is the core of a publication, composing the specific content of the document, 
         from tags found in the gally.
+        The `galley` can also be an iterable of galley elements, such as the generator that
+        Typesetter.iterTypesetFile answers. Then the elements are composed as they arrive,
+        so the pages of a template are made before the rest of the source is parsed.
         The compose method gets called before building and exporting the self.doc document.
         The templates class is supposed to know how to query for tags to be places on various types of pages. 
         Self (the Publications Book) is supposed to know which templates to call for certain page,
@@ -90,7 +93,10 @@ class Book(Publication):
         (140mm, 214mm)
         >>> page = templates.colorMatrix(book.doc)
         >>> book.export('_export/ColorMatrixBook.pdf')
-
+        >>> book = Book(w=w, h=h, templates=templates, theme=theme)
+        >>> book.compose(ts.iterTypesetFile(markdownPath, theme)) # Streaming the galley elements
+        >>> len(book.doc.pages) > 1
+        True
         """
         # For all the elements that are collected in the galley, do process them.
         # If TextBoxes don't fit on the page, keep adding new pages from the
@@ -117,7 +123,7 @@ class Book(Publication):
         # Fill running doc composer data
         cd.galley = galley
 
-        for e in galley.elements:
+        for e in getattr(galley, 'elements', galley): # Galley or iterable of elements.
 
             if isinstance(e, TemplateMarker):
                 # This is the marker for a new template. If there is a running template
@@ -134,7 +140,7 @@ class Book(Publication):
                 # In case there are galley elements, before a template is selected,
                 # then set the default template (to make sure a page is created).
                 if cd.template is None:
-                    cd.template = doc.templates.page # Default template, page() always must be there.
+                    cd.template = 'page' # Default template, page() always must be there.
                 cd.elements.append(e) # To be processed by the current template.
 
         # Handle the last open template, at the end of the galley
@@ -145,7 +151,10 @@ class Book(Publication):
         try:
             cd = doc.cd
             template = cd.template # Name of the template to call
-            getattr(doc.templates, template)(doc)
+            if doc.profiler is None:
+                getattr(doc.templates, template)(doc)
+            else: # Profiling is on, time the template.
+                doc.profiler.template(doc, template)
         except AttributeError:
             print('%s.compose: No template call for "%s"' % (self.__class__.__name__, template.markerType))
 
@@ -266,8 +275,7 @@ class Book(Publication):
                     # as many pages as needed to fill all the text in self.content.
                     # Otherwise break the loop, as we are done placing content.
                     bs = e.getOverflow(bs, doc=self.doc)
-                    # Test on this “incomplete” BabelString, as it only has a cached FS
-                    if not bs.fs:
+                    if not len(bs):
                         break
                     """
 
@@ -50,12 +50,13 @@ class Publication:
         """
         raise NotImplementedError
 
-    def export(self, path, force=False, multiPage=True):
+    def export(self, path, force=False, multiPage=True, workers=None):
         """Export the publication as document, by passing the path
         on to self.document. Force composing and builder if `force`
         is True, even if the `self.doc` as already built and composed.
+        If `workers` is larger than 1, the pages are built in parallel.
         """
-        self.doc.export(path, force=force, multiPage=multiPage)
+        self.doc.export(path, force=force, multiPage=multiPage, workers=workers)
 
 if __name__ == "__main__":
     # Running this document will execute all >>> comments as test of this source.
@@ -205,6 +205,89 @@ class BaseTheme:
             'rightPageNumber': None,
         }
 
+class StyleResolver:
+    """Answers the style of a node from its path of tags, using the selectors
+    of the theme styles. A selector is a tag, or a series of tags for
+    descendants, such as 'h3 b' for <b> inside <h3>. The selectors are
+    compiled once. The most specific selector that matches wins: the one
+    with the most tags, or else the last one in the theme. Paths are interned
+    as integer id (0 is the path of the root parent), with their style.
+    The answered styles are copies with the 'tag' key added, so the theme
+    styles are not changed.
+
+    >>> from pagebotnano.themes import FairyTales
+    >>> theme = FairyTales()
+    >>> resolver = StyleResolver(theme)
+    >>> h3 = resolver.getPath(0, 'h3')
+    >>> b = resolver.getPath(h3, 'b')
+    >>> resolver.getPath(h3, 'b') == b
+    True
+    >>> resolver.getStyle(b) is resolver.getStyle(resolver.getPath(resolver.getPath(h3, 'i'), 'b'))
+    True
+    >>> resolver.getStyle(b)['fontSize'] == theme.styles['h3 b']['fontSize'] != theme.styles['b']['fontSize']
+    True
+    >>> resolver.getStyle(b)['tag'], resolver.getStyle(resolver.getPath(0, 'b'))['tag']
+    ('b', 'b')
+    >>> 'tag' in theme.styles['b'], resolver.getStyle(resolver.getPath(0, 'unknown'))
+    (False, None)
+    """
+    def __init__(self, theme):
+        self.theme = theme
+        self.selectors = {} # Last tag --> list of (specificity, order, ancestor tags, name)
+        for order, name in enumerate(theme.styles):
+            tags = name.split()
+            if tags:
+                self.selectors.setdefault(tags[-1], []).append((len(tags), order, tags[:-1], name))
+        self.styles = {} # Selector name --> copy of the style, with tag
+        self.paths = {} # (parent path, tag) --> path
+        self.pathTags = [()] # Path --> tuple of tags
+        self.pathStyles = [None] # Path --> style
+
+    def __repr__(self):
+        return '<%s theme=%s paths=%d>' % (self.__class__.__name__, self.theme.name, len(self.pathTags))
+
+    def getPath(self, parent, tag):
+        """Answer the path id of `tag` as child of the `parent` path id."""
+        path = self.paths.get((parent, tag))
+        if path is None:
+            tags = self.pathTags[parent] + (tag,)
+            path = self.paths[(parent, tag)] = len(self.pathTags)
+            self.pathTags.append(tags)
+            self.pathStyles.append(self._getStyle(tags))
+        return path
+
+    def getStyle(self, path):
+        """Answer the style of the path id. Answer None if there is no style."""
+        return self.pathStyles[path]
+
+    def _getStyle(self, tags):
+        best = None
+        for selector in self.selectors.get(tags[-1], ()):
+            if (best is None or selector[:2] > best[:2]) and self._matches(selector[2], tags):
+                best = selector
+        if best is None:
+            return None
+        name = best[3]
+        if name not in self.styles:
+            style = self.theme.styles[name]
+            if style is not None and 'tag' not in style:
+                style = dict(style, tag=tags[-1])
+            self.styles[name] = style
+        return self.styles[name]
+
+    def _matches(self, ancestors, tags):
+        """Answer if all tags of `ancestors` are in the parent tags of `tags`,
+        in the same order.
+        """
+        index = len(tags) - 2
+        for tag in reversed(ancestors):
+            while index >= 0 and tags[index] != tag:
+                index -= 1
+            if index < 0:
+                return False
+            index -= 1
+        return True
+
 if __name__ == "__main__":
     # Running this document will execute all >>> comments as test of this source.
     import doctest
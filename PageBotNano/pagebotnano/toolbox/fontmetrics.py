@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+# -----------------------------------------------------------------------------
+#
+#   P A G E B O T  N A N O
+#
+#   Copyright (c) 2020+ Buro Petr van Blokland + Claudia Mens
+#   www.pagebot.io
+#   Licensed under MIT conditions
+#
+#   Supporting DrawBot, www.drawbot.com
+# -----------------------------------------------------------------------------
+#
+#   fontmetrics.py
+#
+#   Metrics of font files, as needed to measure text without DrawBot:
+#   the cmap as sorted array of code points, the advance widths as array
+#   of the same order and the kerning as dictionary of packed pair keys.
+#   The FontMetricsStore parses each font once and saves the arrays in a
+#   binary cache file, that is memory-mapped when loaded. So new processes
+#   and the worker processes of Document.build(workers=N) start with the
+#   metrics ready, instead of parsing the font tables again.
+#
+from array import array
+from bisect import bisect_left
+import json
+import mmap
+import os
+import struct
+import sys
+
+if __name__ == "__main__":
+    sys.path.insert(0, "../..") # So we can import pagebotnano without installing.
+
+from fontTools.ttLib import TTFont
+
+# Folder with the font files of the resources, used by the examples.
+FONT_DIR = os.path.join(os.path.dirname(__file__), '../../resources/fonts')
+
+# Kerning pairs are packed in one integer key: unicode1 << KERN_SHIFT | unicode2
+KERN_SHIFT = 21 # Unicode code points fit in 21 bits.
+
+# Identification and version of the binary cache file.
+MAGIC = b'PBFM'
+VERSION = 1
+
+def packPair(uni1, uni2):
+    """Answer the kerning key of the pair of code points.
+
+    >>> packPair(ord('T'), ord('o')) == (84 << 21) + 111
+    True
+    """
+    return uni1 << KERN_SHIFT | uni2
+
+def getKerning(font):
+    """Answer the {packedPair: kerning} dictionary of the pairs in the kern
+    feature of the GPOS table of the fontTools `font`, or in the old kern
+    table. Class kerning is expanded into pairs. If a pair is in multiple
+    subtables, then the first one is used, as in layout engines.
+
+    >>> path = os.path.join(FONT_DIR, 'typetr/PageBot-Regular.ttf')
+    >>> kerning = getKerning(TTFont(path))
+    >>> len(kerning) > 100, kerning[packPair(ord('T'), ord('o'))] < 0
+    (True, True)
+    """
+    unicodes = {} # glyphName --> list of unicodes
+    for uni, glyphName in font.getBestCmap().items():
+        unicodes.setdefault(glyphName, []).append(uni)
+    kerning = {}
+
+    def addPair(glyphName1, glyphName2, value):
+        if value:
+            for uni1 in unicodes.get(glyphName1, ()):
+                for uni2 in unicodes.get(glyphName2, ()):
+                    kerning.setdefault(uni1 << KERN_SHIFT | uni2, value)
+
+    if 'GPOS' in font:
+        table = font['GPOS'].table
+        lookupIndices = set()
+        for featureRecord in table.FeatureList.FeatureRecord if table.FeatureList else ():
+            if featureRecord.FeatureTag == 'kern':
+                lookupIndices.update(featureRecord.Feature.LookupListIndex)
+        for lookupIndex in sorted(lookupIndices):
+            lookup = table.LookupList.Lookup[lookupIndex]
+            for subTable in lookup.SubTable:
+                if lookup.LookupType == 9: # Extension lookup
+                    subTable = subTable.ExtSubTable
+                if subTable.LookupType != 2: # Not a pair adjustment
+                    continue
+                if subTable.Format == 1: # Pairs of glyphs
+                    for glyphName1, pairSet in zip(subTable.Coverage.glyphs, subTable.PairSet):
+                        for record in pairSet.PairValueRecord:
+                            value = getattr(record.Value1, 'XAdvance', 0) if record.Value1 else 0
+                            addPair(glyphName1, record.SecondGlyph, value)
+                elif subTable.Format == 2: # Pairs of glyph classes
+                    classes1 = subTable.ClassDef1.classDefs
+                    classGlyphs2 = {}
+                    for glyphName2, class2 in subTable.ClassDef2.classDefs.items():
+                        classGlyphs2.setdefault(class2, []).append(glyphName2)
+                    for glyphName1 in subTable.Coverage.glyphs:
+                        class1Record = subTable.Class1Record[classes1.get(glyphName1, 0)]
+                        for class2, glyphNames2 in classGlyphs2.items():
+                            record = class1Record.Class2Record[class2]
+                            value = getattr(record.Value1, 'XAdvance', 0) if record.Value1 else 0
+                            for glyphName2 in glyphNames2:
+                                addPair(glyphName1, glyphName2, value)
+    elif 'kern' in font:
+        for kernTable in font['kern'].kernTables:
+            for (glyphName1, glyphName2), value in getattr(kernTable, 'kernTable', {}).items():
+                addPair(glyphName1, glyphName2, value)
+    return kerning
+
+class FontMetrics:
+    """Holds the metrics of a font, as needed to measure text. The font file
+    at `path` is parsed, unless the arrays are given (as loaded from a cache
+    file by the FontMetricsStore). If `path` is None, then the metrics are
+    generic (every glyph is half an em wide), so the measures are still
+    deterministic if there are no font files.
+
+    >>> path = os.path.join(FONT_DIR, 'typetr/PageBot-Regular.ttf')
+    >>> fm = FontMetrics(path)
+    >>> fm
+    <FontMetrics PageBot-Regular upem=1000>
+    >>> fm.getWidth('Hello', 12) > 0
+    True
+    >>> FontMetrics().getWidth('Hello', 10)
+    25.0
+    >>> fm.getKerning('T', 'o') < 0
+    True
+    >>> fm.getWidth('To', 100) < fm.getWidth('T', 100) + fm.getWidth('o', 100)
+    True
+    >>> fm.codepoints.typecode, fm.advances.typecode
+    ('I', 'H')
+    """
+    def __init__(self, path=None, name=None, unitsPerEm=1000, ascender=800, descender=-200,
+            defaultAdvance=500, codepoints=None, advances=None, kerning=None):
+        self.path = path
+        self.name = name
+        self.unitsPerEm = unitsPerEm
+        self.ascender = ascender
+        self.descender = descender
+        self.defaultAdvance = defaultAdvance
+        if codepoints is None and path is not None:
+            font = TTFont(path, lazy=True)
+            self.name = font['name'].getDebugName(6)
+            self.unitsPerEm = font['head'].unitsPerEm
+            self.ascender = font['hhea'].ascent
+            self.descender = font['hhea'].descent
+            hmtx = font['hmtx'].metrics
+            cmap = font.getBestCmap()
+            codepoints = array('I', sorted(cmap))
+            advances = array('H', [hmtx[cmap[uni]][0] for uni in codepoints])
+            # Characters that are not in the font show as the .notdef glyph.
+            self.defaultAdvance = hmtx[font.getGlyphOrder()[0]][0]
+            kerning = getKerning(font)
+            font.close()
+        self.codepoints = codepoints or array('I') # Sorted unicode code points
+        self.advances = advances or array('H') # Advance widths in font units, in order of codepoints.
+        self.kerning = kerning or {} # packPair(unicode1, unicode2) --> kerning in font units.
+        self.cachedAdvances = {} # Character --> advance width, as found in the arrays.
+
+    def __repr__(self):
+        return '<%s %s upem=%d>' % (self.__class__.__name__, self.name, self.unitsPerEm)
+
+    def getAdvance(self, c):
+        """Answer the advance width of character `c` in font units."""
+        advance = self.cachedAdvances.get(c)
+        if advance is None:
+            uni = ord(c)
+            codepoints = self.codepoints
+            index = bisect_left(codepoints, uni)
+            if index < len(codepoints) and codepoints[index] == uni:
+                advance = self.advances[index]
+            else:
+                advance = self.defaultAdvance
+            self.cachedAdvances[c] = advance
+        return advance
+
+    def getKerning(self, c1, c2):
+        """Answer the kerning between characters `c1` and `c2` in font units."""
+        return self.kerning.get(ord(c1) << KERN_SHIFT | ord(c2), 0)
+
+    def getWidth(self, s, fontSize):
+        """Answer the width of string `s` in points for `fontSize`, including
+        the kerning between the characters.
+        """
+        cachedAdvances = self.cachedAdvances
+        kerning = self.kerning
+        units = 0
+        previous = 0
+        for c in s:
+            advance = cachedAdvances.get(c)
+            if advance is None:
+                advance = self.getAdvance(c)
+            units += advance
+            if kerning:
+                uni = ord(c)
+                units += kerning.get(previous << KERN_SHIFT | uni, 0)
+                previous = uni
+        return units * fontSize / self.unitsPerEm
+
+class FontMetricsStore:
+    """Collection of FontMetrics, with the font path as key. Each font is parsed
+    once. The store can be saved as binary file, with the arrays of all fonts.
+    Loading memory-maps the file, so the arrays are not copied. Fonts that
+    changed after saving are parsed again.
+
+    >>> from pagebotnano.themes import BackToTheCity
+    >>> store = FontMetricsStore()
+    >>> store.addTheme(BackToTheCity())
+    >>> len(store) > 0
+    True
+    >>> os.makedirs('_export', exist_ok=True)
+    >>> store.save('_export/fontmetrics.bin')
+    >>> loaded = FontMetricsStore('_export/fontmetrics.bin')
+    >>> len(loaded) == len(store)
+    True
+    >>> path = os.path.join(FONT_DIR, 'typetr/PageBot-Regular.ttf')
+    >>> fm = loaded.getFontMetrics(path)
+    >>> fm.getWidth('Tomorrow', 12) == FontMetrics(path).getWidth('Tomorrow', 12)
+    True
+    >>> type(fm.advances).__name__
+    'memoryview'
+    """
+    def __init__(self, path=None):
+        self.path = path
+        self.metrics = {} # Absolute font path --> FontMetrics
+        self.fontPaths = {} # Font path as used --> absolute font path
+        self.stats = {} # Font path --> (mtime, size) of the font file, when it was parsed.
+        self._mmap = None
+        if path is not None and os.path.exists(path):
+            self.load(path)
+
+    def __repr__(self):
+        return '<%s fonts=%d>' % (self.__class__.__name__, len(self))
+
+    def __len__(self):
+        return len(self.metrics)
+
+    def __contains__(self, fontPath):
+        return os.path.abspath(fontPath) in self.metrics
+
+    def _getStat(self, fontPath):
+        stat = os.stat(fontPath)
+        return stat.st_mtime, stat.st_size
+
+    def getFontMetrics(self, fontPath):
+        """Answer the FontMetrics of the font file at `fontPath`, parsing it
+        if it is not in the store yet. If `fontPath` is None, then answer
+        the generic metrics.
+        """
+        absPath = self.fontPaths.get(fontPath)
+        if absPath is None and fontPath is not None:
+            self.fontPaths[fontPath] = absPath = os.path.abspath(fontPath)
+        fm = self.metrics.get(absPath)
+        if fm is None:
+            fm = FontMetrics(absPath)
+            self.metrics[absPath] = fm
+            if absPath is not None:
+                self.stats[absPath] = self._getStat(absPath)
+        return fm
+
+    def addFonts(self, fontPaths):
+        """Parse the fonts at `fontPaths` that are not in the store yet."""
+        for fontPath in fontPaths:
+            self.getFontMetrics(fontPath)
+
+    def addTheme(self, theme, context=None):
+        """Add the fonts of `theme` (as answered by BaseTheme.getDefaultFonts,
+        unless the theme has other fonts), with the font names resolved to
+        file paths by `context` (a NullContext by default).
+        """
+        if context is None:
+            # Import here, as the NullContext imports this module.
+            from pagebotnano.contexts.null.context import NullContext
+            context = NullContext()
+        fontPaths = []
+        for fontName in theme.fonts.values():
+            fontPath = context.getFontPath(fontName)
+            if fontPath is not None and fontPath not in fontPaths:
+                fontPaths.append(fontPath)
+        self.addFonts(fontPaths)
+
+    def save(self, path=None):
+        """Save the metrics of all fonts as binary file at `path`. The file
+        starts with a JSON directory of the fonts, followed by the arrays,
+        aligned for memory-mapping.
+        """
+        path = path or self.path
+        assert path is not None, ('%s.save: No path for the cache file' % self.__class__.__name__)
+        fonts = []
+        data = []
+        offset = 0
+        for fontPath, fm in sorted(self.metrics.items(), key=lambda item: item[0] or ''):
+            if fontPath is None:
+                continue
+            keys = sorted(fm.kerning)
+            arrays = {}
+            for arrayName, values in (('codepoints', array('I', fm.codepoints)),
+                    ('advances', array('H', fm.advances)),
+                    ('kernPairs', array('Q', keys)),
+                    ('kernValues', array('h', [fm.kerning[key] for key in keys]))):
+                b = values.tobytes()
+                b += bytes(-len(b) % 8) # Align the next array on 8 bytes.
+                arrays[arrayName] = offset, len(values)
+                data.append(b)
+                offset += len(b)
+            mtime, size = self.stats[fontPath]
+            fonts.append(dict(path=fontPath, mtime=mtime, size=size, name=fm.name,
+                unitsPerEm=fm.unitsPerEm, ascender=fm.ascender, descender=fm.descender,
+                defaultAdvance=fm.defaultAdvance, arrays=arrays))
+        directory = json.dumps(dict(byteorder=sys.byteorder, fonts=fonts)).encode('utf-8')
+        directory += b' ' * (-(len(directory) + 12) % 8)
+        with open(path, 'wb') as f:
+            f.write(MAGIC + struct.pack('<II', VERSION, len(directory)))
+            f.write(directory)
+            for b in data:
+                f.write(b)
+
+    def load(self, path=None):
+        """Load the fonts of the binary cache file at `path` into the store. The
+        arrays are views on the memory-mapped file. Fonts that changed after
+        saving (or from a file with another byte order) are not loaded, they
+        are parsed again when needed.
+        """
+        path = path or self.path
+        with open(path, 'rb') as f:
+            head = f.read(12)
+            if head[:4] != MAGIC or struct.unpack('<I', head[4:8])[0] != VERSION:
+                return
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        directorySize = struct.unpack('<I', head[8:12])[0]
+        directory = json.loads(mm[12:12+directorySize].decode('utf-8'))
+        if directory['byteorder'] != sys.byteorder:
+            return
+        view = memoryview(mm)
+        start = 12 + directorySize
+        for font in directory['fonts']:
+            fontPath = font['path']
+            if fontPath in self.metrics or not os.path.exists(fontPath) or \
+                    self._getStat(fontPath) != (font['mtime'], font['size']):
+                continue
+            arrays = {}
+            for arrayName, typeCode in (('codepoints', 'I'), ('advances', 'H'),
+                    ('kernPairs', 'Q'), ('kernValues', 'h')):
+                offset, count = font['arrays'][arrayName]
+                offset += start
+                arrays[arrayName] = view[offset:offset + count * struct.calcsize(typeCode)].cast(typeCode)
+            self.metrics[fontPath] = FontMetrics(fontPath, name=font['name'],
+                unitsPerEm=font['unitsPerEm'], ascender=font['ascender'],
+                descender=font['descender'], defaultAdvance=font['defaultAdvance'],
+                codepoints=arrays['codepoints'], advances=arrays['advances'],
+                kerning=dict(zip(arrays['kernPairs'], arrays['kernValues'])))
+            self.stats[fontPath] = font['mtime'], font['size']
+        self._mmap = mm # Keep the map open, as long as the arrays are used.
+        self.path = path
+
+# Store that is shared by all contexts of the process.
+FONT_METRICS_STORE = FontMetricsStore()
+
+def getFontMetrics(path):
+    """Answer the FontMetrics of the font at `path` from the shared store."""
+    return FONT_METRICS_STORE.getFontMetrics(path)
+
+if __name__ == "__main__":
+    # Running this document will execute all >>> comments as test of this source.
+    import doctest
+    doctest.testmod()[0]
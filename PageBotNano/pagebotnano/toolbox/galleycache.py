@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+# -----------------------------------------------------------------------------
+#
+#   P A G E B O T  N A N O
+#
+#   Copyright (c) 2020+ Buro Petr van Blokland + Claudia Mens
+#   www.pagebot.io
+#   Licensed under MIT conditions
+#
+#   Supporting DrawBot, www.drawbot.com
+# -----------------------------------------------------------------------------
+#
+#   galleycache.py
+#
+#   On-disk cache of typeset galleys. The key is a hash of the source file,
+#   the theme styles and the Typesetter class and version, so the galley of
+#   an unchanged manuscript is loaded without parsing markdown or XML again.
+#   The elements are saved compactly: the runs of the Flow elements refer
+#   to a table of the unique styles. If the cache is larger than its
+#   maximum size, then the least recently used galleys are removed.
+#
+import hashlib
+import os
+import pickle
+import sys
+
+if __name__ == "__main__":
+    sys.path.insert(0, "../..") # So we can import pagebotnano without installing.
+
+from pagebotnano.babelstring import BabelString
+from pagebotnano.constants import EXPORT_DIR
+from pagebotnano.elements import Flow, Image, Marker, TemplateMarker
+
+# Default folder of the cached galleys.
+GALLEY_CACHE_DIR = EXPORT_DIR + 'galleyCache'
+# Default maximum size of all cached galley files together, in bytes.
+GALLEY_CACHE_SIZE = 100 * 1024 * 1024
+# Extension of the cached galley files.
+GALLEY_EXTENSION = '.galley'
+
+# Identification and version of the galley files.
+MAGIC = b'PBGC'
+VERSION = 2 # 2: The first element is a Flow that continues the galley.
+
+def packElements(elements):
+    """Answer the tuple (styles, items) that describes the galley `elements`,
+    where each item is a tuple of the element class name and its attributes.
+    The runs of a Flow are (s, styleIndex) in the list of unique styles.
+    Other elements than Flow, Image, Marker and TemplateMarker are kept as is.
+
+    >>> bs = BabelString('Head', dict(font='Georgia', tag='h1'))
+    >>> bs.append('Text', dict(font='Georgia', tag='p'))
+    >>> bs.append('More', dict(font='Georgia', tag='h1'))
+    >>> styles, items = packElements([TemplateMarker('chapter'), Flow(bs, id='main')])
+    >>> items
+    [('TemplateMarker', 'chapter'), ('Flow', 'main', [('Head', 0), ('Text', 1), ('More', 0)])]
+    >>> elements = unpackElements(styles, items)
+    >>> elements
+    [<TemplateMarker type=chapter>, <Flow id=main>]
+    >>> elements[1].bs.html == bs.html
+    True
+    """
+    styles = []
+    styleIndices = {} # id(style) --> index in styles
+    items = []
+    for e in elements:
+        if isinstance(e, Flow):
+            runs = []
+            for run in e.bs.runs:
+                style = run.style
+                index = styleIndices.get(id(style))
+                if index is None:
+                    index = styleIndices[id(style)] = len(styles)
+                    styles.append(style)
+                runs.append((run.s, index))
+            items.append(('Flow', e.id, runs))
+        elif isinstance(e, Image):
+            items.append(('Image', e.path))
+        elif isinstance(e, TemplateMarker):
+            items.append(('TemplateMarker', e.markerType))
+        elif isinstance(e, Marker):
+            items.append(('Marker', e.markerType, e.ref, e.id))
+        else:
+            items.append(('Element', e))
+    return styles, items
+
+def unpackElements(styles, items):
+    """Answer the list of elements, made from the `styles` and `items` that
+    packElements answered. Answer None if an image file does not exist anymore.
+    """
+    elements = []
+    for item in items:
+        kind = item[0]
+        if kind == 'Flow':
+            bs = BabelString()
+            for s, index in item[2]:
+                bs.append(s, styles[index])
+            elements.append(Flow(bs, id=item[1]))
+        elif kind == 'Image':
+            if item[1] is not None and not os.path.exists(item[1]):
+                return None
+            elements.append(Image(item[1]))
+        elif kind == 'TemplateMarker':
+            elements.append(TemplateMarker(item[1]))
+        elif kind == 'Marker':
+            elements.append(Marker(item[1], ref=item[2], id=item[3]))
+        else:
+            elements.append(item[1])
+    return elements
+
+class GalleyCache:
+    """Content-addressed cache of the typeset galley elements in a folder.
+    The files of the least recently used galleys are removed, if all files
+    together are larger than `maxSize` bytes.
+
+    >>> from pagebotnano.themes import FairyTales
+    >>> from pagebotnano.toolbox.typesetter import Typesetter
+    >>> cache = GalleyCache('_export/GalleyCache', maxSize=100000)
+    >>> cache.clear()
+    >>> path = '../../MakeItSmall-TheBook.md'
+    >>> g1 = Typesetter().typesetFile(path, FairyTales(), cache=cache)
+    >>> g2 = Typesetter().typesetFile(path, FairyTales(), cache=cache) # Loaded from the cache.
+    >>> cache
+    <GalleyCache galleys=1 hits=1 misses=1>
+    >>> [e.bs.html for e in g1.elements if isinstance(e, Flow)] == [e.bs.html for e in g2.elements if isinstance(e, Flow)]
+    True
+    >>> g3 = Typesetter().typesetFile(path, FairyTales(mood='Dark'), cache=cache) # Other styles, other key.
+    >>> cache.misses, len(cache)
+    (2, 2)
+    >>> cache.maxSize = 1 # Only the most recent galley is kept, even if it is larger.
+    >>> cache.evict()
+    >>> len(cache), cache.evictions
+    (1, 1)
+    """
+    def __init__(self, path=GALLEY_CACHE_DIR, maxSize=GALLEY_CACHE_SIZE):
+        self.path = path
+        self.maxSize = maxSize
+        self.hits = self.misses = self.evictions = 0
+
+    def __repr__(self):
+        return '<%s galleys=%d hits=%d misses=%d>' % (self.__class__.__name__,
+            len(self), self.hits, self.misses)
+
+    def __len__(self):
+        return len(self._getFileNames())
+
+    def _getFileNames(self):
+        if not os.path.isdir(self.path):
+            return []
+        return [fileName for fileName in os.listdir(self.path) if fileName.endswith(GALLEY_EXTENSION)]
+
+    def _getFilePath(self, key):
+        return os.path.join(self.path, key + GALLEY_EXTENSION)
+
+    def getKey(self, path, theme, typesetter):
+        """Answer the key of the galley of the source file `path`, typeset with
+        the styles of `theme` by `typesetter`. Files that the source refers to,
+        such as images, are not part of the key.
+        """
+        h = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(65536), b''):
+                h.update(block)
+        h.update(pickle.dumps(theme.styles, pickle.HIGHEST_PROTOCOL))
+        h.update(('%s-%s' % (typesetter.__class__.__name__, typesetter.VERSION)).encode())
+        return h.hexdigest()
+
+    def get(self, key):
+        """Answer the list of galley elements of `key`, or None if it is not in
+        the cache. The file is touched, so it is recently used. A file that
+        cannot be loaded (e.g. truncated, or pickled by other code) is a miss,
+        and it is removed.
+
+        >>> cache = GalleyCache('_export/GalleyCache-get')
+        >>> cache.clear()
+        >>> cache.set('abc', [])
+        >>> cache.get('abc')
+        []
+        >>> f = open(cache._getFilePath('abc'), 'wb')
+        >>> _ = f.write(MAGIC + VERSION.to_bytes(4, 'little') + b'Not a pickle')
+        >>> f.close()
+        >>> cache.get('abc') is None, len(cache), cache.misses
+        (True, 0, 1)
+        """
+        elements = None
+        filePath = self._getFilePath(key)
+        try:
+            with open(filePath, 'rb') as f:
+                data = f.read()
+        except OSError: # Not in the cache.
+            data = b''
+        if data[:4] == MAGIC and data[4:8] == VERSION.to_bytes(4, 'little'):
+            try:
+                elements = unpackElements(*pickle.loads(data[8:]))
+            except Exception: # Unpickling can raise anything for a bad file.
+                try:
+                    os.remove(filePath)
+                except OSError: # Removed by another process.
+                    pass
+            else:
+                try:
+                    os.utime(filePath)
+                except OSError:
+                    pass
+        if elements is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return elements
+
+    def set(self, key, elements):
+        """Save the list of galley `elements` as `key`. Then remove the least
+        recently used galleys if the cache is too large.
+        """
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+        filePath = self._getFilePath(key)
+        data = pickle.dumps(packElements(elements), pickle.HIGHEST_PROTOCOL)
+        tmpPath = '%s.%d.tmp' % (filePath, os.getpid())
+        with open(tmpPath, 'wb') as f:
+            f.write(MAGIC + VERSION.to_bytes(4, 'little') + data)
+        os.replace(tmpPath, filePath) # Other processes never read a partial file.
+        self.evict()
+
+    def evict(self):
+        """Remove the files of the least recently used galleys, until all files
+        together are not larger than self.maxSize. The most recent one is kept.
+        """
+        files = []
+        for fileName in self._getFileNames():
+            stat = os.stat(os.path.join(self.path, fileName))
+            files.append((stat.st_mtime_ns, stat.st_size, fileName))
+        files.sort()
+        size = sum([fileSize for _, fileSize, _ in files])
+        for _, fileSize, fileName in files[:-1]:
+            if size <= self.maxSize:
+                break
+            os.remove(os.path.join(self.path, fileName))
+            size -= fileSize
+            self.evictions += 1
+
+    def clear(self):
+        """Remove all cached galleys."""
+        for fileName in self._getFileNames():
+            os.remove(os.path.join(self.path, fileName))
+
+if __name__ == "__main__":
+    # Running this document will execute all >>> comments as test of this source.
+    import doctest
+    doctest.testmod()[0]
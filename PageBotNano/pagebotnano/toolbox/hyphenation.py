@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+# -----------------------------------------------------------------------------
+#
+#   P A G E B O T  N A N O
+#
+#   Copyright (c) 2020+ Buro Petr van Blokland + Claudia Mens
+#   www.pagebot.io
+#   Licensed under MIT conditions
+#
+#   Supporting DrawBot, www.drawbot.com
+# -----------------------------------------------------------------------------
+#
+#   hyphenation.py
+#
+#   Hyphenation with the patterns of Frank Liang, as used by TeX. The TeX
+#   pattern file of a language is read once into a trie. The hyphenation
+#   points of words are cached, so repeated words are only a lookup.
+#   The language is defined per run by the `language` style key, so
+#   paragraphs in different languages can be hyphenated in the same text,
+#   independent of DrawBot. It is used by the LineBreaker.
+#
+import os
+import re
+import sys
+
+if __name__ == "__main__":
+    sys.path.insert(0, "../..") # So we can import pagebotnano without installing.
+
+from pagebotnano.constants import EN
+from pagebotnano.contexts.basecontext import MeasureCache
+
+# Folder with the TeX pattern files of the resources.
+HYPHENATION_DIR = os.path.join(os.path.dirname(__file__), '../../resources/hyphenation')
+# Pattern file of each language, in HYPHENATION_DIR.
+PATTERN_FILES = {
+    EN: 'hyph-en.tex',
+}
+# Minimum number of characters before the first and after the last hyphen.
+LEFT_MIN = 2
+RIGHT_MIN = 3
+# Number of words of which the hyphenation points are kept by a Hyphenator.
+WORD_CACHE_SIZE = 10000
+
+# The letters of a word, with the punctuation before and after.
+WORD = re.compile(r'(\W*)([^\W\d_]+)(\W*)$')
+
+def parsePatterns(source):
+    """Answer the tuple (patterns, exceptions) with the lists of the patterns
+    in the \\patterns{...} group and the hyphenated words in the
+    \\hyphenation{...} group of the TeX `source`. Comments are skipped.
+
+    >>> parsePatterns('%% Comment\\n\\\\patterns{.hy3ph he2n}\\n\\\\hyphenation{ta-ble}')
+    (['.hy3ph', 'he2n'], ['ta-ble'])
+    """
+    source = re.sub(r'%.*', '', source)
+    groups = dict(patterns=[], hyphenation=[])
+    for m in re.finditer(r'\\(patterns|hyphenation)\s*\{([^}]*)\}', source):
+        groups[m.group(1)] += m.group(2).split()
+    return groups['patterns'], groups['hyphenation']
+
+class Hyphenator:
+    """Answers the hyphenation points of words, from Liang patterns in a trie.
+    The transitions of all nodes are in one dictionary (node, char) --> node
+    and the values of a node are a tuple of (index, value) of the nonzero
+    values only. Exceptions are words with explicit hyphens, that are used
+    instead of the patterns.
+
+    >>> h = Hyphenator(['.hy3ph', 'he2n', 'hena4', 'hen5at', '1na', 'n2at', '1tio', '2io', 'o2n'])
+    >>> h
+    <Hyphenator patterns=9 nodes=21>
+    >>> h.getPoints('hyphenation')
+    (2, 6)
+    >>> h.getParts('Hyphenation,')
+    ['Hy', 'phen', 'ation,']
+    >>> h.addExceptions(['hyph-e-na-tion'])
+    >>> h.getParts('hyphenation')
+    ['hyph', 'e', 'na', 'tion']
+    >>> h.getPoints('1234'), h.getPoints('tion')
+    ((), ())
+    """
+    def __init__(self, patterns=None, exceptions=None, leftMin=LEFT_MIN, rightMin=RIGHT_MIN,
+            cacheSize=WORD_CACHE_SIZE):
+        self.leftMin = leftMin
+        self.rightMin = rightMin
+        self.transitions = {} # (node, char) --> node
+        self.values = [None] # node --> tuple of (index, value), node 0 is the root.
+        self.patternCount = 0
+        self.exceptions = {} # Lowercase word --> tuple of hyphen indices
+        self.words = MeasureCache(cacheSize) # Word --> tuple of hyphen indices
+        self.addPatterns(patterns or [])
+        self.addExceptions(exceptions or [])
+
+    def __repr__(self):
+        return '<%s patterns=%d nodes=%d>' % (self.__class__.__name__,
+            self.patternCount, len(self.values))
+
+    def addPatterns(self, patterns):
+        """Add the list of TeX `patterns` to the trie, such as 'hen5at'."""
+        transitions = self.transitions
+        values = self.values
+        for pattern in patterns:
+            chars = []
+            points = []
+            for c in pattern:
+                if c.isdigit():
+                    points.append((len(chars), int(c)))
+                else:
+                    chars.append(c)
+            node = 0
+            for c in chars:
+                child = transitions.get((node, c))
+                if child is None:
+                    child = transitions[(node, c)] = len(values)
+                    values.append(None)
+                node = child
+            values[node] = tuple(points)
+            self.patternCount += 1
+        self.words.reset()
+
+    def addExceptions(self, exceptions):
+        """Add the list of words with explicit hyphens, such as 'ta-ble'."""
+        for exception in exceptions:
+            points = []
+            for part in exception.split('-')[:-1]:
+                points.append(len(part) + (points[-1] if points else 0))
+            self.exceptions[exception.replace('-', '').lower()] = tuple(points)
+        self.words.reset()
+
+    def getPoints(self, word):
+        """Answer the tuple of indices in `word` where it can be hyphenated.
+        Punctuation before and after the letters is not hyphenated. Words
+        with other characters than letters are not hyphenated at all.
+        """
+        points = self.words.get(word)
+        if points is None:
+            points = ()
+            m = WORD.match(word)
+            if m is not None:
+                prefix = len(m.group(1))
+                points = tuple([prefix + index for index in self._getPoints(m.group(2).lower())])
+            self.words[word] = points
+        return points
+
+    def _getPoints(self, word):
+        if word in self.exceptions:
+            return self.exceptions[word]
+        if len(word) < self.leftMin + self.rightMin:
+            return ()
+        transitions = self.transitions
+        values = self.values
+        s = '.%s.' % word
+        points = [0] * (len(s) + 1)
+        for start in range(len(s)):
+            node = 0
+            for c in s[start:]:
+                node = transitions.get((node, c))
+                if node is None:
+                    break
+                nodeValues = values[node]
+                if nodeValues:
+                    for index, value in nodeValues:
+                        if value > points[start + index]:
+                            points[start + index] = value
+        # Index 1 in points is before the first letter of word.
+        return tuple([index for index in range(self.leftMin, len(word) - self.rightMin + 1)
+            if points[index + 1] % 2])
+
+    def getParts(self, word):
+        """Answer the list of parts of `word`, split at the hyphenation points."""
+        parts = []
+        start = 0
+        for index in self.getPoints(word) + (len(word),):
+            parts.append(word[start:index])
+            start = index
+        return parts
+
+    def hyphenate(self, s, hyphen='\u00ad'):
+        """Answer the string `s` with `hyphen` (by default the soft hyphen) inserted
+        at the hyphenation points of all words.
+
+        >>> h = getHyphenator(EN)
+        >>> h.hyphenate('Different letters in a table', '-')
+        'Dif-fer-ent let-ters in a ta-ble'
+        >>> h.hyphenate('Typography of a manuscript on the computer', '-')
+        'Ty-pog-ra-phy of a man-u-script on the com-puter'
+        """
+        return re.sub(r'\w+', lambda m: hyphen.join(self.getParts(m.group())), s)
+
+# Language --> Hyphenator, each pattern file is read once.
+HYPHENATORS = {}
+
+def getHyphenator(language=EN):
+    """Answer the Hyphenator of `language`, created from its pattern file in
+    HYPHENATION_DIR (or a path in PATTERN_FILES) the first time. If there are
+    no patterns for the language, then the Hyphenator answers no hyphenation
+    points.
+
+    >>> getHyphenator(EN) is getHyphenator('en')
+    True
+    >>> getHyphenator(EN).getParts('hyphenation')
+    ['hy', 'phen', 'ation']
+    >>> getHyphenator('xx').getParts('hyphenation')
+    ['hyphenation']
+    """
+    hyphenator = HYPHENATORS.get(language)
+    if hyphenator is None:
+        patterns = exceptions = None
+        fileName = PATTERN_FILES.get(language)
+        if fileName is not None:
+            path = os.path.join(HYPHENATION_DIR, fileName)
+            if os.path.exists(path):
+                with open(path, encoding='utf-8') as f:
+                    patterns, exceptions = parsePatterns(f.read())
+        hyphenator = HYPHENATORS[language] = Hyphenator(patterns, exceptions)
+    return hyphenator
+
+if __name__ == "__main__":
+    # Running this document will execute all >>> comments as test of this source.
+    import doctest
+    doctest.testmod()[0]
@@ -0,0 +1,505 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+# -----------------------------------------------------------------------------
+#
+#   P A G E B O T  N A N O
+#
+#   Copyright (c) 2020+ Buro Petr van Blokland + Claudia Mens
+#   www.pagebot.io
+#   Licensed under MIT conditions
+#
+#   Supporting DrawBot, www.drawbot.com
+# -----------------------------------------------------------------------------
+#
+#   linebreaker.py
+#
+#   Pure-Python paragraph composer, after the total-fit line breaking of
+#   Knuth & Plass. The paragraphs of a BabelString are converted once into
+#   boxes (words), glue (white space) and penalties (possible and forced
+#   breaks), measured with the advance widths and kerning that are read from
+#   the font files by fontTools. Breaking the items in a width is arithmetic
+#   only, so fitting text in many widths and heights (TextBox, Book.compose)
+#   is fast and runs on any platform, also without DrawBot. Items and lines
+#   are cached per paragraph, so the overflow of a text box reuses them, and
+#   composing stops at the first paragraph that does not fit.
+#
+import re
+import sys
+
+if __name__ == "__main__":
+    sys.path.insert(0, "../..") # So we can import pagebotnano without installing.
+
+from pagebotnano.constants import EN
+from pagebotnano.toolbox.units import upt # Converts units to points.
+from pagebotnano.toolbox.hyphenation import getHyphenator
+from pagebotnano.contexts.basecontext import MeasureCache
+
+# Item types
+BOX = 'box'
+GLUE = 'glue'
+PENALTY = 'penalty'
+
+# Penalty that never breaks (positive) or always breaks (negative).
+INFINITY = 10000
+# Stretch of the glue that fills the last line of a paragraph.
+FILL = 1000000
+
+# Default parameters, similar to the ones of TeX.
+TOLERANCE = 2 # Maximum adjustment ratio of a line in the first pass.
+LINE_PENALTY = 10
+HYPHEN_PENALTY = 50 # Penalty of breaking after a hyphen.
+FLAGGED_DEMERITS = 3000 # Extra demerits for consecutive hyphenated lines.
+FITNESS_DEMERITS = 3000 # Extra demerits for a tight line next to a loose line.
+# Stretch and shrink of white space, as fraction of its width.
+SPACE_STRETCH = 1/2
+SPACE_SHRINK = 1/3
+
+# Number of paragraph item lists and paragraph line lists that are kept by a LineBreaker.
+ITEMS_CACHE_SIZE = 1000
+LINES_CACHE_SIZE = 1000
+
+# Words, explicit hyphens, white space and hard returns.
+TOKENS = re.compile(r'(?P<newline>\n)|(?P<space>[ \t]+)|(?P<hyphen>[^ \t\n]*?-(?=[^ \t\n-]))|(?P<word>[^ \t\n]+)')
+
+class Item:
+    """Box, glue or penalty of a paragraph. `offset` is the index in the
+    paragraph after the item, where a line starts if it breaks here.
+    `height` is the line height of a box or of the forced break that ends
+    a paragraph.
+
+    >>> Item(BOX, 20, offset=4, height=14)
+    <Item box w=20 offset=4>
+    """
+    __slots__ = ('type', 'width', 'stretch', 'shrink', 'penalty', 'flagged', 'offset', 'height')
+
+    def __init__(self, type, width, stretch=0, shrink=0, penalty=0, flagged=False,
+            offset=0, height=0):
+        self.type = type
+        self.width = width
+        self.stretch = stretch
+        self.shrink = shrink
+        self.penalty = penalty
+        self.flagged = flagged
+        self.offset = offset
+        self.height = height
+
+    def __repr__(self):
+        return '<%s %s w=%s offset=%d>' % (self.__class__.__name__, self.type, self.width, self.offset)
+
+class LineBox:
+    """Line of a composed paragraph. The text of the line is bs[start:end],
+    including the white space or hard return where it breaks. `width` is the
+    natural width of the line, `ratio` is the adjustment ratio that makes
+    the line `w` wide if justified (negative shrinks, positive stretches).
+    `depth` is the distance from the top of the column to the bottom of
+    the line. `overfull` lines are wider than `w`, even if fully shrunk.
+
+    >>> LineBox(0, 10, 98.5, 0.25, 14, 14)
+    <LineBox 0-10 w=98.50 ratio=0.250 depth=14>
+    """
+    __slots__ = ('start', 'end', 'width', 'ratio', 'height', 'depth', 'hyphenated', 'overfull')
+
+    def __init__(self, start, end, width, ratio, height, depth, hyphenated=False, overfull=False):
+        self.start = start
+        self.end = end
+        self.width = width
+        self.ratio = ratio
+        self.height = height
+        self.depth = depth
+        self.hyphenated = hyphenated
+        self.overfull = overfull
+
+    def __repr__(self):
+        return '<%s %d-%d w=%0.2f ratio=%0.3f depth=%s>' % (self.__class__.__name__,
+            self.start, self.end, self.width, self.ratio, self.depth)
+
+class Breakpoint:
+    """Active or chosen breakpoint of the total-fit algorithm."""
+    __slots__ = ('position', 'line', 'fitness', 'totalWidth', 'totalStretch', 'totalShrink',
+        'demerits', 'ratio', 'previous')
+
+    def __init__(self, position, line, fitness, totalWidth, totalStretch, totalShrink,
+            demerits, ratio=0, previous=None):
+        self.position = position
+        self.line = line
+        self.fitness = fitness
+        self.totalWidth = totalWidth
+        self.totalStretch = totalStretch
+        self.totalShrink = totalShrink
+        self.demerits = demerits
+        self.ratio = ratio
+        self.previous = previous
+
+class LineBreaker:
+    """Composes the lines of a BabelString with the total-fit algorithm of
+    Knuth & Plass, choosing the breaks for the whole paragraph, instead of
+    line by line. `getFontMetrics(font)` answers the metrics (advances and
+    kerning) of a font name. By default the font files of a NullContext are
+    used. The items and lines of each paragraph are cached, so composing the
+    same paragraph in another width is only arithmetic, and the overflow of
+    a text box does not measure its paragraphs again.
+
+    >>> from pagebotnano.babelstring import BabelString
+    >>> style = dict(font='PageBot-Regular', fontSize=10, lineHeight=14)
+    >>> bs = BabelString('Hello world '*10, style)
+    >>> lb = LineBreaker()
+    >>> lines = lb.getLines(bs, 100)
+    >>> [(line.start, line.depth) for line in lines]
+    [(0, 14), (24, 28), (48, 42), (72, 56), (96, 70)]
+    >>> all([-1 <= line.ratio <= 2 for line in lines[:-1]])
+    True
+    >>> lines, overflow = lb.compose(bs, 100, 30)
+    >>> len(lines), overflow
+    (2, 48)
+    >>> bs = BabelString('Hello world '*10 + '\\n' + 'Hello world '*10, style)
+    >>> lines, overflow = lb.compose(bs, 100, 100) # The second paragraph is composed until the overflow.
+    >>> [(line.start, line.depth) for line in lines][4:], overflow
+    ([(96, 70), (121, 84), (145, 98)], 169)
+    >>> bs = BabelString('A very-long-word\\nand more', style)
+    >>> s = ''.join([run.s for run in bs.runs])
+    >>> [s[line.start:line.end] for line in lb.getLines(bs, 40)]
+    ['A very-', 'long-', 'word\\n', 'and more']
+    >>> lb.getLines(BabelString('Incomprehensibilities', style), 20)[0].overfull
+    True
+    >>> style = dict(font='PageBot-Regular', fontSize=10, lineHeight=14, hyphenation=True)
+    >>> bs = BabelString('The business of passing different classes', style)
+    >>> s = ''.join([run.s for run in bs.runs])
+    >>> [(s[line.start:line.end], line.hyphenated) for line in lb.getLines(bs, 60)]
+    [('The business ', False), ('of passing dif', True), ('ferent classes', False)]
+    """
+    def __init__(self, getFontMetrics=None, tolerance=TOLERANCE, linePenalty=LINE_PENALTY,
+            hyphenPenalty=HYPHEN_PENALTY, flaggedDemerits=FLAGGED_DEMERITS,
+            fitnessDemerits=FITNESS_DEMERITS):
+        if getFontMetrics is None:
+            # Import here, as the NullContext uses this module.
+            from pagebotnano.contexts.null.context import NullContext
+            getFontMetrics = NullContext().getFontMetrics
+        self.getFontMetrics = getFontMetrics
+        self.tolerance = tolerance
+        self.linePenalty = linePenalty
+        self.hyphenPenalty = hyphenPenalty
+        self.flaggedDemerits = flaggedDemerits
+        self.fitnessDemerits = fitnessDemerits
+        self.items = MeasureCache(ITEMS_CACHE_SIZE) # Paragraph key --> list of Item
+        self.lines = MeasureCache(LINES_CACHE_SIZE) # (paragraph key, w) --> list of LineBox
+
+    def getItems(self, bs):
+        """Answer the list of boxes, glue and penalties of `bs`. Words
+        are measured with kerning between their characters. A word that
+        continues in the next run is a separate box, without glue between.
+        Hard returns and the end of the string are forced breaks. Words in runs
+        with the `hyphenation` style are split into boxes at the hyphenation
+        points of the `language` style, with flagged penalties between.
+
+        >>> from pagebotnano.babelstring import BabelString
+        >>> bs = BabelString('Hello world', dict(font='PageBot-Regular', fontSize=10))
+        >>> [item.type for item in LineBreaker().getItems(bs)]
+        ['box', 'glue', 'box', 'penalty', 'glue', 'penalty']
+        >>> bs = BabelString('Hyphenation', dict(font='PageBot-Regular', fontSize=10, hyphenation=True, language='en'))
+        >>> [(item.type, item.offset) for item in LineBreaker().getItems(bs)][:4]
+        [('box', 2), ('penalty', 2), ('box', 6), ('penalty', 6)]
+        """
+        return self._getItems([(run.s, run.style) for run in bs.runs])
+
+    def _iterParagraphs(self, bs):
+        """Yield the tuples (offset, pieces) of the paragraphs of `bs`, where
+        `offset` is the index of the paragraph in `bs` and `pieces` is the list
+        of (s, style) of its runs, including the hard return that ends it.
+        The paragraphs are found while iterating, so the text after the
+        paragraphs that are used is not split.
+
+        >>> from pagebotnano.babelstring import BabelString
+        >>> bs = BabelString('Hello\\nwor', dict(fontSize=10))
+        >>> bs.append('ld\\n', dict(fontSize=12))
+        >>> [(offset, [s for s, _ in pieces]) for offset, pieces in LineBreaker()._iterParagraphs(bs)]
+        [(0, ['Hello\\n']), (6, ['wor', 'ld\\n'])]
+        """
+        offset = length = 0
+        pieces = []
+        for run in bs.runs:
+            s = run.s
+            start = 0
+            end = s.find('\n')
+            while end != -1:
+                pieces.append((s[start:end+1], run.style))
+                length += end + 1 - start
+                yield offset, pieces
+                offset += length
+                length = 0
+                pieces = []
+                start = end + 1
+                end = s.find('\n', start)
+            if start < len(s):
+                pieces.append((s[start:] if start else s, run.style))
+                length += len(s) - start
+        if pieces or not offset: # Last paragraph without hard return, or empty string.
+            yield offset, pieces
+
+    def _getParagraphItems(self, pieces):
+        """Answer the tuple (key, items) with the key and the cached list
+        of items of the paragraph `pieces`.
+        """
+        key = tuple([(s, style.key) for s, style in pieces])
+        items = self.items.get(key)
+        if items is None:
+            self.items[key] = items = self._getItems(pieces)
+        return key, items
+
+    def _getItems(self, pieces):
+        items = []
+        offset = 0
+        lineHeight = 0
+        for s, style in pieces:
+            fm = self.getFontMetrics(style.get('font'))
+            fontSize = upt(style.get('fontSize', 12))
+            lineHeight = upt(style.get('lineHeight') or fontSize * 1.2)
+            hyphenator = None
+            if style.get('hyphenation'):
+                hyphenator = getHyphenator(style.get('language') or EN)
+                hyphenWidth = fm.getWidth('-', fontSize)
+            for m in TOKENS.finditer(s):
+                kind = m.lastgroup
+                end = offset + m.end()
+                if kind == 'newline':
+                    items += self._getParagraphEnd(offset + m.start(), end, lineHeight)
+                elif kind == 'space':
+                    width = fm.getWidth(m.group(), fontSize)
+                    items.append(Item(GLUE, width, width * SPACE_STRETCH, width * SPACE_SHRINK,
+                        offset=end))
+                else:
+                    word = m.group()
+                    if kind == 'word' and hyphenator is not None:
+                        # Box for each part of the word, with a hyphen penalty between.
+                        start = end - len(word)
+                        index = 0
+                        for point in hyphenator.getPoints(word):
+                            items.append(Item(BOX, fm.getWidth(word[index:point], fontSize),
+                                offset=start + point, height=lineHeight))
+                            items.append(Item(PENALTY, hyphenWidth, penalty=self.hyphenPenalty,
+                                flagged=True, offset=start + point))
+                            index = point
+                        word = word[index:]
+                    items.append(Item(BOX, fm.getWidth(word, fontSize), offset=end,
+                        height=lineHeight))
+                    if kind == 'hyphen':
+                        items.append(Item(PENALTY, 0, penalty=self.hyphenPenalty, flagged=True,
+                            offset=end))
+            offset += len(s)
+        if not items or items[-1].type != PENALTY or items[-1].penalty != -INFINITY:
+            items += self._getParagraphEnd(offset, offset, lineHeight)
+        return items
+
+    def _getParagraphEnd(self, start, end, height=0):
+        """Answer the items that end a paragraph: no break before the glue
+        that fills the last line and a forced break, with the line `height`
+        of an empty line.
+        """
+        return [Item(PENALTY, 0, penalty=INFINITY, offset=start),
+            Item(GLUE, 0, stretch=FILL, offset=start),
+            Item(PENALTY, 0, penalty=-INFINITY, offset=end, height=height)]
+
+    def _getParagraphLines(self, pieces, w):
+        """Answer the cached list of LineBox instances of the paragraph
+        `pieces` in width `w`, with offsets and depths in the paragraph.
+        """
+        key, items = self._getParagraphItems(pieces)
+        lines = self.lines.get((key, w))
+        if lines is None:
+            if w is None: # Only the forced break at the end of the paragraph.
+                breaks = [Breakpoint(len(items) - 1, 1, 1, 0, 0, 0, 0)]
+            else:
+                breaks = self._getBreaks(items, w, self.tolerance)
+                if breaks is None: # No solution without overfull lines, accept all loose lines.
+                    breaks = self._getBreaks(items, w, None)
+            self.lines[(key, w)] = lines = self._getLineBoxes(items, breaks)
+        return lines
+
+    def _iterLines(self, bs, w):
+        """Yield the LineBox instances of `bs` in width `w`, paragraph by paragraph."""
+        if w is not None:
+            w = upt(w)
+        depth = 0
+        for offset, pieces in self._iterParagraphs(bs):
+            lines = self._getParagraphLines(pieces, w)
+            for line in lines:
+                yield LineBox(offset + line.start, offset + line.end, line.width, line.ratio,
+                    line.height, depth + line.depth, line.hyphenated, line.overfull)
+            if lines:
+                depth += lines[-1].depth
+
+    def getLines(self, bs, w=None):
+        """Answer the list of LineBox instances, when `bs` is composed in
+        width `w`. If `w` is None, then only hard returns break the lines.
+        """
+        return list(self._iterLines(bs, w))
+
+    def compose(self, bs, w=None, h=None):
+        """Answer the tuple (lines, overflow) with the list of LineBox instances
+        that fit in height `h` and the offset in `bs` where the overflow
+        starts. The overflow is len(bs) if all text fits. Paragraphs after
+        the overflow are not composed.
+        """
+        if h is None:
+            return self.getLines(bs, w), len(bs)
+        h = upt(h)
+        lines = []
+        for line in self._iterLines(bs, w):
+            if line.depth > h:
+                return lines, line.start
+            lines.append(line)
+        return lines, len(bs)
+
+    def _getBreaks(self, items, w, tolerance):
+        """Answer the list of breakpoints with the least total demerits.
+        Lines with an adjustment ratio above `tolerance` are not accepted,
+        unless `tolerance` is None. If there is no solution without overfull
+        lines, then answer None, if a tolerance is defined. Otherwise the
+        least overfull line is accepted.
+        """
+        linePenalty = self.linePenalty
+        totalWidth = totalStretch = totalShrink = 0
+        active = [Breakpoint(-1, 0, 1, 0, 0, 0, 0)]
+        previousItem = None
+        for position, item in enumerate(items):
+            itemType = item.type
+            if itemType == BOX:
+                totalWidth += item.width
+                previousItem = item
+                continue
+            if itemType == GLUE:
+                isBreak = previousItem is not None and previousItem.type == BOX
+            else:
+                isBreak = item.penalty < INFINITY
+            if isBreak:
+                penalty = item.penalty if itemType == PENALTY else 0
+                forced = penalty <= -INFINITY
+                candidates = {} # fitness --> (demerits, breakpoint, ratio)
+                deactivated = []
+                for breakpoint in list(active):
+                    lineWidth = totalWidth - breakpoint.totalWidth
+                    if itemType == PENALTY:
+                        lineWidth += item.width
+                    if lineWidth < w:
+                        stretch = totalStretch - breakpoint.totalStretch
+                        ratio = (w - lineWidth) / stretch if stretch > 0 else INFINITY
+                    elif lineWidth > w:
+                        shrink = totalShrink - breakpoint.totalShrink
+                        ratio = (w - lineWidth) / shrink if shrink > 0 else -INFINITY
+                    else:
+                        ratio = 0
+                    if ratio < -1 or forced:
+                        active.remove(breakpoint)
+                        deactivated.append((ratio, breakpoint))
+                    if -1 <= ratio and (tolerance is None or ratio <= tolerance):
+                        demerits = (linePenalty + 100 * abs(ratio)**3)**2
+                        if penalty >= 0:
+                            demerits += penalty**2
+                        elif not forced:
+                            demerits -= penalty**2
+                        if item.flagged and breakpoint.position >= 0 and items[breakpoint.position].flagged:
+                            demerits += self.flaggedDemerits
+                        if ratio < -0.5:
+                            fitness = 0
+                        elif ratio <= 0.5:
+                            fitness = 1
+                        elif ratio <= 1:
+                            fitness = 2
+                        else:
+                            fitness = 3
+                        if abs(fitness - breakpoint.fitness) > 1:
+                            demerits += self.fitnessDemerits
+                        demerits += breakpoint.demerits
+                        candidate = candidates.get(fitness)
+                        if candidate is None or demerits < candidate[0]:
+                            candidates[fitness] = demerits, breakpoint, ratio
+                if not active and not candidates and deactivated:
+                    # Nothing fits, break here after the least overfull line.
+                    if tolerance is not None:
+                        return None
+                    ratio, breakpoint = max(deactivated, key=lambda rb: (rb[0], rb[1].position))
+                    candidates[0] = breakpoint.demerits, breakpoint, ratio
+                if candidates:
+                    # Totals after the break, skipping the glue and penalties that start the next line.
+                    afterWidth, afterStretch, afterShrink = totalWidth, totalStretch, totalShrink
+                    nextPosition = position
+                    while nextPosition < len(items):
+                        nextItem = items[nextPosition]
+                        if nextItem.type == BOX:
+                            break
+                        if nextItem.type == GLUE:
+                            afterWidth += nextItem.width
+                            afterStretch += nextItem.stretch
+                            afterShrink += nextItem.shrink
+                        elif nextItem.penalty <= -INFINITY and nextItem is not item:
+                            break
+                        nextPosition += 1
+                    for fitness, (demerits, breakpoint, ratio) in sorted(candidates.items()):
+                        active.append(Breakpoint(position, breakpoint.line + 1, fitness,
+                            afterWidth, afterStretch, afterShrink, demerits, ratio, breakpoint))
+            if itemType == GLUE:
+                totalWidth += item.width
+                totalStretch += item.stretch
+                totalShrink += item.shrink
+            previousItem = item
+        # The last item is a forced break, so all active breakpoints end there.
+        best = min(active, key=lambda breakpoint: breakpoint.demerits)
+        breaks = []
+        while best.previous is not None:
+            breaks.append(best)
+            best = best.previous
+        breaks.reverse()
+        return breaks
+
+    def _getLineBoxes(self, items, breaks):
+        lines = []
+        start = depth = 0
+        position = 0
+        for breakpoint in breaks:
+            end = breakpoint.position
+            item = items[end]
+            # Natural width of the line, without the white space where it breaks.
+            width = height = 0
+            for index in range(position, end):
+                lineItem = items[index]
+                if lineItem.type == BOX:
+                    width += lineItem.width
+                    height = max(height, lineItem.height)
+                elif lineItem.type == GLUE:
+                    width += lineItem.width
+            if item.type == PENALTY:
+                width += item.width
+            # Strip the white space at the end of the line
+            index = end - 1
+            while index >= position and items[index].type == GLUE:
+                width -= items[index].width
+                index -= 1
+            if not height: # Empty line, take the height of the break or the nearest box.
+                height = item.height
+                index = end
+                while not height and index >= 0:
+                    if items[index].type == BOX:
+                        height = items[index].height
+                    index -= 1
+                index = end
+                while not height and index < len(items):
+                    if items[index].type == BOX:
+                        height = items[index].height
+                    index += 1
+            depth += height
+            ratio = breakpoint.ratio
+            if ratio > 0 and (ratio >= INFINITY or item.penalty <= -INFINITY):
+                ratio = 0 # The last line of a paragraph is not stretched.
+            lines.append(LineBox(start, item.offset, width, ratio, height, depth,
+                hyphenated=item.flagged, overfull=ratio < -1))
+            start = item.offset
+            position = end + 1
+            # Skip the glue and penalties at the start of the next line.
+            while position < len(items) and items[position].type != BOX and \
+                    not (items[position].type == PENALTY and items[position].penalty <= -INFINITY):
+                position += 1
+        return lines
+
+if __name__ == "__main__":
+    # Running this document will execute all >>> comments as test of this source.
+    import doctest
+    doctest.testmod()[0]
@@ -16,6 +16,9 @@
 import re
 import codecs
 
+# Minimum number of characters of the markdown blocks that iterMarkdown parses at once.
+BLOCK_SIZE = 65536
+
 def parseMarkdownFile(path):
     """Regular expression based markdown parser.
 
@@ -30,6 +33,50 @@ def parseMarkdownFile(path):
     txt = txt.replace('\r', '\n') # Just to be sure we have the right type of returns.
     return parseMarkdown(txt)
 
+def iterMarkdownFile(path, blockSize=BLOCK_SIZE):
+    """Streaming version of parseMarkdownFile. Answer a generator of xml
+    strings, that together are the xml of the markdown file. The file is
+    read line by line, so only one block of markdown is in memory at a time.
+
+    >>> path = '../../resources/test.md'
+    >>> ''.join(iterMarkdownFile(path)) == parseMarkdownFile(path)
+    True
+    """
+    f = codecs.open(path, mode="r", encoding="utf-8")
+    for xml in iterMarkdown(f, blockSize):
+        yield xml
+    f.close()
+
+def iterMarkdown(lines, blockSize=BLOCK_SIZE):
+    """Answer a generator of xml strings, parsing the markdown `lines` (a list,
+    a file or any other iterable of lines) in blocks of at least `blockSize`
+    characters, that end with an empty line. Blocks don't end inside ~~~ code,
+    so all markdown patterns are inside a block and the result is the same as
+    for parseMarkdown.
+
+    >>> md = '# Head\\nText with[^12] a footnote.\\n\\n~~~\\na = 1\\n\\nb = 2\\n~~~\\n\\n==page==\\n'
+    >>> list(iterMarkdown(md.splitlines(True), blockSize=1))
+    ['<xml>', '<h1>Head</h1>\\n<p>Text with<footnote ref="12"/> a footnote.\\n</p>\\n', '<python>\\na = 1\\n\\nb = 2\\n</python>\\n\\n', '<template type="page"/>', '</xml>']
+    >>> ''.join(iterMarkdown(md.splitlines(True))) == parseMarkdown(md)
+    True
+    """
+    yield '<xml>'
+    block = []
+    size = 0
+    fences = 0 # Number of ~~~ in the block, it is inside code if odd.
+    for line in lines:
+        line = line.replace('\r', '\n')
+        block.append(line)
+        size += len(line)
+        fences += line.count('~~~')
+        if size >= blockSize and not line.strip() and not fences % 2:
+            yield parseMarkdown(''.join(block))[5:-6] # Without the <xml> root.
+            block = []
+            size = fences = 0
+    if block:
+        yield parseMarkdown(''.join(block))[5:-6]
+    yield '</xml>'
+
 def parseMarkdown(txt):
     """
     >>> xml = 'Initial text\\n==cover== Some remark until end of line\\n'
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+# -----------------------------------------------------------------------------
+#
+#   P A G E B O T  N A N O
+#
+#   Copyright (c) 2020+ Buro Petr van Blokland + Claudia Mens
+#   www.pagebot.io
+#   Licensed under MIT conditions
+#
+#   Supporting DrawBot, www.drawbot.com
+# -----------------------------------------------------------------------------
+#
+#   profiler.py
+#
+#   The Profiler measures where the time goes while a Document is composed,
+#   built and exported: in templates, in compose/build of element classes or
+#   in the drawing primitives of the context. It is only created if profiling
+#   of a Document is switched on, otherwise the document.profiler is None.
+#
+import json
+import os
+import sys
+from time import perf_counter
+sys.path.insert(0, "../../") # So we can import pagebotnano without installing.
+
+# Methods of the context that are timed by the Profiler.
+CONTEXT_METHODS = ('newDocument', 'newDrawing', 'newPage', 'saveImage', 'fill',
+    'stroke', 'strokeWidth', 'rect', 'oval', 'line', 'scale', 'image', 'text',
+    'textBox', 'textSize', 'fitText', 'imageSize', 'hyphenation')
+
+# Fields of the profile records that can be used to aggregate on.
+PROFILE_FIELDS = ('phase', 'name', 'template', 'pn')
+
+class Profiler:
+    """The Profiler collects the number of calls and the time of compose and
+    build for every element class, of the templates and of the context methods.
+    The records are keyed by (phase, name, template, pn), where `name` is the
+    element class, template or context method, `template` is the name of the
+    template that created the page (doc.cd.template) and `pn` the page number.
+    Time of nested calls is subtracted, so `self` is the time spent in the call
+    itself and `total` includes the nested calls.
+
+    >>> from pagebotnano.document import Document
+    >>> from pagebotnano.elements import Rect
+    >>> doc = Document(profile=True)
+    >>> page = doc.newPage()
+    >>> e = Rect(x=10, y=10, w=100, h=100, fill=(1, 0, 0), parent=page)
+    >>> doc.export('_export/Profiler.pdf')
+    >>> sorted(doc.profiler.aggregate('name'))
+    ['Page', 'Rect', 'fill', 'newDocument', 'newDrawing', 'newPage', 'rect', 'saveImage', 'stroke']
+    >>> doc.profiler.aggregate('phase')['build']['calls']
+    2
+    >>> os.path.exists('_export/Profiler.pdf.profile.json')
+    True
+    >>> profiler = doc.stopProfiling()
+    >>> profiler.aggregate('phase', 'name')[('build', 'Rect')]['calls'], doc.profiler is None
+    (1, True)
+    """
+    def __init__(self):
+        self.records = {} # (phase, name, template, pn) --> [calls, total, self]
+        self.stack = [] # Running timings [key, startTime, nestedTime]
+        self.pn = None # Page number of the page being composed or built.
+        self.pageTemplates = {} # Page number --> name of the template that created the page.
+        self.contexts = {} # id(context) --> (context, list of wrapped method names)
+
+    def __repr__(self):
+        return '<%s records=%d>' % (self.__class__.__name__, len(self.records))
+
+    def start(self, phase, name):
+        """Start timing the call of `name` in `phase`. Calls of start and
+        stop must be in pairs, nested calls are allowed.
+        """
+        key = phase, name, self.pageTemplates.get(self.pn), self.pn
+        self.stack.append([key, perf_counter(), 0])
+
+    def stop(self):
+        key, t, nestedTime = self.stack.pop()
+        t = perf_counter() - t
+        if self.stack: # Add the time to the nested time of the caller.
+            self.stack[-1][2] += t
+        record = self.records.get(key)
+        if record is None:
+            self.records[key] = record = [0, 0, 0]
+        record[0] += 1
+        record[1] += t
+        record[2] += t - nestedTime
+
+    def startElement(self, phase, e):
+        """Start timing element `e` in `phase`, as its class name. This is
+        used by the traversal of compose and build, which calls self.stop
+        after the child elements are done.
+        """
+        self.setPage(e)
+        self.start(phase, e.__class__.__name__)
+
+    def compose(self, e, doc, parent=None):
+        """Compose element `e`, timed as its class name."""
+        self.startElement('compose', e)
+        try:
+            e.compose(doc, parent=parent)
+        finally:
+            self.stop()
+
+    def build(self, e, x, y, doc, parent=None):
+        """Build element `e`, timed as its class name."""
+        self.startElement('build', e)
+        try:
+            e.build(x=x, y=y, doc=doc, parent=parent)
+        finally:
+            self.stop()
+
+    def template(self, doc, template):
+        """Call the template with name `template` of doc.templates."""
+        self.start('template', template)
+        try:
+            getattr(doc.templates, template)(doc)
+        finally:
+            self.stop()
+
+    def setPage(self, e):
+        """If `e` is a page, then make it the current page, so the records are
+        attributed to its page number."""
+        pn = getattr(e, 'pn', None)
+        if pn is not None:
+            self.pn = pn
+
+    def addPage(self, page, template):
+        """Register the name of the `template` that created `page`."""
+        self.pageTemplates[page.pn] = template
+
+    def wrapContext(self, context):
+        """Replace the methods of `context` by timed versions. The methods are
+        set on the instance, so the context class and other contexts are not
+        altered, and self.unwrapContext restores the original methods.
+
+        >>> from pagebotnano.contexts.null.context import NullContext
+        >>> context = NullContext()
+        >>> profiler = Profiler()
+        >>> profiler.wrapContext(context)
+        >>> context.rect(0, 0, 100, 100)
+        >>> list(profiler.records)
+        [('context', 'rect', None, None)]
+        >>> profiler.unwrapContext(context)
+        >>> 'rect' in context.__dict__
+        False
+        """
+        if id(context) in self.contexts:
+            return
+        names = []
+        for name in CONTEXT_METHODS:
+            method = getattr(context, name, None)
+            if method is not None:
+                setattr(context, name, self._wrap(name, method))
+                names.append(name)
+        self.contexts[id(context)] = context, names
+
+    def unwrapContext(self, context):
+        _, names = self.contexts.pop(id(context), (None, ()))
+        for name in names:
+            delattr(context, name)
+
+    def unwrapAll(self):
+        for context, _ in list(self.contexts.values()):
+            self.unwrapContext(context)
+
+    def _wrap(self, name, method):
+        def timedMethod(*args, **kwargs):
+            self.start('context', name)
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self.stop()
+        return timedMethod
+
+    def aggregate(self, *fields):
+        """Answer the dictionary of {key: dict(calls=, total=, self=)}, where the
+        records are grouped on `fields`. If there is one field, then the key is
+        its value, otherwise the key is the tuple of field values.
+
+        >>> profiler = Profiler()
+        >>> profiler.records = {('build', 'Rect', None, 1): [2, 0.5, 0.25], ('build', 'Rect', None, 2): [1, 0.5, 0.5]}
+        >>> profiler.aggregate('name')
+        {'Rect': {'calls': 3, 'total': 1.0, 'self': 0.75}}
+        >>> sorted(profiler.aggregate('phase', 'pn'))
+        [('build', 1), ('build', 2)]
+        """
+        indices = [PROFILE_FIELDS.index(field) for field in fields]
+        result = {}
+        for key, (calls, total, self_) in self.records.items():
+            if len(indices) == 1:
+                groupKey = key[indices[0]]
+            else:
+                groupKey = tuple([key[index] for index in indices])
+            group = result.get(groupKey)
+            if group is None:
+                result[groupKey] = group = dict(calls=0, total=0, self=0)
+            group['calls'] += calls
+            group['total'] += total
+            group['self'] += self_
+        return result
+
+    def report(self, fields=None):
+        """Answer the profile as table string, for each of the `fields` (default
+        is by phase and name, by template and by page number), sorted by
+        self time, the most expensive first.
+        """
+        if fields is None:
+            fields = (('phase', 'name'), ('template',), ('pn',))
+        lines = []
+        for groupFields in fields:
+            lines.append('%-32s %8s %12s %12s' % ('/'.join(groupFields), 'Calls', 'Total ms', 'Self ms'))
+            groups = self.aggregate(*groupFields)
+            for key, group in sorted(groups.items(), key=lambda item: -item[1]['self']):
+                if isinstance(key, tuple):
+                    key = '/'.join([str(k) for k in key])
+                lines.append('%-32s %8d %12.3f %12.3f' % (str(key)[:32], group['calls'],
+                    group['total']*1000, group['self']*1000))
+            lines.append('')
+        return '\n'.join(lines)
+
+    def asDict(self):
+        records = []
+        for key, (calls, total, self_) in sorted(self.records.items(), key=str):
+            record = dict(zip(PROFILE_FIELDS, key))
+            record.update(dict(calls=calls, total=total, self=self_))
+            records.append(record)
+        return dict(records=records,
+            byName=self.aggregate('name'),
+            byTemplate={str(key): value for key, value in self.aggregate('template').items()},
+            byPage={str(key): value for key, value in self.aggregate('pn').items()})
+
+    def save(self, path):
+        """Save the profile as JSON file at `path` and the table report next
+        to it, with .txt extension.
+        """
+        with open(path, 'w') as f:
+            json.dump(self.asDict(), f, indent=4)
+        with open(path.rsplit('.', 1)[0] + '.txt', 'w') as f:
+            f.write(self.report())
+
+if __name__ == "__main__":
+    # Running this document will execute all >>> comments as test of this source.
+    import doctest
+    doctest.testmod()[0]
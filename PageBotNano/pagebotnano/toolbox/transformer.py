@@ -26,7 +26,6 @@ import subprocess
 
 import sys
 sys.path.insert(0, "../../") # So we can import pagebotnano without installing.
-import drawBot
 
 WHITESPACE = ' \t\r\n'
 ROMAN_NUMERAL_VALUES = {'M': 1000, 'D': 500, 'C': 100, 'L': 50, 'X': 10, 'V': 5, 'I': 1}
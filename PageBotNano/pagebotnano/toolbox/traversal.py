@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+# -----------------------------------------------------------------------------
+#
+#   P A G E B O T  N A N O
+#
+#   Copyright (c) 2020+ Buro Petr van Blokland + Claudia Mens
+#   www.pagebot.io
+#   Licensed under MIT conditions
+#
+#   Supporting DrawBot, www.drawbot.com
+# -----------------------------------------------------------------------------
+#
+#   traversal.py
+#
+#   Depth-first traversal of trees (elements, etree nodes) with an explicit
+#   stack instead of recursion. Deeply nested trees don't hit the recursion
+#   limit and there is no Python call overhead of compose/build methods at
+#   every level. It is used by Element.compose, Element.build and by
+#   Typesetter.typesetNode.
+#
+import sys
+
+if __name__ == "__main__":
+    sys.path.insert(0, "../..") # So we can import pagebotnano without installing.
+
+# Answered by the enter function, if the children of a node should not be
+# traversed. Then the leave function is not called for that node either.
+SKIP = object()
+
+def traverse(root, enter, leave=None, children=iter, state=None):
+    """Traverse the tree of `root` depth-first. enter(node, state) is called
+    before the children of node, with the state that entering the parent node
+    answered (`state` for the root). It answers the state for the children of
+    node, or SKIP if the children should not be traversed. leave(node, state)
+    is called after all children of node, with the state that enter answered.
+    children(node) answers the iterator of child nodes. The children are
+    iterated while traversing, so children that are added to a list by enter
+    or leave of a preceding sibling are traversed too.
+
+    >>> tree = ('a', [('b', [('c', [])]), ('d', [])])
+    >>> order = []
+    >>> def enter(node, depth):
+    ...     order.append('%s%d' % (node[0], depth))
+    ...     return depth + 1
+    >>> def leave(node, depth):
+    ...     order.append('/' + node[0])
+    >>> traverse(tree, enter, leave, children=lambda node: iter(node[1]), state=0)
+    >>> order
+    ['a0', 'b1', 'c2', '/c', '/b', 'd1', '/d', '/a']
+    >>> deep = []
+    >>> node = deep
+    >>> for _ in range(sys.getrecursionlimit() * 2): # Too deep for recursion
+    ...     child = []
+    ...     node.append(child)
+    ...     node = child
+    >>> count = []
+    >>> traverse(deep, lambda node, state: count.append(node))
+    >>> len(count) == sys.getrecursionlimit() * 2 + 1
+    True
+    """
+    rootState = enter(root, state)
+    if rootState is SKIP:
+        return
+    stack = [(root, rootState, children(root))]
+    while stack:
+        node, nodeState, nodes = stack[-1]
+        for child in nodes:
+            childState = enter(child, nodeState)
+            if childState is not SKIP: # Go down to the children of child.
+                stack.append((child, childState, children(child)))
+                break
+        else: # All children are done.
+            stack.pop()
+            if leave is not None:
+                leave(node, nodeState)
+
+if __name__ == "__main__":
+    # Running this document will execute all >>> comments as test of this source.
+    import doctest
+    doctest.testmod()[0]
@@ -19,7 +19,11 @@
 #   kinds, each with their specific content, width and height. 
 #   Compare this best with the role of typeset columns that came
 #   from the typesetter office, to be composed on pages.
+#   In streaming mode the galley elements are answered one by one, while
+#   the source is parsed, so large manuscripts are typeset in bounded memory.
 #
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain
 import os
 from xml.etree import ElementTree as ET
 import sys
@@ -28,11 +32,67 @@ if __name__ == "__main__":
     sys.path.insert(0, "../..") # So we can import pagebotnano without installing.
 
 from pagebotnano.babelstring import BabelString
-from pagebotnano.toolbox.markdown import parseMarkdownFile, parseMarkdown
+from pagebotnano.toolbox.markdown import parseMarkdownFile, parseMarkdown, iterMarkdownFile
 from pagebotnano.elements import Element, Image, Marker, TemplateMarker, Flow
 from pagebotnano.toolbox.transformer import path2Extension, path2FileName
+from pagebotnano.toolbox.traversal import traverse
+from pagebotnano.toolbox.galleycache import packElements, unpackElements
 from pagebotnano.constants import DEFAULT_WIDTH
-from pagebotnano.themes import DefaultTheme
+from pagebotnano.themes import DefaultTheme, StyleResolver
+
+# Typesetter class --> {tag: (node_<tag> function, _node_<tag> function)}
+NODE_METHODS = {}
+# Methods of tags that the typesetter does not support.
+NO_NODE_METHODS = (None, None)
+# Theme that is used if no theme is supplied, made on first use.
+DEFAULT_THEME = None
+
+def getNodeMethods(cls):
+    """Answer the dispatch table of Typesetter class `cls`, with the tuple of
+    functions (node_<tag>, _node_<tag>) for every supported tag. It is compiled
+    once per class, so the typesetter does not look up the methods by name
+    for every node. A function is None if the class does not implement it.
+
+    >>> methods = getNodeMethods(Typesetter)
+    >>> methods['p'] == (Typesetter.node_p, Typesetter._node_p)
+    True
+    >>> getNodeMethods(Typesetter) is methods
+    True
+    """
+    methods = NODE_METHODS.get(cls)
+    if methods is None:
+        methods = NODE_METHODS[cls] = {}
+        for name in dir(cls):
+            if name.startswith('node_') or name.startswith('_node_'):
+                tag = name.split('node_', 1)[1]
+                if tag not in methods:
+                    methods[tag] = (getattr(cls, 'node_' + tag, None), getattr(cls, '_node_' + tag, None))
+    return methods
+
+# Typesetter class, theme and galley cache of a worker process of
+# Typesetter.typesetFiles(paths, workers=N), set once by _initWorker.
+_workerArgs = None
+
+def _initWorker(typesetterClass, theme, cache):
+    """Initialize the worker process of Typesetter.typesetFiles(workers=N)."""
+    global _workerArgs
+    _workerArgs = typesetterClass, theme, cache
+
+def _typesetPart(path):
+    """Typeset the file `path` in the worker process. Answer the verbose
+    messages and the packed galley fragment, to be merged in the main process.
+    """
+    typesetterClass, theme, cache = _workerArgs
+    ts = typesetterClass()
+    fragment = ts.getFragment(path, theme, cache)
+    return ts.verbose, packElements(fragment)
+
+def getDefaultTheme():
+    """Answer the DefaultTheme instance that is shared by all typesetters."""
+    global DEFAULT_THEME
+    if DEFAULT_THEME is None:
+        DEFAULT_THEME = DefaultTheme()
+    return DEFAULT_THEME
 
 class Galley(Element):
     pass
@@ -45,7 +105,12 @@ class Typesetter:
     >>> ts.galley # By default a galley has no with or height.
     <Galley name=Galley w=None h=None>
     """
+    # Version of the typesetting, part of the key of cached galleys.
+    # Increment it when a change makes galleys different from previous versions.
+    VERSION = 1
+
     def __init__(self, galley=None):
+        self.nodeMethods = getNodeMethods(self.__class__)
         self.reset(galley)
 
     def reset(self, galley=None):
@@ -56,11 +121,17 @@ class Typesetter:
 
         self.verbose = [] # Storage for errors/warnings during processing.
 
-    def typesetFile(self, path, theme=None):
+    def typesetFile(self, path, theme=None, cache=None):
         """Typeset the content of the file: .md, .txt or any kind of 
         image). Depending on the kind of file, different actions are taken.
+        If a GalleyCache is supplied as `cache` and it has the galley of the
+        same file, theme styles and typesetter version, then its elements are
+        loaded, without parsing the file. See toolbox/galleycache.py.
         """
-        assert path is not None or xml is not None
+        assert path is not None
+        if cache is not None:
+            self.mergeFragment(self.getFragment(path, theme, cache))
+            return self.galley
         extension = path2Extension(path)
         if extension in ('jpg', 'png', 'gif'):
             # This is an image, create the html tag link code for it.
@@ -70,13 +141,101 @@ class Typesetter:
             xml = '<xml><a href="%s">%s</a></xml>' % (path, path2FileName(path))
         elif extension in ('svg', 'html', 'xml'):
             # This is an XML-tagged document. We can directly parse it
-            root = ET.fromFile(path)
-            self.typesetNode(root, self.galley, styles)
+            with open(path, encoding='utf-8') as f:
+                xml = f.read()
         elif extension in ('md', 'txt'):
             xml = parseMarkdownFile(path)
         # Answer the galley for convenience of the caller
         return self.typeset(xml, theme) 
 
+    def typesetFiles(self, paths, theme=None, workers=None, cache=None):
+        """Typeset the files in the list of `paths` in the galley, in the order
+        of the paths. If `workers` is larger than 1, then the files are typeset
+        in parallel by a pool of worker processes. Each worker answers the
+        packed fragment of its file, and the fragments are merged into
+        the galley in source order, with the same result as typesetting the
+        files one after another. The optional GalleyCache `cache` is used
+        by the workers too.
+
+        >>> from pagebotnano.themes import FairyTales
+        >>> paths = ['../../resources/test.md', '../../MakeItSmall-TheBook.md', '../../resources/TypeSpecimen.md', '../../Test.md']
+        >>> g1 = Typesetter().typesetFiles(paths, FairyTales())
+        >>> g2 = Typesetter().typesetFiles(paths, FairyTales(), workers=2)
+        >>> len(g2.elements) == len(g1.elements) > len(paths)
+        True
+        >>> [repr(e) for e in g1.elements] == [repr(e) for e in g2.elements]
+        True
+        >>> [e.bs.html for e in g1.elements if isinstance(e, Flow)] == [e.bs.html for e in g2.elements if isinstance(e, Flow)]
+        True
+        """
+        if workers is None or workers <= 1 or len(paths) <= 1:
+            for path in paths:
+                self.typesetFile(path, theme, cache=cache)
+            return self.galley
+        if theme is None:
+            theme = getDefaultTheme()
+        workers = min(workers, len(paths))
+        initArgs = (self.__class__, theme, cache)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_initWorker, initargs=initArgs) as pool:
+            # pool.map answers the fragments in order of the paths.
+            for verbose, (styles, items) in pool.map(_typesetPart, paths):
+                self.verbose += verbose
+                self.mergeFragment(unpackElements(styles, items))
+        return self.galley
+
+    def getFragment(self, path, theme=None, cache=None):
+        """Answer the list of elements of the file `path`, typeset in a separate
+        galley, to be merged by self.mergeFragment. The first element is a Flow
+        with the text before the first new flow in the file, that continues
+        the last Flow of the galley, as with self.typesetFile. If there is
+        a GalleyCache `cache`, then the fragment is loaded or saved there.
+
+        >>> from pagebotnano.themes import FairyTales
+        >>> ts = Typesetter()
+        >>> g = ts.typeset('<xml><p>First</p></xml>', FairyTales())
+        >>> fragment = ts.getFragment('../../resources/TypeSpecimen.md', FairyTales())
+        >>> fragment, ts.galley.elements
+        ([<Flow id=0>], [<Flow id=0>])
+        >>> ts.mergeFragment(fragment)
+        >>> ts.galley.elements, ts.galley.elements[0].bs.runs[2].s # Continued in the existing Flow
+        ([<Flow id=0>], 'Publishing variables with PageBot\\n\\n')
+        """
+        if cache is not None:
+            if theme is None:
+                theme = getDefaultTheme()
+            key = cache.getKey(path, theme, self)
+            fragment = cache.get(key)
+            if fragment is not None:
+                return fragment
+        galley = self.galley
+        self.galley = Galley()
+        self.galley.addElement(Flow()) # Text before the first new flow continues the galley.
+        try:
+            self.typesetFile(path, theme)
+            fragment = self.galley.elements
+        finally:
+            self.galley = galley
+        if cache is not None:
+            cache.set(key, fragment)
+        return fragment
+
+    def mergeFragment(self, fragment):
+        """Add the elements of `fragment` (as answered by self.getFragment) to
+        the galley. The runs of the first Flow are appended to the last Flow of
+        the galley, if there is one. Otherwise it is added, if not empty.
+        """
+        first = fragment[0]
+        if len(first.bs):
+            last = self.galley.elements[-1] if self.galley.elements else None
+            if isinstance(last, Flow):
+                for run in first.bs.runs:
+                    if run.s: # Skip the empty run of the new Flow, so equal styles are joined.
+                        last.bs.append(run.s, run.style)
+            else:
+                self.galley.addElement(first)
+        for e in fragment[1:]:
+            self.galley.addElement(e)
+
     def typesetMarkdown(self, md, theme):
         xml = parseMarkdown(md)
         # Answer the galley for convenience of the caller
@@ -119,38 +278,169 @@ class Typesetter:
         self.typesetNode(root, self.galley, theme)
         return self.galley # Answer the galley for convenience of the caller
 
-    def typesetNode(self, node, e, theme=None):
-        """Recursively typeset the etree `node`, using a reference to element `e`.
+    def iterTypesetFile(self, path, theme=None):
+        """Streaming version of typesetFile. Answer a generator of the galley
+        elements, while the file is parsed. Markdown is converted block by
+        block and XML files are parsed by ET.iterparse, so the whole source
+        is never in memory. See iterTypeset.
+
+        >>> from pagebotnano.themes import FairyTales
+        >>> path = '../../MakeItSmall-TheBook.md'
+        >>> elements = list(Typesetter().iterTypesetFile(path, FairyTales()))
+        >>> g = Typesetter().typesetFile(path, FairyTales())
+        >>> [e.__class__.__name__ for e in elements] == [e.__class__.__name__ for e in g.elements]
+        True
+        >>> [e.bs.html for e in elements if hasattr(e, 'bs')] == [e.bs.html for e in g.elements if hasattr(e, 'bs')]
+        True
+        """
+        extension = path2Extension(path)
+        if extension in ('svg', 'html', 'xml'):
+            events = ET.iterparse(path, events=('start', 'end'))
+        elif extension in ('md', 'txt'):
+            events = self._iterEvents(iterMarkdownFile(path))
+        elif extension == 'pdf':
+            events = self._iterEvents(['<xml><a href="%s">%s</a></xml>' % (path, path2FileName(path))])
+        else: # Image file
+            events = self._iterEvents(['<xml><img src="%s"/></xml>' % path])
+        return self._iterTypesetEvents(events, theme)
+
+    def iterTypeset(self, xml, theme=None):
+        """Streaming version of typeset. `xml` is a string or an iterable of
+        strings that together are the xml, such as answered by iterMarkdownFile.
+        Answer a generator of the galley elements (Flow, Image, Marker and
+        TemplateMarker). An element is answered as soon as the next one is
+        made, as then it is complete. The answered elements are removed from
+        the galley and the parsed nodes are cleared, so only the current element
+        and the open nodes are kept in memory.
+
+        >>> from pagebotnano.themes import FairyTales
+        >>> xml = ['<xml><template type="chapter"/><h1>Head</h1>', '<p>Text with<footnote ref="1"/>', ' a footnote.</p><flow id="side"/><p>Side</p></xml>']
+        >>> ts = Typesetter()
+        >>> elements = ts.iterTypeset(xml, FairyTales())
+        >>> next(elements), next(elements)
+        (<TemplateMarker type=chapter>, <Flow id=0>)
+        >>> list(elements), ts.galley.elements
+        ([<Marker type=footnote ref=1>, <Flow id=0>, <Flow id=side>], [])
+        >>> ts = Typesetter()
+        >>> [e.bs.html for e in ts.iterTypeset(xml, FairyTales()) if hasattr(e, 'bs')]
+        ['<h1>Head</h1><p>Text with</p>', '<span>a footnote.</span>', '<p>Side</p>']
+        """
+        if isinstance(xml, str):
+            xml = [xml]
+        return self._iterTypesetEvents(self._iterEvents(xml), theme)
+
+    def _iterEvents(self, chunks):
+        """Answer the generator of (event, node) start and end events, parsing
+        the xml strings in `chunks`, as ET.iterparse does for files.
+        """
+        parser = ET.XMLPullParser(events=('start', 'end'))
+        for chunk in chunks:
+            parser.feed(chunk)
+            for event in parser.read_events():
+                yield event
+        parser.close()
+        for event in parser.read_events():
+            yield event
+
+    def _iterTypesetEvents(self, events, theme=None):
+        resolver = self.getStyleResolver(theme)
+        galley = self.galley
+        nodes = [] # Open nodes, their child nodes are removed when done.
+        paths = [0] # Path ids of the open nodes, for their styles.
+        # The text of a node is parsed before the next event, the tail of a node
+        # before the event after its end. So each event is handled one event later.
+        pending = None
+        for event in chain(events, [None]):
+            if pending is not None:
+                pendingEvent, node = pending
+                if pendingEvent == 'start':
+                    path = resolver.getPath(paths[-1], node.tag)
+                    paths.append(path)
+                    self._enterNode(node, galley, resolver.getStyle(path))
+                else:
+                    self._leaveNode(node, galley, resolver.getStyle(paths.pop()))
+                    node.clear()
+                    if nodes:
+                        nodes[-1].remove(node)
+                # All elements before the last one are complete.
+                while len(galley.elements) > 1:
+                    yield galley.removeElement(galley.elements[0])
+            if event is not None:
+                if event[0] == 'start':
+                    nodes.append(event[1])
+                else:
+                    nodes.pop()
+            pending = event
+        while galley.elements:
+            yield galley.removeElement(galley.elements[0])
+
+    def getStyleResolver(self, theme=None):
+        """Answer a new StyleResolver for `theme`, resolving the styles of
+        the node paths while typesetting. If `theme` is None, then the shared
+        default theme is used.
+
+        >>> Typesetter().getStyleResolver()
+        <StyleResolver theme=Happy Holidays paths=1>
         """
         if theme is None:
-            theme = DefaultTheme()
-        # If not dictionary of node-tag styles supplied, then create an empty one.
-        style = theme.getStyle(node.tag) # Search the style for this node. Can be None.
-        if style is not None and 'tag' not in style:
-            style['tag'] = node.tag
+            theme = getDefaultTheme()
+        return StyleResolver(theme)
 
-        nodeSupport = 'node_'+node.tag
+    def typesetNode(self, node, e, theme=None):
+        """Typeset the etree `node` and its child nodes, using a reference to 
+        element `e`. The tree is traversed with an explicit stack, so deeply
+        nested xml does not hit the recursion limit. The style of each node
+        is resolved from its path of tags, so the theme can have styles for
+        descendant selectors, such as 'h3 b'.
+
+        >>> from pagebotnano.themes import FairyTales
+        >>> xml = '<xml>' + '<i>a' * 2000 + '</i>' * 2000 + '</xml>'
+        >>> ts = Typesetter()
+        >>> g = ts.typeset(xml, FairyTales())
+        >>> len(g.elements[0].bs)
+        2000
+        >>> theme = FairyTales()
+        >>> g = Typesetter().typeset('<xml><h3>Head <b>bold</b></h3><p>Not <b>bold</b></p></xml>', theme)
+        >>> [run.style['fontSize'] for run in g.elements[0].bs.runs if run.style.get('tag') == 'b']
+        [24pt, 12pt]
+        >>> 'tag' in theme.styles['b'] # The theme styles are not changed.
+        False
+        """
+        resolver = self.getStyleResolver(theme)
+
+        def enter(node, parent):
+            path = resolver.getPath(parent, node.tag)
+            self._enterNode(node, e, resolver.getStyle(path))
+            return path # Keep the path for closing the tag.
+
+        def leave(node, path):
+            self._leaveNode(node, e, resolver.getStyle(path))
+
+        traverse(node, enter, leave, state=0)
+
+    def _enterNode(self, node, e, style):
+        """Typeset the opening of `node` with its resolved `style`."""
         # Is this tag supported by the typesetter? If it does, then e.g. for a 
         # tag name of "img", the typesetter needs to implement self.node_img for
         # the opening and self._node_img for the closing of the tag processing.
-        if hasattr(self, nodeSupport): 
+        nodeEnter = self.nodeMethods.get(node.tag, NO_NODE_METHODS)[0]
+        if nodeEnter is not None:
             if style is None: # No style available for this tag, mark as warning.
                 self.verbose.append('Node "%s" has no supporting style' % node.tag)
-            # Get the self.node_<node.tag> method and call it with the node,
+            # Call the node_<node.tag> method with the node,
             # the `e` (likely to be the galley) and the tag style if it existed.
-            getattr(self, nodeSupport)(node, e, style)
+            nodeEnter(self, node, e, style)
         else: # The typesetter does not support this kind of tag.
             self.verbose.append('Node "%s" not supported' % node.tag)
 
-        # Typeset all childs node in the current node, by recursive call.
-        for child in node:
-            self.typesetNode(child, e, theme)
-
-        if hasattr(self, '_'+nodeSupport): # Is this tag supported?
-            # Get the typesetter method that knows how to handle the closing
-            # of this tag and call it with the node, the `e` (likely to be the galley)
+    def _leaveNode(self, node, e, style):
+        """Typeset the closing of `node`, after all its child nodes."""
+        nodeLeave = self.nodeMethods.get(node.tag, NO_NODE_METHODS)[1]
+        if nodeLeave is not None: # Is this tag supported?
+            # Call the _node_<node.tag> method that knows how to handle the closing
+            # of this tag with the node, the `e` (likely to be the galley)
             # and the style if it existed.
-            getattr(self, '_'+nodeSupport)(node, e, style)
+            nodeLeave(self, node, e, style)
 
     def newFlow(self, e=None):
         """Create a new flow in the galley and answer it)
@@ -39,7 +39,6 @@
 import sys
 sys.path.insert(0, "../../") # So we can import pagebotnano without installing.
 from copy import copy
-import drawBot
 
 import re
 import math
@@ -434,6 +433,7 @@ class Unit:
         >>> pt(2000) - px(20)
         1980pt
     """
+    __slots__ = ('v', 'base', 'g') # No __dict__, as there can be many unit instances.
     BASE = None # Default "base reference for relative units. Unused None for absolute units."
 
     isAbsolute = True
@@ -1050,6 +1050,7 @@ class Mm(Unit):
     >>> mm(pt(5), p(6), '3"') # Arguments can be a list of other units types.
     (1.76mm, 25.4mm, 76.2mm)
     """
+    __slots__ = ()
     PT_FACTOR = MM # mm <---> points
     UNIT = 'mm'
 
@@ -1118,6 +1119,7 @@ class Cm(Unit):
     >>> cm(pt(50), p(6), '3"') # Arguments can be a list of other units types.
     (1.76cm, 2.54cm, 7.62cm)
     """
+    __slots__ = ()
     PT_FACTOR = MM*10 # mm <---> points
     UNIT = 'cm'
 
@@ -1205,6 +1207,7 @@ class Pt(Unit):
     >>> pt(10, 12, 13, (20, 21)) # Nested lists, created nested list of pt
     (10pt, 12pt, 13pt, (20pt, 21pt))
     """
+    __slots__ = ()
     PT_FACTOR = 1 # pt <--> pt factor
     UNIT = 'pt'
 
@@ -1304,6 +1307,7 @@ class P(Unit):
     >>> p('2.5p')
     2p6
     """
+    __slots__ = ()
     # 12 points = 1p
     PT_FACTOR = 12
     UNIT = 'p'
@@ -1390,6 +1394,7 @@ class Inch(Unit):
     >>> inch('10pt', '11mm')
     (0.14", 0.43")
     """
+    __slots__ = ()
     PT_FACTOR = INCH # 72pt = 1"
     UNIT = 'inch' # Alternative is "
     UNITC = '"'
@@ -1424,6 +1429,7 @@ class Formula(Unit):
     >>> f.f
     'addAll'
     """
+    __slots__ = ('f', 'units')
     # Formulas behave as points by default, but that can be changed.
     PT_FACTOR = 1
     UNIT = 'f'
@@ -1452,6 +1458,7 @@ class RelativeUnit(Unit):
 
     >>> u = units('12%')
     """
+    __slots__ = ('_base', '_g')
     BASE = 1 # Default "base reference for relative units."
     GUTTER = U*2 # Used as default gutter measure for Col units.
     BASE_KEY = 'base' # Key in optional base of relative units.
@@ -1671,6 +1678,7 @@ class Px(RelativeUnit):
     >>> u.pt
     1050
     """
+    __slots__ = ()
     PT_FACTOR = 1.3333 # This may not always be 1:1 to points.
     UNIT = 'px'
 
@@ -1764,6 +1772,7 @@ class Fr(RelativeUnit):
     >>> u, pt(u)
     (4fr, 25pt)
     """
+    __slots__ = ()
     UNIT = 'fr'
 
     def _get_rv(self):
@@ -1850,6 +1859,7 @@ class Col(RelativeUnit):
     >>> u, pt(u) # TODO: CHECK ANSWER. Answer col value as points, relative to base master value and gutter.
     (0.5col, 250pt)
     """
+    __slots__ = ()
     UNIT = 'col'
 
     def _get_rv(self):
@@ -1940,6 +1950,7 @@ class Em(RelativeUnit):
     >>> em(1, 2, 3, 4)
     (1em, 2em, 3em, 4em)
     """
+    __slots__ = ()
     isEm = True
     UNIT = 'em'
     # Key in optional base of relative units.
@@ -2056,6 +2067,7 @@ class Perc(RelativeUnit):
     >>> Perc(1.2) + 1.2
     2.4%
     """
+    __slots__ = ()
     BASE = 100 # Default "base reference for relative units."
     UNIT = 'perc'
     UNITC = '%'
@@ -2254,6 +2266,46 @@ def units(v, maker=None, base=None, g=None, default=None):
         u = units(default, base=base, g=g)
     return u # If possible to create, answer u. Otherwise result is None
 
+# Tuples of plain unit values, shared by all elements that pack equal values.
+PACKED_VALUES = {}
+
+def packUnits(uu):
+    """Answer the compact form of the list of units `uu`, as stored in elements: 
+    the tuple of plain values and the unit class as tag, if all units are 
+    absolute and of the same class. Equal value tuples are shared. Otherwise
+    answer the tuple `uu` and None as tag. unpackUnit(v, tag) answers the unit.
+
+    >>> values, tag = packUnits(pt(10, 20, 30, 40))
+    >>> values, tag.__name__
+    ((10, 20, 30, 40), 'Pt')
+    >>> packUnits(pt(10, 20, 30, 40))[0] is values # Shared by equal values
+    True
+    >>> unpackUnit(values[1], tag)
+    20pt
+    >>> packUnits((pt(10), mm(20))) # Mixed units are not packed.
+    ((10pt, 20mm), None)
+    """
+    tag = None
+    values = []
+    for u in uu:
+        if not isUnit(u) or not u.isAbsolute or (tag is not None and u.__class__ is not tag):
+            return tuple(uu), None
+        tag = u.__class__
+        values.append(u.v)
+    values = tuple(values)
+    return PACKED_VALUES.setdefault(values, values), tag
+
+def unpackUnit(v, tag):
+    """Answer the unit of plain value `v` and class `tag`, as packed by packUnits.
+    If the tag is None, then `v` is answered unchanged.
+
+    >>> unpackUnit(12, Mm), unpackUnit(pt(3), None)
+    (12mm, 3pt)
+    """
+    if tag is None:
+        return v
+    return tag(v)
+
 # Automatic angle conversion between degrees and radians.
 
 def asin(v):